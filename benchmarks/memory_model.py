@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+"""
+    Compares the memory used by the genome objects (Organism, Contig, Gene, RNA) with their __slots__ layout
+    and with an equivalent layout that uses a per-instance __dict__ (which is what they used before).
+
+    usage: python benchmarks/memory_model.py testingDataset/organisms.gbff.list [--sequences]
+"""
+
+#default libraries
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+
+#local libraries
+import ppanggolin.genome
+import ppanggolin.annotate.annotate
+from ppanggolin.pangenome import Pangenome
+from ppanggolin.annotate import readAnnotations
+
+#subclasses without __slots__ get a __dict__ back, which is the former object model.
+class DictGene(ppanggolin.genome.Gene):
+    pass
+
+class DictRNA(ppanggolin.genome.RNA):
+    pass
+
+class DictContig(ppanggolin.genome.Contig):
+    pass
+
+class DictOrganism(ppanggolin.genome.Organism):
+    def _createContig(self, key, is_circular = False):
+        new_contig = DictContig(key, is_circular)
+        self._contigs_getter[key] = new_contig
+        return new_contig
+
+def useModel(slotted):
+    """ makes the annotation parser create either the slotted objects, or the ones with a __dict__ """
+    module = ppanggolin.annotate.annotate
+    if slotted:
+        module.Gene, module.RNA, module.Organism = ppanggolin.genome.Gene, ppanggolin.genome.RNA, ppanggolin.genome.Organism
+    else:
+        module.Gene, module.RNA, module.Organism = DictGene, DictRNA, DictOrganism
+
+def measure(organisms_file, slotted, keepSeq):
+    useModel(slotted)
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    pangenome = Pangenome()
+    readAnnotations(pangenome, organisms_file)
+    duration = time.time() - start
+    if not keepSeq:#the sequences take the same space in both models, removing them to compare the objects only.
+        for org in pangenome.organisms:
+            for contig in org.contigs:
+                for gene in contig.genes:
+                    del gene.dna
+        gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nbGenes = sum(org.number_of_genes() for org in pangenome.organisms)
+    return current, peak, duration, nbGenes
+
+def main():
+    parser = argparse.ArgumentParser(description = "Memory benchmark of the genome object model")
+    parser.add_argument("organisms", type=str, help = "A tab-separated file listing the organism names and their gff/gbff file, as given to 'ppanggolin annotate --anno'")
+    parser.add_argument("--sequences", action="store_true", help = "Also keep the gene sequences in memory (they are the same in both models)")
+    args = parser.parse_args()
+    #the annotation list uses paths relative to its own location.
+    os.chdir(os.path.dirname(os.path.abspath(args.organisms)))
+    organisms_file = os.path.basename(args.organisms)
+
+    print("\t".join(["model","genes","memory_MB","peak_MB","bytes_per_gene","seconds"]))
+    for name, slotted in [("__dict__", False), ("__slots__", True)]:
+        current, peak, duration, nbGenes = measure(organisms_file, slotted, args.sequences)
+        print("\t".join(map(str,[name, nbGenes, round(current / 2**20, 2), round(peak / 2**20, 2), round(current / nbGenes), round(duration, 2)])))
+    useModel(True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+"""
+    Compares the fasta reader of ppanggolin.annotate with the former one, which concatenated the sequence lines one by one,
+    on a synthetic draft assembly with thousands of contigs, given uncompressed and gzip compressed.
+
+    usage: python benchmarks/read_fasta.py [--contigs 5000] [--length 10000]
+"""
+
+#default libraries
+import argparse
+import gzip
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+#local libraries
+from ppanggolin.genome import Organism
+from ppanggolin.annotate import read_fasta
+from ppanggolin.utils import read_compressed_or_not
+
+def former_read_fasta(org, fnaFile):
+    contigs = {}
+    contig_seq = ""
+    contig = None
+    for line in fnaFile:
+        if line.startswith('>'):
+            if contig_seq != "":
+                contigs[contig.name] = contig_seq
+            contig_seq = ""
+            contig = org.getOrAddContig(line.split()[0][1:])
+        else:
+            contig_seq += line.strip()
+    if contig_seq != "":
+        contigs[contig.name] = contig_seq
+    return contigs
+
+def writeAssembly(filename, nbContigs, meanLength, seed = 42):
+    """ writes a draft assembly whose contig lengths are drawn from an exponential distribution, with 80 bases per line """
+    rand = random.Random(seed)
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(filename, "wt") as fasta:
+        for i in range(nbContigs):
+            length = max(200, int(rand.expovariate(1 / meanLength)))
+            sequence = "".join(rand.choices("ACGT", k = length))
+            fasta.write(f">contig_{i:06d} length={length}\n")
+            for start in range(0, length, 80):
+                fasta.write(sequence[start:start+80] + "\n")
+
+def measure(read, filename):
+    """ reads the file twice, once for the time and once for the memory as tracing the memory slows the reading down """
+    start = time.time()
+    contigs = read(Organism("draft"), filename)
+    duration = time.time() - start
+    tracemalloc.start()
+    read(Organism("draft"), filename)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return contigs, duration, peak
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark of the fasta reader")
+    parser.add_argument("--contigs", type = int, default = 5000, help = "Number of contigs of the synthetic assembly")
+    parser.add_argument("--length", type = int, default = 10000, help = "Mean length of the contigs")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    print("\t".join(["file", "reader", "contigs", "bases", "seconds", "peak_MB"]))
+    for name in "assembly.fna", "assembly.fna.gz":
+        filename = os.path.join(tmpdir, name)
+        writeAssembly(filename, args.contigs, args.length)
+        readers = [("former", lambda org, filename : former_read_fasta(org, read_compressed_or_not(filename))),
+                   ("current", read_fasta)]
+        results = []
+        for reader, read in readers:
+            contigs, duration, peak = measure(read, filename)
+            results.append(contigs)
+            print("\t".join(map(str, [name, reader, len(contigs), sum(map(len, contigs.values())), round(duration, 2), round(peak / 2**20, 1)])))
+        if results[0] != results[1]:
+            raise Exception(f"The two readers did not read the same sequences from {name}")
+        os.remove(filename)
+    os.rmdir(tmpdir)
+
+if __name__ == "__main__":
+    main()
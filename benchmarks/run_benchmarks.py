@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+"""
+    Runs the benchmarks of ppanggolin on a synthetic pangenome : writing and reading the pangenome file, building the neighbors graph, writing the NEM input files,
+    counting the core gene families of the rarefaction samples, and writing each of the outputs of 'ppanggolin write'.
+    The measures are written as json with --output. With --compare, they are compared with those of a former run, and the script fails if a benchmark is slower than --threshold times what it was.
+
+    usage: python benchmarks/run_benchmarks.py [--organisms 100] [--genes 3000] [--repeat 3] [--output benchmarks.json] [--compare former.json] [--threshold 1.2]
+"""
+
+#default libraries
+import argparse
+import json
+import logging
+import random
+import sys
+import tempfile
+
+#local libraries
+import ppanggolin.metrics
+import ppanggolin.nem.partition as ppp
+from ppanggolin.pangenome import Pangenome
+from ppanggolin.sharedPangenome import SharedPangenome
+from ppanggolin.graph import computeNeighborsGraph
+from ppanggolin.formats import writePangenome, readPangenome, writeFlatFiles
+from ppanggolin.nem.rarefaction import organismFamilyMatrix, coreCounts
+from synthetic import syntheticPangenomeFile
+
+#the outputs of 'ppanggolin write' that are benchmarked, as the options of writeFlatFiles
+flatOutputs = ["csv", "genePA", "gexf", "light_gexf", "projection", "stats", "json", "partitions", "families_tsv", "all_genes", "all_prot_families", "all_gene_families"]
+
+def readPangenomeFile(filename, graph = True):
+    pangenome = Pangenome()
+    pangenome.addFile(filename)
+    readPangenome(pangenome, annotation = True, geneFamilies = True, graph = graph)
+    return pangenome
+
+def writeSetup(pangenome):
+    """ the statuses of the synthetic pangenome are set back to 'Computed' so that it is entirely written again. """
+    for status in "genomesAnnotated", "geneSequences", "genesClustered", "geneFamilySequences", "neighborsGraph", "partitionned":
+        pangenome.status[status] = "Computed"
+    return pangenome
+
+def graphSetup(filename):
+    pangenome = readPangenomeFile(filename, graph = False)
+    pangenome.status["neighborsGraph"] = "No"
+    return pangenome
+
+def nemSetup(pangenome, tmpdir):
+    ppp.pan = SharedPangenome.fromPangenome(pangenome)
+    return list(range(pangenome.number_of_organisms())), tempfile.mkdtemp(dir = tmpdir) + "/nem"
+
+def nemRun(organisms, nemDir):
+    nem_input, _ = ppp.nem_inputs(organisms, 10)
+    ppp.write_nem_input_files(nemDir, organisms, nem_input)
+
+def nemTeardown(data):
+    ppp.pan.unlink()
+    ppp.pan = None
+
+def rarefactionSetup(pangenome, depth = 30, maxSampling = 100):
+    rand = random.Random(42)
+    organisms = list(pangenome.organisms)
+    samples = [ set(rand.sample(organisms, size)) for size in range(1, min(maxSampling, len(organisms)) + 1) for _ in range(depth) ]
+    return organismFamilyMatrix(pangenome), samples
+
+def getBenchmarks(pangenome, filename, tmpdir):
+    """
+        Returns the benchmarks as (name, setup, run, teardown, number of items, unit) : what setup() returns is given to run(), then to teardown() if there is one.
+        Only run() is measured.
+    """
+    nbGenes = sum(len(contig.genes) for org in pangenome.organisms for contig in org.contigs)
+    nbFams = pangenome.number_of_geneFamilies()
+    benchmarks = [("writePangenome", lambda : writeSetup(pangenome), lambda pan : writePangenome(pan, tmpdir + "/written.h5", force = True), None, nbGenes, "genes"),
+                  ("readPangenome", lambda : filename, readPangenomeFile, None, nbGenes, "genes"),
+                  ("computeNeighborsGraph", lambda : graphSetup(filename), computeNeighborsGraph, None, nbGenes, "genes"),
+                  ("write_nem_input_files", lambda : nemSetup(pangenome, tmpdir), lambda data : nemRun(*data), nemTeardown, nbFams, "families"),
+                  ("coreCounts", lambda : rarefactionSetup(pangenome), lambda data : coreCounts(pangenome, data[0], data[1], 0.95), None, nbFams, "families")]
+    flatPangenome = []#read once, when the first output is benchmarked.
+    def flatSetup():
+        if len(flatPangenome) == 0:
+            flatPangenome.append(readPangenomeFile(filename))
+        return flatPangenome[0]
+    for output in flatOutputs:
+        benchmarks.append(("write " + output, flatSetup, lambda pan, output = output : writeFlatFiles(pan, tmpdir, **{output : True}), None, nbFams, "families"))
+    return benchmarks
+
+def compare(report, formerReport, threshold):
+    """
+        Prints the ratio of the time of each benchmark to its former time, and returns the benchmarks that are slower than threshold times their former time.
+    """
+    former = { stage["name"] : stage["wall_time"] / stage["calls"] for stage in formerReport["stages"] if stage["name"].startswith("benchmark ") }
+    regressions = []
+    print("\t".join(["benchmark", "former_seconds", "seconds", "ratio"]))
+    for stage in report["stages"]:
+        if stage["name"] in former:
+            seconds = stage["wall_time"] / stage["calls"]
+            ratio = seconds / former[stage["name"]] if former[stage["name"]] > 0 else 1
+            print("\t".join(map(str, [stage["name"], round(former[stage["name"]], 3), round(seconds, 3), round(ratio, 2)])))
+            if ratio > threshold:
+                regressions.append(stage["name"])
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmarks of ppanggolin on a synthetic pangenome")
+    parser.add_argument("--organisms", type = int, default = 100, help = "Number of organisms of the synthetic pangenome")
+    parser.add_argument("--genes", type = int, default = 3000, help = "Number of genes per organism of the synthetic pangenome")
+    parser.add_argument("--repeat", type = int, default = 3, help = "Number of times each benchmark is run")
+    parser.add_argument("--only", type = str, nargs = "+", default = None, help = "Run only the benchmarks of those names")
+    parser.add_argument("--output", type = str, default = None, help = "Write the measures to this json file")
+    parser.add_argument("--compare", type = str, default = None, help = "json file written by a former run, to compare the measures with")
+    parser.add_argument("--threshold", type = float, default = 1.2, help = "A benchmark regressed if it is slower than this many times its former time")
+    args = parser.parse_args()
+    logging.basicConfig(stream = sys.stdout, level = logging.WARNING)
+
+    tmpdir = tempfile.TemporaryDirectory()
+    filename = tmpdir.name + "/synthetic.h5"
+    pangenome = syntheticPangenomeFile(filename, nbOrgs = args.organisms, genesPerOrg = args.genes)
+    ppanggolin.metrics.popStages()#only the benchmarks are reported
+
+    for name, setup, run, teardown, nbItems, unit in getBenchmarks(pangenome, filename, tmpdir.name):
+        if args.only is not None and name not in args.only:
+            continue
+        for _ in range(args.repeat):
+            data = setup()
+            try:
+                with ppanggolin.metrics.measure("benchmark " + name, unit) as stage:
+                    run(data)
+                    stage.items = nbItems
+            finally:
+                if teardown is not None:
+                    teardown(data)
+
+    reportFile = args.output if args.output is not None else tmpdir.name + "/benchmarks.json"
+    ppanggolin.metrics.writeMetrics(reportFile, " ".join(sys.argv))
+    with open(reportFile) as f:
+        report = json.load(f)
+    print("\t".join(["benchmark", "items", "unit", "seconds", "items_per_second", "peak_rss_MB"]))
+    for stage in report["stages"]:
+        if stage["name"].startswith("benchmark "):
+            seconds = stage["wall_time"] / stage["calls"]
+            print("\t".join(map(str, [stage["name"], stage["items"] // stage["calls"], stage["unit"], round(seconds, 3), round(stage["items_per_second"]), round(stage["peak_rss"] / 2**20)])))
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if len(regressions) > 0:
+            print(f"{len(regressions)} benchmarks regressed : {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
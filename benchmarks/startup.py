@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+"""
+    Measures the time the command line takes to start for each subcommand (printing its help), and for 'ppanggolin info --status' on a small synthetic pangenome file.
+    It fails if one of them takes more than --max-seconds, so that the subcommands keep importing only what they need.
+
+    usage: python benchmarks/startup.py [--repeat 5] [--max-seconds 1.0]
+"""
+
+#default libraries
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+
+#local libraries
+from ppanggolin.main import subcommands
+from synthetic import syntheticPangenomeFile
+
+def startupTime(arguments, repeat):
+    """ Returns the shortest time taken by the command line run with the given arguments, in a new python process. """
+    command = [sys.executable, "-c", "import sys; from ppanggolin.main import main; sys.argv[0] = 'ppanggolin'; main()"] + arguments
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        subprocess.run(command, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+        duration = time.time() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark of the start of the command line")
+    parser.add_argument("--repeat", type = int, default = 5, help = "Number of times each command is run. The shortest time is kept")
+    parser.add_argument("--max-seconds", type = float, default = 1.0, help = "Fail if a command takes more than this many seconds")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    filename = tmpdir.name + "/synthetic.h5"
+    syntheticPangenomeFile(filename, nbOrgs = 5, genesPerOrg = 100)
+    commands = [ [name, "-h"] for name in subcommands ] + [["info", "-p", filename, "--status"]]
+
+    print("\t".join(["command", "seconds"]))
+    slow = []
+    for arguments in commands:
+        duration = startupTime(arguments, args.repeat)
+        print("\t".join(["ppanggolin " + " ".join(arguments).replace(filename, "synthetic.h5"), str(round(duration, 3))]))
+        if duration > args.max_seconds:
+            slow.append(arguments[0])
+    if len(slow) > 0:
+        print(f"Those subcommands took more than {args.max_seconds} seconds to start : {', '.join(slow)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+"""
+    Builds synthetic pangenomes, in memory or in a .h5 pangenome file, to measure the performances of ppanggolin without real genomes nor mmseqs.
+    The core gene families are in all the organisms, the shell ones in about a third of them and the cloud ones in one or two of them.
+    The organisms keep the order of their genes along a common ancestral order, except for a fraction of them that are moved elsewhere (1 - synteny), and some genes are duplicated in tandem.
+
+    usage: python benchmarks/synthetic.py --output pangenome.h5 [--organisms 100] [--genes 3000] [--core 0.6] [--shell 0.25] [--cloud 0.15] [--synteny 0.95] [--duplication 0.02]
+"""
+
+#default libraries
+import argparse
+import random
+import time
+
+#local libraries
+from ppanggolin.pangenome import Pangenome
+from ppanggolin.genome import Gene, RNA
+from ppanggolin.graph import computeNeighborsGraph
+from ppanggolin.formats import writePangenome
+
+def familyPools(nbOrgs, genesPerOrg, core, shell, cloud):
+    """
+        Returns the number of core, shell and cloud gene families, and the number of genes of each kind that an organism has.
+        Each shell family is in about a third of the organisms, and each cloud family in one or two of them.
+    """
+    total = core + shell + cloud
+    nbCore = int(genesPerOrg * core / total)
+    nbShell = int(genesPerOrg * shell / total)
+    nbCloud = genesPerOrg - nbCore - nbShell
+    return nbCore, min(nbShell * 3, nbShell * nbOrgs), int(nbCloud * nbOrgs / 1.5), nbCore, nbShell, nbCloud
+
+def syntheticPangenome(nbOrgs = 100, genesPerOrg = 3000, core = 0.6, shell = 0.25, cloud = 0.15, synteny = 0.95, duplication = 0.02, genesPerContig = 500, graph = True, partitions = True, seed = 42):
+    """
+        Makes a pangenome of nbOrgs organisms with about genesPerOrg genes each, clustered in gene families.
+        core, shell and cloud are the fractions of the genes of an organism that belong to each kind of gene family.
+        synteny is the fraction of the genes that keep the ancestral order, and duplication the fraction of the genes that have a tandem copy.
+        The neighbors graph is computed if graph is True, and the gene families get the partition of their kind if partitions is True.
+    """
+    rand = random.Random(seed)
+    pangenome = Pangenome()
+    nbCoreFams, nbShellFams, nbCloudFams, nbCore, nbShell, nbCloud = familyPools(nbOrgs, genesPerOrg, core, shell, cloud)
+    coreFams = [ f"core_{i:07d}" for i in range(nbCoreFams) ]
+    shellFams = [ f"shell_{i:07d}" for i in range(nbShellFams) ]
+    #each cloud family fills one or two of the cloud genes of the organisms.
+    cloudSlots = [ f"cloud_{i:07d}" for i in range(nbCloudFams) ]
+    cloudSlots += rand.choices(cloudSlots, k = nbCloud * nbOrgs - len(cloudSlots)) if len(cloudSlots) > 0 else []
+    rand.shuffle(cloudSlots)
+    #the ancestral order of the core and shell families, along which the organisms order their genes.
+    ancestralOrder = { name : i for i, name in enumerate(rand.sample(coreFams + shellFams, nbCoreFams + nbShellFams)) }
+
+    def getFamily(name):
+        fam = pangenome.addGeneFamily(name)
+        if fam.sequence == "":#a new family.
+            fam.addSequence("M" + "".join(rand.choices("ACDEFGHIKLMNPQRSTVWY", k = rand.randint(50, 300))))
+        return fam
+
+    #a few sequences shared by all the genes, as their content does not matter here.
+    dnaPool = [ "ATG" + "".join(rand.choices("ACGT", k = rand.randint(100, 1500))) + "TAA" for _ in range(100) ]
+    names = [ f"gene{i}" for i in range(1000) ] + [""] * 1000
+    products = [ f"putative protein {i}" for i in range(1000) ] + ["hypothetical protein"] * 1000
+    for orgNum in range(nbOrgs):
+        org = pangenome.addOrganism(f"organism_{orgNum:05d}")
+        orgFams = sorted(coreFams + rand.sample(shellFams, nbShell), key = ancestralOrder.get)
+        for name in cloudSlots[orgNum * nbCloud:(orgNum + 1) * nbCloud]:
+            orgFams.insert(rand.randint(0, len(orgFams)), name)
+        for i in range(len(orgFams)):#rearrangements
+            if rand.random() > synteny:
+                orgFams.insert(rand.randint(0, len(orgFams) - 1), orgFams.pop(i))
+        orgFams = [ copy for name in orgFams for copy in ([name, name] if rand.random() < duplication else [name]) ]
+        for geneNum, name in enumerate(orgFams):
+            if geneNum % genesPerContig == 0:
+                contig = org.getOrAddContig(f"{org.name}_contig_{geneNum // genesPerContig:04d}", is_circular = geneNum == 0)
+                start = 1
+                rna = RNA(f"{contig.name}_tRNA")
+                rna.fill_annotations(start = start, stop = start + 75, strand = "+", geneType = "tRNA", product = "tRNA-Ala")
+                rna.fill_parents(org, contig)
+                contig.addRNA(rna)
+                start += 100
+            gene = Gene(f"{org.name}_{geneNum:06d}")
+            dna = rand.choice(dnaPool)
+            gene.fill_annotations(start = start, stop = start + len(dna) - 1, strand = rand.choice("+-"), geneType = "CDS",
+                                  position = len(contig.genes), name = rand.choice(names), product = rand.choice(products))
+            gene.fill_parents(org, contig)
+            gene.add_dna(dna)
+            contig.addGene(gene)
+            getFamily(name).addGene(gene)
+            start += len(dna) + rand.randint(0, 200)
+    for status in "genomesAnnotated", "geneSequences", "genesClustered", "geneFamilySequences":
+        pangenome.status[status] = "Computed"
+    pangenome.parameters["annotation"] = {"read_annotations_from_file" : False}
+    pangenome.parameters["cluster"] = {"read_clustering_from_file" : True}
+    if graph:
+        computeNeighborsGraph(pangenome)
+    if partitions:
+        for fam in pangenome.geneFamilies:
+            fam.partition = "P" if fam.name.startswith("core") else "S1" if fam.name.startswith("shell") else "C"
+        pangenome.status["partitionned"] = "Computed"
+        pangenome.parameters["partition"] = {"K" : 3, "computed_K" : False}
+    return pangenome
+
+def syntheticPangenomeFile(filename, **options):
+    """
+        Writes a synthetic pangenome made with the given options of syntheticPangenome to a .h5 pangenome file, and returns it.
+    """
+    pangenome = syntheticPangenome(**options)
+    writePangenome(pangenome, filename, force = True)
+    pangenome.file = filename
+    return pangenome
+
+def main():
+    parser = argparse.ArgumentParser(description = "Writes a synthetic pangenome file")
+    parser.add_argument("--output", type = str, required = True, help = "Pangenome file to write")
+    parser.add_argument("--organisms", type = int, default = 100, help = "Number of organisms")
+    parser.add_argument("--genes", type = int, default = 3000, help = "Number of genes per organism")
+    parser.add_argument("--core", type = float, default = 0.6, help = "Fraction of the genes of an organism that are in core gene families")
+    parser.add_argument("--shell", type = float, default = 0.25, help = "Fraction of the genes of an organism that are in shell gene families")
+    parser.add_argument("--cloud", type = float, default = 0.15, help = "Fraction of the genes of an organism that are in cloud gene families")
+    parser.add_argument("--synteny", type = float, default = 0.95, help = "Fraction of the genes that keep the ancestral order")
+    parser.add_argument("--duplication", type = float, default = 0.02, help = "Fraction of the genes that are duplicated in tandem")
+    parser.add_argument("--seed", type = int, default = 42, help = "Seed of the random generator")
+    args = parser.parse_args()
+
+    start = time.time()
+    pangenome = syntheticPangenomeFile(args.output, nbOrgs = args.organisms, genesPerOrg = args.genes, core = args.core, shell = args.shell, cloud = args.cloud,
+                                       synteny = args.synteny, duplication = args.duplication, seed = args.seed)
+    print(f"Wrote a pangenome with {pangenome.number_of_organisms()} organisms, {pangenome.number_of_geneFamilies()} gene families and {len(pangenome.edges)} edges to {args.output} in {round(time.time() - start, 2)} seconds.")
+
+if __name__ == "__main__":
+    main()
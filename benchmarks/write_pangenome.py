@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+"""
+    Measures the time taken by each of the writers of the pangenome file on a synthetic pangenome (annotations, gene sequences, gene families, graph and partitions).
+
+    usage: python benchmarks/write_pangenome.py [--genes 1000000] [--organisms 100] [--batch 100000] [--output pangenome.h5]
+"""
+
+#default libraries
+import argparse
+import os
+import tempfile
+import time
+
+#installed libraries
+import tables
+
+#local libraries
+from ppanggolin.formats.writeBinaries import writeAnnotations, writeGeneSequences, writeGeneFamilies, writeGeneFamInfo, writeGraph, writeFamilyLevelTables
+from synthetic import syntheticPangenome
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark of the writers of the pangenome file")
+    parser.add_argument("--genes", type = int, default = 1000000, help = "Number of genes of the synthetic pangenome")
+    parser.add_argument("--organisms", type = int, default = 100, help = "Number of organisms of the synthetic pangenome")
+    parser.add_argument("--batch", type = int, default = None, help = "Number of rows appended at once by the writers (their default if not given)")
+    parser.add_argument("--output", type = str, default = None, help = "Pangenome file to write (a temporary file by default)")
+    args = parser.parse_args()
+
+    start = time.time()
+    pangenome = syntheticPangenome(nbOrgs = args.organisms, genesPerOrg = args.genes // args.organisms)
+    print(f"Made a pangenome with {len(pangenome.genes)} genes, {len(pangenome.geneFamilies)} gene families and {len(pangenome.edges)} edges in {round(time.time() - start, 2)} seconds.")
+
+    filename = args.output if args.output is not None else os.path.join(tempfile.mkdtemp(), "pangenome.h5")
+    nbGenePairs = sum(len(genePairs) for edge in pangenome.edges for genePairs in edge.organisms.values())
+    options = {} if args.batch is None else {"batchSize":args.batch}
+    h5f = tables.open_file(filename, "w", filters = tables.Filters(complevel=1, complib='blosc:lz4'))
+    steps = [("annotations", lambda : writeAnnotations(pangenome, h5f, **options), len(pangenome.genes)),
+             ("geneSequences", lambda : writeGeneSequences(pangenome, h5f, **options), len(pangenome.genes)),
+             ("geneFamilies", lambda : writeGeneFamilies(pangenome, h5f, False, **options), len(pangenome.genes)),
+             ("geneFamiliesInfo", lambda : writeGeneFamInfo(pangenome, h5f, False, **options), len(pangenome.geneFamilies)),
+             ("edges", lambda : writeGraph(pangenome, h5f, False, **options), nbGenePairs),
+             ("familyLevelTables", lambda : writeFamilyLevelTables(h5f), len(pangenome.genes))]
+    print("\t".join(["table", "rows", "seconds", "rows_per_second"]))
+    total = 0
+    for name, write, nbRows in steps:
+        start = time.time()
+        write()
+        duration = time.time() - start
+        total += duration
+        print("\t".join(map(str, [name, nbRows, round(duration, 2), round(nbRows / duration)])))
+    h5f.close()
+    print("\t".join(map(str, ["total", "", round(total, 2), ""])))
+    print(f"File size : {round(os.path.getsize(filename) / 2**20, 1)} MB")
+    if args.output is None:
+        os.remove(filename)
+
+if __name__ == "__main__":
+    main()
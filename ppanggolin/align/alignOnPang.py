@@ -8,35 +8,38 @@ import subprocess
 import argparse
 
 #local libraries
-from ppanggolin.formats import checkPangenomeInfo
+from ppanggolin.formats import checkPangenomeInfo, getFamilySequencesDigest
 from ppanggolin.utils import mkOutdir, read_compressed_or_not
 from ppanggolin.pangenome import Pangenome
-
-
-def createdb(fileObj, tmpdir):
-    seqdb =  tempfile.NamedTemporaryFile(mode="w", dir = tmpdir.name)
-    cmd = ["mmseqs","createdb",fileObj.name, seqdb.name]
-    subprocess.run(cmd, stdout=subprocess.DEVNULL)
-    return seqdb
-
-def alignProtToPang(pangFile, protFile,  output, tmpdir, cpu = 1, defrag=False, identity = 0.8, coverage = 0.8):
-    pangdb = createdb(pangFile, tmpdir)
-    protdb = createdb(protFile, tmpdir)
+from ppanggolin.mmseqsCache import fileDatabase, sequencesDatabase, fastaBlocks
+
+
+def familiesDatabase(pangenome, tmpdir, cacheDir = None, cpu = 1):
+    """
+        Returns the path of the mmseqs database of the gene families representatives.
+        When it is cached, its index is precomputed as well, so that the searches against it do not build it each time.
+        The representatives are then only read if they are not in the cache, which is found with the digest written along with them in the pangenome file.
+    """
+    digest = None
+    if cacheDir is not None and hasattr(pangenome, "file") and pangenome.status["geneFamilySequences"] in ["inFile","Loaded"]:
+        digest = getFamilySequencesDigest(pangenome)
+    return sequencesDatabase(lambda : fastaBlocks( (fam.name, fam.sequence) for fam in pangenome.geneFamilies ), tmpdir.name, cacheDir, cpu, index = cacheDir is not None, digest = digest)
+
+def alignProtToPang(pangdb, protFile,  output, tmpdir, cpu = 1, defrag=False, identity = 0.8, coverage = 0.8, cacheDir = None):
+    protdb = fileDatabase(protFile.name, tmpdir.name, cacheDir, cpu)
     covmode = "0"
     if defrag:
         covmode = "1"
     alndb =  tempfile.NamedTemporaryFile(mode="w", dir = tmpdir.name)
-    cmd = ["mmseqs","search",protdb.name , pangdb.name, alndb.name, tmpdir.name, "-a","--min-seq-id", str(identity), "-c", str(coverage), "--cov-mode", covmode, "--threads", str(cpu)]
+    cmd = ["mmseqs","search",protdb , pangdb, alndb.name, tmpdir.name, "-a","--min-seq-id", str(identity), "-c", str(coverage), "--cov-mode", covmode, "--threads", str(cpu)]
     logging.getLogger().debug(" ".join(cmd))
     logging.getLogger().info("Aligning proteins to cluster representatives...")
     subprocess.run(cmd, stdout=subprocess.DEVNULL)
     outfile =  output + "/protein_to_pangenome_associations.blast-tab"
-    cmd = ["mmseqs","convertalis", protdb.name ,pangdb.name, alndb.name, outfile,"--format-mode","2"]
+    cmd = ["mmseqs","convertalis", protdb ,pangdb, alndb.name, outfile,"--format-mode","2"]
     logging.getLogger().debug(" ".join(cmd))
     logging.getLogger().info("Extracting alignments...")
     subprocess.run(cmd, stdout=subprocess.DEVNULL)
-    pangdb.close()
-    protdb.close()
     alndb.close()
 
     return outfile
@@ -57,12 +60,6 @@ def getProt(protFile):
             protset.add(line[1:])
     return protset
 
-def writeGeneFamSequences(pangenome, fileObj):
-    for fam in pangenome.geneFamilies:
-        fileObj.write(">" + fam.name + "\n")
-        fileObj.write(fam.sequence + "\n")
-    fileObj.flush()
-
 def projectPartition(prot2pang, protSet, output):
     partitionProj = output + "/proteins_partition_projection.tsv"
     with open(partitionProj, "w") as partProjFile:
@@ -72,19 +69,17 @@ def projectPartition(prot2pang, protSet, output):
             partProjFile.write(remainingProt + "\tcloud\n")#if there is no hit, it's going to be cloud genes.
     return partitionProj
 
-def align(pangenome, proteinFile, output, tmpdir, identity = 0.8, coverage=0.8, defrag = False, cpu = 1):
+def align(pangenome, proteinFile, output, tmpdir, identity = 0.8, coverage=0.8, defrag = False, cpu = 1, cacheDir = None):
     if pangenome.status["geneFamilySequences"] not in ["inFile","Loaded","Computed"]:
         raise Exception("Cannot use this function as your pangenome does not have gene families representatives associated to it. For now this works only if the clustering is realised by PPanGGOLiN.")
     checkPangenomeInfo(pangenome, needFamilies=True)
 
     newtmpdir = tempfile.TemporaryDirectory(dir = tmpdir)
-    tmpPangFile = tempfile.NamedTemporaryFile(mode="w", dir = newtmpdir.name)
-
-    writeGeneFamSequences(pangenome, tmpPangFile)
+    pangdb = familiesDatabase(pangenome, newtmpdir, cacheDir, cpu)
 
     with read_compressed_or_not(proteinFile) as protFileObj:
         protSet = getProt(protFileObj)
-        alignFile = alignProtToPang(tmpPangFile, protFileObj, output, newtmpdir, cpu, defrag, identity, coverage)
+        alignFile = alignProtToPang(pangdb, protFileObj, output, newtmpdir, cpu, defrag, identity, coverage, cacheDir)
 
     prot2pang = readAlignments(alignFile, pangenome)
     partProj = projectPartition(prot2pang, protSet, output)
@@ -92,14 +87,13 @@ def align(pangenome, proteinFile, output, tmpdir, identity = 0.8, coverage=0.8,
     logging.getLogger().info(f"{len(prot2pang)} proteins over {len(protSet)} have at least one hit in the pangenome.")
     logging.getLogger().info(f"Blast-tab file of the alignment : '{alignFile}'")
     logging.getLogger().info(f"proteins partition projection : '{partProj}'")
-    tmpPangFile.close()
     newtmpdir.cleanup()
 
 def launch(args):
     mkOutdir(args.output, args.force)
     pangenome = Pangenome()
     pangenome.addFile(args.pangenome)
-    align(pangenome, args.proteins, args.output, args.tmpdir, args.identity, args.coverage, args.defrag, args.cpu)
+    align(pangenome, args.proteins, args.output, args.tmpdir, args.identity, args.coverage, args.defrag, args.cpu, args.mmseqs_cache)
 
 def alignSubparser(subparser):
     parser = subparser.add_parser("align", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -113,5 +107,6 @@ def alignSubparser(subparser):
     optional.add_argument('--defrag', required=False,default=False, action="store_true", help = "Use the defragmentation strategy to associate potential fragments with their original gene family.")
     optional.add_argument('--identity', required = False, type = float, default=0.5, help = "min identity percentage threshold")
     optional.add_argument('--coverage', required = False, type = float, default=0.8, help = "min coverage percentage threshold")
+    optional.add_argument("--mmseqs_cache", required=False, type=str, default=None, help = "Directory where the mmseqs databases are kept, so that the runs against the same pangenome or with the same proteins do not make them again")
 
     return parser
\ No newline at end of file
@@ -15,8 +15,9 @@ from tqdm import tqdm
 from ppanggolin.annotate import  annotate_organism, read_fasta, get_dna_sequence
 from ppanggolin.pangenome import Pangenome
 from ppanggolin.genome import Organism, Gene, RNA
-from ppanggolin.utils import read_compressed_or_not, mkFilename, get_num_lines
+from ppanggolin.utils import read_compressed_or_not, mkFilename, readCheckpoint, writeCheckpoint
 from ppanggolin.formats import writePangenome
+from ppanggolin.metrics import measured
 
 def detect_filetype(filename):
     """ detects whether the current file is gff3, gbk/gbff or unknown. If unknown, it will raise an error"""
@@ -59,15 +60,18 @@ def create_gene(org, contig, ID, dbxref, start, stop, strand, gene_type, positio
         contig.addRNA(newGene)
     newGene.fill_parents(org, contig)
 
-def read_org_gbff(pangenome, organism, gbff_file_path, circular_contigs, getSeq, pseudo = False):
-    """ reads a gbff file and fills Organism, Contig and Genes objects based on information contained in this file """
+def read_org_gbff(organism, gbff_file_path, circular_contigs, getSeq, pseudo = False):
+    """
+        reads a gbff file and fills Organism, Contig and Genes objects based on information contained in this file
+        returns the organism, and whether the gene sequences were read.
+    """
     org = Organism(organism)
 
     logging.getLogger().debug("Extracting genes informations from the given gbff")
-    # revert the order of the file, to read the first line first.
-    lines = read_compressed_or_not(gbff_file_path).readlines()[::-1]
-    while len(lines) != 0:
-        line = lines.pop()
+    #the file is read line by line, so that only the sequence of the current contig is held in memory.
+    gbff_file = read_compressed_or_not(gbff_file_path)
+    lines = iter(gbff_file)
+    for line in lines:
         # beginning of contig
         if line.startswith('LOCUS'):
             is_circ = False
@@ -79,7 +83,7 @@ def read_org_gbff(pangenome, organism, gbff_file_path, circular_contigs, getSeq,
                     if contigID in circular_contigs:
                         is_circ = True
                     contig = org.getOrAddContig(contigID, is_circ)
-                line = lines.pop()
+                line = next(lines)
         # start of the feature object.
         dbxref = set()
         gene_name = ""
@@ -91,7 +95,7 @@ def read_org_gbff(pangenome, organism, gbff_file_path, circular_contigs, getSeq,
         start = None
         end = None
         strand = None
-        line = lines.pop()
+        line = next(lines)
         while not line.startswith("ORIGIN"):
             currType = line[5:21].strip()
             if currType != "":
@@ -131,10 +135,10 @@ def read_org_gbff(pangenome, organism, gbff_file_path, circular_contigs, getSeq,
                 elif line[21:].startswith('/product'):#need to loop as it can be more than one line long
                     product = line.split('=')[1].replace('"', '').strip()
                     if line.count('"') == 1:#then the product line is on multiple lines
-                        line = lines.pop()
+                        line = next(lines)
                         product += line.strip().replace('"', '')
                         while line.count('"') != 1:
-                            line = lines.pop()
+                            line = next(lines)
                             product += line.strip().replace('"', '')
                 #if it's a pseudogene, we're not keeping it.
                 elif line[21:].startswith("/pseudo") and not pseudo:
@@ -142,25 +146,31 @@ def read_org_gbff(pangenome, organism, gbff_file_path, circular_contigs, getSeq,
                 #that's probably a 'stop' codon into selenocystein.
                 elif line[21:].startswith("/transl_except"):
                     usefulInfo = False
-            line = lines.pop()
+            line = next(lines)
             #end of contig
         if usefulInfo:#saving the last element...
             create_gene(org, contig, locus_tag, dbxref, start, end, strand, objType, len(contig.genes), gene_name, product, genetic_code)
 
+        #the sequence lines go up to the end of the contig, they are read even if the sequence is not kept.
+        sequence = []
+        line = next(lines)#first sequence line.
+        while not line.startswith('//'):
+            if getSeq:
+                sequence.append(line[10:].replace(" ", "").strip())
+            line = next(lines)
         if getSeq:
-            line = lines.pop()#first sequence line.
-            #if the seq was to be gotten, it would be here.
-            sequence = ""
-            while not line.startswith('//'):
-                sequence += line[10:].replace(" ", "").strip().upper()
-                line = lines.pop()
+            sequence = "".join(sequence).upper()
             #get each gene's sequence.
             for gene in contig.genes:
                 gene.add_dna(get_dna_sequence(sequence, gene))
+    gbff_file.close()
+    return org, getSeq
 
-    pangenome.addOrganism(org)
-
-def read_org_gff(pangenome, organism, gff_file_path, circular_contigs, getSeq, pseudo = False):
+def read_org_gff(organism, gff_file_path, circular_contigs, getSeq, pseudo = False):
+    """
+        reads a gff file and fills Organism, Contig and Genes objects based on information contained in this file
+        returns the organism, and whether the gene sequences were in the file.
+    """
     (GFF_seqname, _, GFF_type, GFF_start, GFF_end, _, GFF_strand, _, GFF_attribute) = range(0,9)#missing values : source, score, frame. They are unused.
     def getGffAttributes(gff_fields):
         """
@@ -186,24 +196,21 @@ def read_org_gff(pangenome, organism, gff_file_path, circular_contigs, getSeq, p
             :rtype: string
         """
         ElementID = attributes.get("ID")
-        if not ElementID:
-            logging.getLogger().error("Each CDS type of the gff files must own a unique ID attribute. Not the case for file: "+gff_file_path)
-            exit(1)
+        if not ElementID:#raising rather than exiting, as this can be run in a worker process.
+            raise Exception("Each CDS type of the gff files must own a unique ID attribute. Not the case for file: "+gff_file_path)
         return ElementID
 
     hasFasta = False
-    fastaString = ""
+    contigSequences = {}
     org = Organism(organism)
     with read_compressed_or_not(gff_file_path) as gff_file:
         for line in gff_file:
-            if hasFasta:
-                fastaString += line
-                continue
-            elif line.startswith('##',0,2):
+            if line.startswith('##',0,2):
                 if line.startswith('FASTA',2,7):
-                    if not getSeq:#if getting the sequences is useless...
-                        break
-                    hasFasta = True
+                    if getSeq:#otherwise getting the sequences is useless...
+                        hasFasta = True
+                        contigSequences = read_fasta(org, gff_file)#the rest of the file.
+                    break
                 elif line.startswith('sequence-region',2,17):
                     fields = [el.strip() for el in line.split()]
                     contig = org.getOrAddContig(fields[1], True if fields[1] in circular_contigs else False)
@@ -261,43 +268,112 @@ def read_org_gff(pangenome, organism, gff_file_path, circular_contigs, getSeq, p
                                         geneType = gff_fields[GFF_type],
                                         name = name,
                                         product=product)
-                    rna.fill_parents(organism, contig)
+                    rna.fill_parents(org, contig)
                     contig.addRNA(rna)
 
     ### GET THE FASTA SEQUENCES OF THE GENES
-    if hasFasta and fastaString != "":
-        contigSequences = read_fasta( org, fastaString.split('\n'))
+    if hasFasta and len(contigSequences) > 0:
         for contig in org.contigs:
             for gene in contig.genes:
                 gene.add_dna(get_dna_sequence(contigSequences[contig.name], gene))
             for rna in contig.RNAs:
                 rna.add_dna(get_dna_sequence(contigSequences[contig.name], rna))
-    elif not hasFasta:
-        pangenome.status["geneSequences"] = "No"
-    pangenome.addOrganism(org)
+    return org, hasFasta
+
+def read_anno_file(organism_name, filename, circular_contigs, getSeq, pseudo):
+    """ reads the gff or gbff annotation file of an organism. Returns the organism, and whether the gene sequences were in the file. """
+    filetype = detect_filetype(filename)
+    if filetype == "gff":
+        return read_org_gff(organism_name, filename, circular_contigs, getSeq, pseudo)
+    elif filetype == "gbff":
+        return read_org_gbff(organism_name, filename, circular_contigs, getSeq, pseudo)
+
+def packOrganism(org):
+    """
+        Returns the organism as nested tuples and lists of its annotations, to send it back from a worker process.
+        This is much smaller and faster to pickle than the objects themselves, which all refer to their contig and organism.
+    """
+    contigs = []
+    for contig in org.contigs:
+        genes = [ (gene.ID, gene.start, gene.stop, gene.strand, gene.type, gene.name, gene.product, gene.genetic_code, getattr(gene, "dna", None)) for gene in contig.genes ]
+        rnas = [ (rna.ID, rna.start, rna.stop, rna.strand, rna.type, rna.name, rna.product, getattr(rna, "dna", None)) for rna in contig.RNAs ]
+        contigs.append((contig.name, contig.is_circular, genes, rnas))
+    return org.name, contigs
+
+def unpackOrganism(pack):
+    """ makes the Organism, Contig, Gene and RNA objects back from what packOrganism returned. """
+    orgName, contigs = pack
+    org = Organism(orgName)
+    for contigName, is_circular, genes, rnas in contigs:
+        contig = org.getOrAddContig(contigName, is_circular)
+        for position, (ID, start, stop, strand, geneType, name, product, genetic_code, dna) in enumerate(genes):
+            gene = Gene(ID)
+            gene.fill_annotations(start, stop, strand, geneType, position, name, product, genetic_code)
+            gene.fill_parents(org, contig)
+            if dna is not None:
+                gene.add_dna(dna)
+            contig.addGene(gene)
+        for ID, start, stop, strand, rnaType, name, product, dna in rnas:
+            rna = RNA(ID)
+            rna.fill_annotations(start, stop, strand, rnaType, name, product)
+            rna.fill_parents(org, contig)
+            if dna is not None:
+                rna.add_dna(dna)
+            contig.addRNA(rna)
+    return org
+
+def launchReadAnnoFile(pack):
+    org, hasSequences = read_anno_file(*pack)
+    return packOrganism(org), hasSequences
 
-def readAnnotations(pangenome, organisms_file, getSeq = True, pseudo = False):
+@measured(unit = "organisms", items = lambda pangenome, *args, **kwargs : pangenome.number_of_organisms())
+def readAnnotations(pangenome, organisms_file, getSeq = True, pseudo = False, cpu = 1, checkpointDir = None):
     logging.getLogger().info("Reading "+organisms_file+" the list of organism files ...")
 
-    bar = tqdm(read_compressed_or_not(organisms_file),total=get_num_lines(organisms_file), unit = "annotation file")
-    pangenome.status["geneSequences"] = "Computed"#we assume there are gene sequences in the annotation files, unless a gff file without fasta is met (which is the only case where sequences can be asbent)
-    for line in bar:
+    arguments = []
+    for line in read_compressed_or_not(organisms_file):
         elements = [el.strip() for el in line.split("\t")]
         if len(elements)<=1:
             logging.getLogger().error("No tabulation separator found in organisms file")
             exit(1)
-        bar.set_description("Processing "+elements[1].split("/")[-1])
-        bar.refresh()
-        filetype = detect_filetype(elements[1])
-        if filetype == "gff":
-            read_org_gff(pangenome, elements[0], elements[1], elements[2:], getSeq, pseudo)
-        elif filetype == "gbff":
-            read_org_gbff(pangenome, elements[0], elements[1], elements[2:], getSeq, pseudo)
+        arguments.append((elements[0], elements[1], elements[2:], getSeq, pseudo))
+    pangenome.status["geneSequences"] = "Computed"#we assume there are gene sequences in the annotation files, unless a gff file without fasta is met (which is the only case where sequences can be asbent)
+    bar = tqdm(range(len(arguments)), unit = "annotation file")
+    def addOrganism(org, hasSequences):
+        pangenome.addOrganism(org)
+        if not hasSequences:
+            pangenome.status["geneSequences"] = "No"
+        bar.update()
+    saved = [ readCheckpoint(checkpointDir, i, pack) for i, pack in enumerate(arguments) ]
+    missing = [ i for i in range(len(arguments)) if saved[i] is None ]
+    if len(missing) < len(arguments):
+        logging.getLogger().info(f"{len(arguments) - len(missing)} organisms were read by a former run")
+    if cpu > 1:
+        #the organisms are added in the order of the file, whatever the order in which they were read.
+        with Pool(processes = cpu) as p:
+            results = p.imap(launchReadAnnoFile, [ arguments[i] for i in missing ])
+            for i in range(len(arguments)):
+                if saved[i] is None:
+                    pack, hasSequences = next(results)
+                    writeCheckpoint(checkpointDir, i, arguments[i], (pack, hasSequences))
+                else:
+                    pack, hasSequences = saved[i]
+                addOrganism(unpackOrganism(pack), hasSequences)
+    else:
+        for i, pack in enumerate(arguments):
+            if saved[i] is None:
+                org, hasSequences = read_anno_file(*pack)
+                if checkpointDir is not None:
+                    writeCheckpoint(checkpointDir, i, pack, (packOrganism(org), hasSequences))
+            else:
+                org, hasSequences = unpackOrganism(saved[i][0]), saved[i][1]
+            addOrganism(org, hasSequences)
     bar.close()
     pangenome.status["genomesAnnotated"] = "Computed"
     pangenome.parameters["annotation"] = {}
     pangenome.parameters["annotation"]["read_annotations_from_file"] = True
 
+@measured(unit = "organisms", items = lambda pangenome, *args, **kwargs : pangenome.number_of_organisms())
 def getGeneSequencesFromFastas(pangenome, fasta_file):
     fastaDict = {}
     for line in read_compressed_or_not(fasta_file):
@@ -306,8 +382,7 @@ def getGeneSequencesFromFastas(pangenome, fasta_file):
             logging.getLogger().error("No tabulation separator found in organisms file")
             exit(1)
         org = pangenome.addOrganism(elements[0])
-        with read_compressed_or_not(elements[1]) as currFastaFile:
-            fastaDict[org] = read_fasta(org, currFastaFile)
+        fastaDict[org] = read_fasta(org, elements[1])
     if not set(pangenome.organisms) <= set(fastaDict.keys()):
         missing = len(pangenome.organisms) - len(set(pangenome.organisms) & set(fastaDict.keys()))
         raise Exception(f"Not all of your pangenome's organisms are present within the provided fasta file. {missing} are missing (out of {len(pangenome.organisms)}).")
@@ -326,9 +401,11 @@ def getGeneSequencesFromFastas(pangenome, fasta_file):
     pangenome.status["geneSequences"] = "Computed"
 
 def launchAnnotateOrganism(pack):
-    return annotate_organism(*pack)
+    index, arguments = pack
+    return index, annotate_organism(*arguments)
 
-def annotatePangenome(pangenome, fastaList, tmpdir, cpu, translation_table="11", kingdom = "bacteria", norna=False,  overlap=True):
+@measured(unit = "organisms", items = lambda pangenome, *args, **kwargs : pangenome.number_of_organisms())
+def annotatePangenome(pangenome, fastaList, tmpdir, cpu, translation_table="11", kingdom = "bacteria", norna=False,  overlap=True, checkpointDir = None):
     logging.getLogger().info(f"Reading {fastaList} the list of organism files")
 
     arguments = []
@@ -340,10 +417,20 @@ def annotatePangenome(pangenome, fastaList, tmpdir, cpu, translation_table="11",
         arguments.append((elements[0], elements[1], elements[2:], translation_table, kingdom, norna, tmpdir, overlap))
     if len(arguments) == 0:
         raise Exception("There are no genomes in the provided file")
-    logging.getLogger().info(f"Annotating {len(arguments)} genomes using {cpu} cpus...")
+    bar = tqdm(range(len(arguments)), unit = "genome")
+    missing = []
+    for i, pack in enumerate(arguments):
+        saved = readCheckpoint(checkpointDir, i, pack)
+        if saved is None:
+            missing.append((i, pack))
+        else:#annotated by a former run
+            bar.update()
+            pangenome.addOrganism(unpackOrganism(saved[0]))
+    logging.getLogger().info(f"Annotating {len(missing)} genomes using {cpu} cpus...")
     with Pool(processes = cpu) as p:
-        bar = tqdm(range(len(arguments)), unit = "genome")
-        for organism in p.imap_unordered(launchAnnotateOrganism, arguments):
+        for i, organism in p.imap_unordered(launchAnnotateOrganism, missing):
+            if checkpointDir is not None:
+                writeCheckpoint(checkpointDir, i, arguments[i], (packOrganism(organism), True))
             bar.update()
             pangenome.addOrganism(organism)
         p.close()
@@ -366,7 +453,7 @@ def launch(args):
     if args.fasta is not None and args.anno is None:
         annotatePangenome(pangenome, args.fasta, args.tmpdir, args.cpu,  args.translation_table, args.kingdom, args.norna, args.overlap)
     elif args.anno is not None:
-        readAnnotations(pangenome, args.anno, pseudo = args.use_pseudo)
+        readAnnotations(pangenome, args.anno, pseudo = args.use_pseudo, cpu = args.cpu)
         if pangenome.status["geneSequences"] == "No":
             if args.fasta:
                 getGeneSequencesFromFastas(pangenome, args.fasta)
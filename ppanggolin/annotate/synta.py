@@ -3,6 +3,8 @@
 
 #default libraries
 import os
+import mmap
+import string
 import tempfile
 from subprocess import Popen, PIPE
 import ast
@@ -18,31 +20,24 @@ def translate(seq, code):
     start_table = code["start_table"]
     table = code["trans_table"]
 
-    protein = ""
-    if len(seq) % 3 == 0:
-        protein = start_table[seq[0: 3]]
-        for i in range(3, len(seq), 3):
-            codon = seq[i: i + 3]
-            try:
-                protein += table[codon]
-            except KeyError:  # codon was not planned for. Probably can't determine it.
-                # print(codon)
-                protein += 'X'  # X is for unknown
-    else:
-        print(len(seq))
-        raise IndexError("Given sequence length modulo 3 was different than 0, which is unexpected.")
-    return protein
+    if len(seq) % 3 != 0:
+        raise IndexError(f"Given sequence length modulo 3 was different than 0, which is unexpected. Its length is {len(seq)}.")
+    #codons that were not planned for can probably not be determined. X is for unknown.
+    return start_table[seq[0: 3]] + "".join([ table.get(seq[i: i + 3], "X") for i in range(3, len(seq), 3) ])
+
+#complement of each byte of a dna sequence. See https://www.bioinformatics.org/sms/iupac.html for the code.
+#bytes that are not an upper case IUPAC nucleotide are translated to 0, which is not a valid character in a sequence.
+complement_table = bytearray(256)
+for base, complement in zip(b"ACGTNRYSWKMBVDH", b"TGCANYRSWMKVBHD"):
+    complement_table[base] = complement
+complement_table = bytes(complement_table)
 
 def reverse_complement(seq):
     """ reverse complement the given dna sequence """
-    complement = {'A':  'T', 'C':  'G', 'G':  'C', 'T':  'A', 'N': 'N', 'R': 'Y', 'Y': 'R',
-                  'S': 'S', 'W': 'W', 'K': 'M', 'M': 'K', 'B': 'V', 'V': 'B', 'D': 'H', 'H': 'D'}
-    # see https://www.bioinformatics.org/sms/iupac.html for the code.
-    # complement = {'A':  'T', 'C':  'G', 'G':  'C', 'T':  'A', 'N': 'N' } ## basic
-    rcseq = ""
-    for i in reversed(seq):
-        rcseq += complement[i]
-    return rcseq
+    rcseq = seq.encode().translate(complement_table)[::-1]
+    if 0 in rcseq:#same error as the former lookup of each base in a dictionnary.
+        raise KeyError(next(base for base in reversed(seq) if ord(base) > 255 or complement_table[ord(base)] == 0))
+    return rcseq.decode()
 
 def launch_aragorn(fnaFile, org):
     """
@@ -150,24 +145,60 @@ def launch_infernal(fnaFile, org, kingdom, tmpdir):
 
     return geneObjs
 
+def split_fasta(buffer):
+    """
+        Yields the header line and the sequence of each record of a fasta held in a bytes-like buffer (bytes or mmap).
+        The buffer is searched for the start of the records, and the line breaks are removed from each sequence at once.
+    """
+    start = buffer.find(b">")
+    while start != -1:
+        end = buffer.find(b"\n>", start)
+        record = buffer[start+1:] if end == -1 else buffer[start+1:end]
+        header, _, sequence = record.partition(b"\n")
+        yield header.decode(), sequence.translate(None, string.whitespace.encode()).decode()
+        start = end if end == -1 else end + 1
+
+def split_fasta_stream(stream, chunkSize = 2**22):
+    """
+        Yields the header line and the sequence of each record of a fasta read from a binary stream, chunkSize bytes at a time.
+        Only the complete records of the chunks read so far are split, so that at most a chunk and a record are held in memory.
+    """
+    rest = b""
+    for chunk in iter(lambda : stream.read(chunkSize), b""):
+        buffer = rest + chunk
+        end = buffer.rfind(b"\n>")
+        if end == -1:#the current record is not over yet.
+            rest = buffer
+        else:
+            yield from split_fasta(buffer[:end+1])
+            rest = buffer[end+1:]
+    yield from split_fasta(rest)
+
 def read_fasta(org, fnaFile):
     """
-        Reads a fna file  (or stream, or string) and stores it in a dictionnary with contigs as key and sequence as value.
+        Reads a fna file path (or stream, or list of lines) and stores it in a dictionnary with contigs as key and sequence as value.
+        Uncompressed files given by their path are mapped in memory rather than read.
     """
+    if isinstance(fnaFile, str) and not is_compressed(fnaFile):
+        if os.path.getsize(fnaFile) == 0:#an empty file cannot be mapped.
+            return {}
+        with open(fnaFile, "rb") as file, mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as buffer:
+            return read_fasta_records(org, split_fasta(buffer))
+    elif isinstance(fnaFile, str):
+        with read_compressed_or_not(fnaFile) as file:
+            return read_fasta_records(org, split_fasta_stream(file.buffer))
+    elif hasattr(fnaFile, "read"):
+        return read_fasta_records(org, split_fasta(fnaFile.read().encode()))
+    else:
+        return read_fasta_records(org, split_fasta("\n".join(fnaFile).encode()))
+
+def read_fasta_records(org, records):
+    """ stores the records given by split_fasta in a dictionnary with contigs as key and sequence as value """
     contigs = {}
-    contig_seq = ""
-    contig = None
-    for line in fnaFile:
-        if line.startswith('>'):
-            if contig_seq != "":
-                contigs[contig.name] = contig_seq
-            contig_seq = ""
-            contig = org.getOrAddContig(line.split()[0][1:])
-        else:
-            contig_seq += line.strip()
-    # processing the last contig
-    if contig_seq != "":
-        contigs[contig.name] = contig_seq
+    for header, sequence in records:
+        contig = org.getOrAddContig(header.split()[0])
+        if len(sequence) > 0:
+            contigs[contig.name] = sequence
     return contigs
 
 def write_tmp_fasta(contigs, tmpdir ):
@@ -245,10 +276,11 @@ def annotate_organism(orgName, fileName, circular_contigs, code, kingdom, norna,
     """
     org = Organism(orgName)
 
-    fastaFile = read_compressed_or_not(fileName)
-    contigSequences = read_fasta(org, fastaFile)
-    if is_compressed(fileName):
+    contigSequences = read_fasta(org, fileName)
+    if is_compressed(fileName):#the annotation tools read a temporary uncompressed copy.
         fastaFile = write_tmp_fasta(contigSequences, tmpdir)
+    else:
+        fastaFile = read_compressed_or_not(fileName)
 
     genes = syntaxic_annotation(org, fastaFile, norna, kingdom, code, tmpdir)
     genes = overlap_filter(genes, contigSequences, overlap)
@@ -5,77 +5,66 @@
 import logging
 import tempfile
 import subprocess
-from collections import defaultdict
-import os
+from itertools import islice
 import argparse
 
 #installed libraries
-import networkx
 from tqdm import tqdm
+import numpy
 
 #local libraries
 from ppanggolin.pangenome import Pangenome
 from ppanggolin.genome import Gene
 from ppanggolin.utils import read_compressed_or_not
-from ppanggolin.formats import writePangenome, checkPangenomeInfo, getGeneSequencesFromFile, ErasePangenome
+from ppanggolin.formats import writePangenome, checkPangenomeInfo, getGeneSequenceBlocks, ErasePangenome
+from ppanggolin.metrics import measured
+from ppanggolin.mmseqsCache import fileDatabase, sequencesDatabase, fastaBlocks
 
-def alignRep(faaFile, tmpdir, cpu, coverage, identity):
+@measured()
+def alignRep(faaFile, tmpdir, cpu, coverage, identity, cacheDir = None):
     newtmpdir = tempfile.TemporaryDirectory(dir = tmpdir.name)#create a tmpdir in the tmpdir provided.
-    seqdb =  tempfile.NamedTemporaryFile(mode="w", dir = newtmpdir.name)
-    cmd = ["mmseqs","createdb",faaFile.name, seqdb.name]
-    logging.getLogger().debug(" ".join(cmd))
-    subprocess.run(cmd, stdout=subprocess.DEVNULL)
+    seqdb = fileDatabase(faaFile.name, newtmpdir.name, cacheDir)
     alndb =  tempfile.NamedTemporaryFile(mode="w", dir = newtmpdir.name)
-    cmd = ["mmseqs","search",seqdb.name , seqdb.name, alndb.name, newtmpdir.name, "-a","--min-seq-id", str(identity), "-c", str(coverage), "--cov-mode", "1", "--threads", str(cpu)]
+    cmd = ["mmseqs","search",seqdb , seqdb, alndb.name, newtmpdir.name, "-a","--min-seq-id", str(identity), "-c", str(coverage), "--cov-mode", "1", "--threads", str(cpu)]
     logging.getLogger().debug(" ".join(cmd))
     logging.getLogger().info("Aligning cluster representatives...")
     subprocess.run(cmd, stdout=subprocess.DEVNULL)
     outfile =  tempfile.NamedTemporaryFile(mode="w", dir = tmpdir.name)
-    cmd = ["mmseqs","convertalis", seqdb.name ,seqdb.name, alndb.name, outfile.name,"--format-output","query,target,qlen,tlen,bits"]
+    cmd = ["mmseqs","convertalis", seqdb ,seqdb, alndb.name, outfile.name,"--format-output","query,target,qlen,tlen,bits"]
     logging.getLogger().debug(" ".join(cmd))
     logging.getLogger().info("Extracting alignments...")
     subprocess.run(cmd, stdout=subprocess.DEVNULL)
-    seqdb.close()
     alndb.close()
     newtmpdir.cleanup()
     return outfile
 
-def firstClustering(sequences, tmpdir, cpu, code, coverage, identity ):
+@measured()
+def firstClustering(sequences, tmpdir, cpu, code, coverage, identity, cacheDir = None):
+    """ sequences() returns the nucleic sequences of the genes to cluster as blocks of fasta text in bytes, which are streamed to mmseqs. """
     newtmpdir = tempfile.TemporaryDirectory(dir = tmpdir.name)#create a tmpdir in the tmpdir provided.
-    seqNucdb = tempfile.NamedTemporaryFile(mode="w", dir = newtmpdir.name)
-    cmd = ["mmseqs","createdb"]
-    cmd.append(sequences.name)
-    cmd.extend([seqNucdb.name,"--dont-shuffle","false"])
-    logging.getLogger().debug(" ".join(cmd))
     logging.getLogger().info("Creating sequence database...")
-    subprocess.run(cmd,  stdout=subprocess.DEVNULL)
-    seqdb = tempfile.NamedTemporaryFile(mode="w", dir = newtmpdir.name)
-    cmd = ["mmseqs","translatenucs", seqNucdb.name, seqdb.name, "--threads", str(cpu), "--translation-table",code]
-    logging.getLogger().debug(" ".join(cmd))
-    subprocess.run(cmd, stdout=subprocess.DEVNULL)
+    seqdb = sequencesDatabase(sequences, newtmpdir.name, cacheDir, cpu, translation_table = code, createdbOptions = ["--dont-shuffle","false"])
     cludb = tempfile.NamedTemporaryFile(mode="w", dir = newtmpdir.name)
-    cmd = ["mmseqs","cluster",seqdb.name, cludb.name, newtmpdir.name , "--min-seq-id", str(identity), "-c", str(coverage), "--threads", str(cpu), "--kmer-per-seq","80","--max-seqs","300"]
+    cmd = ["mmseqs","cluster",seqdb, cludb.name, newtmpdir.name , "--min-seq-id", str(identity), "-c", str(coverage), "--threads", str(cpu), "--kmer-per-seq","80","--max-seqs","300"]
     logging.getLogger().debug(" ".join(cmd))
     logging.getLogger().info("Clustering sequences...")
     subprocess.run(cmd, stdout=subprocess.DEVNULL)
     logging.getLogger().info("Extracting cluster representatives...")
     repdb = tempfile.NamedTemporaryFile(mode="w", dir = newtmpdir.name)
-    cmd = ["mmseqs","result2repseq", seqdb.name, cludb.name, repdb.name]
+    cmd = ["mmseqs","result2repseq", seqdb, cludb.name, repdb.name]
     logging.getLogger().debug(" ".join(cmd))
     subprocess.run(cmd, stdout=subprocess.DEVNULL)
     reprfa = tempfile.NamedTemporaryFile(mode="w", dir = tmpdir.name)
-    cmd = ["mmseqs","result2flat",seqdb.name, seqdb.name, repdb.name, reprfa.name]
+    cmd = ["mmseqs","result2flat",seqdb, seqdb, repdb.name, reprfa.name]
     logging.getLogger().debug(" ".join(cmd))
     subprocess.run(cmd, stdout=subprocess.DEVNULL)
     outtsv = tempfile.NamedTemporaryFile(mode="w", dir = tmpdir.name)
-    cmd = ["mmseqs","createtsv",seqdb.name, seqdb.name, cludb.name,outtsv.name]
+    cmd = ["mmseqs","createtsv",seqdb, seqdb, cludb.name,outtsv.name]
     logging.getLogger().debug(" ".join(cmd))
     logging.getLogger().info("Writing gene to family informations")
     subprocess.run(cmd, stdout=subprocess.DEVNULL)
     repdb.close()
-    seqdb.close()
     cludb.close()
-    seqNucdb.close()
     newtmpdir.cleanup()#deleting temporary directory.
     return reprfa, outtsv
 
@@ -90,69 +79,125 @@ def read_faa(faFileName):
                 fam2seq[head] = line.strip()
     return fam2seq
 
-def read_tsv(tsvfileName):
-    # reading tsv file
-    genes2fam = {}
-    fam2genes = defaultdict(set)
-    with open(tsvfileName.name, "r") as tsvfile:
-        for line in tsvfile:
-            line = line.split()
-            genes2fam[line[1]] = (line[0],False)#fam id, and its a gene (and not a fragment)
-            fam2genes[line[0]].add(line[1])
-    return genes2fam, fam2genes
+def read_tsv_chunks(tsvfile, chunk = 1000000):
+    """
+        Yields the columns of a tsv file of gene families (the family, the gene, and 'F' for the fragments if there is a third column) chunk per chunk of lines, as lists.
+        The third column is None if the lines of the chunk do not have one.
+    """
+    while True:
+        lines = list(islice(tsvfile, chunk))
+        if len(lines) == 0:
+            break
+        fields = "".join(lines).split()
+        if len(fields) == 2 * len(lines):
+            yield fields[0::2], fields[1::2], None
+        elif len(fields) == 3 * len(lines):
+            yield fields[0::3], fields[1::3], fields[2::3]
+        else:#the lines do not all have the same number of fields.
+            elements = [ line.split() for line in lines ]
+            if any(len(el) not in (2, 3) for el in elements):
+                raise Exception("Each line of the gene families file must have the family and the gene, and optionally 'F' for the fragments, separated by tabulations.")
+            yield [ el[0] for el in elements ], [ el[1] for el in elements ], [ el[2] if len(el) == 3 else None for el in elements ]
+
+def read_tsv_arrays(tsvfile):
+    """
+        Reads a tsv file of gene families, and returns the names of the families in the order in which they first appear, the IDs of the genes,
+        the index of the family of each gene and whether each gene is a fragment, as numpy arrays.
+    """
+    famIndex = {}
+    genes = []
+    geneFam = []
+    fragments = []
+    for famNames, geneIDs, frags in read_tsv_chunks(tsvfile):
+        for fam in famNames:
+            famIndex.setdefault(fam, len(famIndex))
+        genes.extend(geneIDs)
+        geneFam.append(numpy.fromiter(map(famIndex.__getitem__, famNames), dtype = numpy.int64, count = len(famNames)))
+        fragments.append(numpy.array([ frag == "F" for frag in frags ], dtype = bool) if frags is not None else numpy.zeros(len(geneIDs), dtype = bool))
+    geneFam = numpy.concatenate(geneFam) if len(geneFam) > 0 else numpy.zeros(0, dtype = numpy.int64)
+    fragments = numpy.concatenate(fragments) if len(fragments) > 0 else numpy.zeros(0, dtype = bool)
+    return list(famIndex), genes, geneFam, fragments
 
+def read_aln_arrays(alnFile, famIndex, chunk = 1000000):
+    """
+        Reads the alignments between the representatives (query, target, qlen, tlen, bits) chunk per chunk of lines, and returns them as numpy arrays without the self hits.
+        The queries and targets are given as the index of their family.
+    """
+    columns = [[] for _ in range(5)]
+    with open(alnFile.name, "r") as alnfile:
+        while True:
+            fields = "".join(islice(alnfile, chunk)).split()
+            if len(fields) == 0:
+                break
+            query = numpy.fromiter(map(famIndex.__getitem__, fields[0::5]), dtype = numpy.int64, count = len(fields) // 5)
+            target = numpy.fromiter(map(famIndex.__getitem__, fields[1::5]), dtype = numpy.int64, count = len(fields) // 5)
+            keep = query != target
+            for column, values in zip(columns, [query, target, numpy.array(fields[2::5], dtype = numpy.int64), numpy.array(fields[3::5], dtype = numpy.int64), numpy.array(fields[4::5], dtype = float)]):
+                column.append(values[keep])
+    return [ numpy.concatenate(column) if len(column) > 0 else numpy.empty(0, dtype = dtype) for column, dtype in zip(columns, [numpy.int64] * 4 + [float]) ]
+
+@measured()
 def refineClustering(tsv, alnFile, fam2seq):
-    simgraph = networkx.Graph()
-    genes2fam, fam2genes = read_tsv(tsv)
+    """
+        Associates the families of fragments to the family of the longest representative they align with which has at least as many genes, and the best score among those.
+        If that family is itself associated to another one, the fragments go to the latter.
+        Returns the clustering as read_tsv_arrays does, and the sequences of the families that are kept.
+    """
+    with open(tsv.name, "r") as tsvfile:
+        families, genes, geneFam, _ = read_tsv_arrays(tsvfile)
     logging.getLogger().info(f"Starting with {len(fam2seq)} families")
-    #create the nodes
-    for fam, genes in fam2genes.items():
-        simgraph.add_node(fam, nbgenes = len(genes) )
-    #add the edges
-    with open(alnFile.name,"r") as alnfile:
-        for line in alnfile:
-            line = line.split()
+    nbFams = len(families)
+    nbgenes = numpy.bincount(geneFam, minlength = nbFams)
+    query, target, qlen, tlen, bits = read_aln_arrays(alnFile, { fam : i for i, fam in enumerate(families) })
+    length = numpy.zeros(nbFams, dtype = numpy.int64)
+    length[query] = qlen
+    length[target] = tlen
+
+    #each pair of families aligned in either direction has the score of its last alignment, and is ordered by its first one.
+    pairs = numpy.minimum(query, target) * nbFams + numpy.maximum(query, target)
+    uniquePairs, first = numpy.unique(pairs, return_index = True)
+    last = len(pairs) - 1 - numpy.unique(pairs[::-1], return_index = True)[1]
+    node = numpy.concatenate([uniquePairs // nbFams, uniquePairs % nbFams])
+    neighbor = numpy.concatenate([uniquePairs % nbFams, uniquePairs // nbFams])
+    score = numpy.tile(bits[last], 2)
+    first = numpy.tile(first, 2)
+
+    #the neighbor chosen by each node is the first one with the best score among the longer ones with at least as many genes.
+    eligible = (length[neighbor] > length[node]) & (nbgenes[neighbor] >= nbgenes[node]) & (score > 0)
+    node, neighbor, score, first = node[eligible], neighbor[eligible], score[eligible], first[eligible]
+    order = numpy.lexsort((first, -score, node))
+    node, neighbor = node[order], neighbor[order]
+    chosen = numpy.concatenate([[True], node[1:] != node[:-1]]) if len(node) > 0 else numpy.zeros(0, dtype = bool)
+    parent = numpy.arange(nbFams)
+    parent[node[chosen]] = neighbor[chosen]
+
+    #the chosen neighbors are always longer, so following them ends up in a family that is kept.
+    root = parent
+    while True:
+        nextRoot = root[root]
+        if (nextRoot == root).all():
+            break
+        root = nextRoot
 
-            if line[0] != line[1]:
-                simgraph.add_edge(line[0],line[1], score = float(line[4]))
-                simgraph.nodes[line[0]]["length"] = int(line[2])
-                simgraph.nodes[line[1]]["length"] = int(line[3])
-    for node, nodedata in simgraph.nodes(data = True):
-        choice = (None, 0, 0, 0)
-        for neighbor in simgraph.neighbors(node):
-            nei = simgraph.nodes[neighbor]
-            score = simgraph[neighbor][node]["score"]
-            if nei["length"] > nodedata["length"] and nei["nbgenes"] >= nodedata["nbgenes"] and  choice[3] < score:
-                choice = (genes2fam[neighbor][0], nei["length"] , nei["nbgenes"], score)#genes2fam[neighbor] instead of just neighbor in case that family has been assigned already (this is for smaller fragments that are closer to other fragments than the actual gene family)
-        if choice[0] is not None:
-            genestochange = fam2genes[node]
-            for gene in genestochange:
-                genes2fam[gene] = (choice[0], "F")
-                fam2genes[choice[0]].add(gene)
-            del fam2genes[node]
-    newFam2seq = {}
-    for fam in fam2genes:
-        newFam2seq[fam] = fam2seq[fam]
+    fragments = (parent != numpy.arange(nbFams))[geneFam]
+    newFam2seq = { families[fam] : fam2seq[families[fam]] for fam in numpy.flatnonzero(root == numpy.arange(nbFams)).tolist() }
     logging.getLogger().info(f"Ending with {len(newFam2seq)} gene families")
-    return genes2fam, newFam2seq
+    return (families, genes, root[geneFam], fragments), newFam2seq
 
-def read_gene2fam(pangenome, gene2fam):
-    logging.getLogger().info(f"Adding {len(gene2fam)} genes to the gene families")
+def read_gene2fam(pangenome, families, genes, geneFam, fragments):
+    """
+        Adds the genes to their gene families, given as read_tsv_arrays returns them.
+    """
+    logging.getLogger().info(f"Adding {len(genes)} genes to the gene families")
 
     link = True if pangenome.status["genomesAnnotated"] in ["Computed","Loaded"] else False
     if link:
-        if len(gene2fam) != len(pangenome.genes):#then maybe there are genes with identical IDs
+        if len(genes) != len(pangenome.genes):#then maybe there are genes with identical IDs
             raise Exception("Something unexpected happened during clustering (have less genes clustered than genes in the pangenome). A probable reason is that two genes in two different organisms have the same IDs; If you are sure that all of your genes have an identical IDs, please post an issue at https://github.com/labgem/PPanGGOLiN/")
-    bar = tqdm(gene2fam.items(), unit = "gene")
-    for gene, (family, is_frag) in bar:
-        fam = pangenome.addGeneFamily(family)
-        if link:#doing the linking if the annotations are loaded.
-            geneObj = pangenome.getGene(gene)
-        else:
-            geneObj = Gene(gene)
-        geneObj.is_fragment = is_frag
-        fam.addGene(geneObj)
-    bar.close()
+        geneObjs = [ pangenome.getGene(gene) for gene in genes ]#doing the linking if the annotations are loaded.
+    else:
+        geneObjs = [ Gene(gene) for gene in genes ]
+    pangenome.addGenesToFamilies(geneObjs, families, numpy.arange(len(geneObjs)), geneFam, fragments)
 
 def read_fam2seq(pangenome, fam2seq):
     logging.getLogger().info("Adding protein sequences to the gene families")
@@ -160,18 +205,13 @@ def read_fam2seq(pangenome, fam2seq):
         fam = pangenome.addGeneFamily(family)
         fam.addSequence(protein)
 
-def writeGeneSequencesFromAnnotations(pangenome, fileObj):
+def getGeneSequenceBlocksFromAnnotations(pangenome, genes = None):
     """
-        Writes the CDS sequences of the Pangenome object to a tmpFile object
+        Yields the CDS sequences of the Pangenome object, or of the given genes, as blocks of fasta text in bytes.
         Loads the sequences from previously computed or loaded annotations
     """
-    logging.getLogger().info("Writing all of the CDS sequences for clustering...")
-    bar =  tqdm(pangenome.genes, unit="gene")
-    for gene in bar:#reading the table chunk per chunk otherwise RAM dies on big pangenomes
-        if gene.type == "CDS":
-            fileObj.write('>' + gene.ID + "\n")
-            fileObj.write(gene.dna + "\n")
-    fileObj.flush()
+    bar =  tqdm(pangenome.genes if genes is None else genes, unit="gene")
+    yield from fastaBlocks( (gene.ID, gene.dna) for gene in bar if gene.type == "CDS" )
     bar.close()
 
 def checkPangenomeFormerClustering(pangenome, force):
@@ -181,17 +221,16 @@ def checkPangenomeFormerClustering(pangenome, force):
     elif pangenome.status["genesClustered"] == "inFile" and force == True:
         ErasePangenome(pangenome, geneFamilies = True)
 
-def checkPangenomeForClustering(pangenome, tmpFile, force):
+def checkPangenomeForClustering(pangenome, force):
     """
-        Check the pangenome statuses and write the gene sequences in the provided tmpFile. (whether they are written in the .h5 file or currently in memory)
+        Check the pangenome statuses and returns a function giving the gene sequences as blocks of fasta text, whether they are written in the .h5 file or currently in memory.
     """
     checkPangenomeFormerClustering(pangenome, force)
     if pangenome.status["geneSequences"] in ["Computed","Loaded"]:
-        writeGeneSequencesFromAnnotations(pangenome, tmpFile)
+        return lambda : getGeneSequenceBlocksFromAnnotations(pangenome)
     elif pangenome.status["geneSequences"] == "inFile":
-        getGeneSequencesFromFile(pangenome, tmpFile)#write CDS sequences to the tmpFile
+        return lambda : getGeneSequenceBlocks(pangenome)#read the CDS sequences from the .h5 file as mmseqs needs them
     else:
-        tmpFile.close()#closing the tmp file since an exception will be raised.
         raise Exception("The pangenome does not include gene sequences, thus it is impossible to cluster the genes in gene families. Either provide clustering results (see --clusters), or provide a way to access the gene sequence during the annotation step (having the fasta in the gff files, or providing the fasta files through the --fasta option)")
 
 
@@ -204,31 +243,29 @@ def inferSingletons(pangenome):
             singletonCounter+=1
     logging.getLogger().info(f"Inferred {singletonCounter} singleton families")
 
-def clustering(pangenome, tmpdir, cpu , defrag = False, code = "11", coverage = 0.8, identity = 0.8, force = False):
+@measured(unit = "families", items = lambda pangenome, *args, **kwargs : pangenome.number_of_geneFamilies())
+def clustering(pangenome, tmpdir, cpu , defrag = False, code = "11", coverage = 0.8, identity = 0.8, force = False, cacheDir = None):
     newtmpdir = tempfile.TemporaryDirectory(dir = tmpdir)
-    tmpFile = tempfile.NamedTemporaryFile(mode="w", dir = newtmpdir.name)
-
-    checkPangenomeForClustering(pangenome, tmpFile, force)
-
 
+    sequences = checkPangenomeForClustering(pangenome, force)
 
     logging.getLogger().info("Clustering all of the genes sequences...")
-    rep, tsv = firstClustering(tmpFile, newtmpdir, cpu, code, coverage, identity)
+    rep, tsv = firstClustering(sequences, newtmpdir, cpu, code, coverage, identity, cacheDir)
     fam2seq = read_faa(rep)
     if not defrag:
-        genes2fam = read_tsv(tsv)[0]
+        with open(tsv.name, "r") as tsvfile:
+            genes2fam = read_tsv_arrays(tsvfile)
     else:
         logging.getLogger().info("Associating fragments to their original gene family...")
-        aln = alignRep(rep, newtmpdir, cpu, coverage, identity)
+        aln = alignRep(rep, newtmpdir, cpu, coverage, identity, cacheDir)
         genes2fam, fam2seq = refineClustering(tsv, aln, fam2seq)
         aln.close()
         pangenome.status["defragmented"] = "Computed"
-    tmpFile.close()
     tsv.close()
     rep.close()
     newtmpdir.cleanup()
     read_fam2seq(pangenome, fam2seq)
-    read_gene2fam(pangenome, genes2fam)
+    read_gene2fam(pangenome, *genes2fam)
     pangenome.status["genesClustered"] = "Computed"
     pangenome.status["geneFamilySequences"] = "Computed"
 
@@ -239,6 +276,7 @@ def clustering(pangenome, tmpdir, cpu , defrag = False, code = "11", coverage =
     pangenome.parameters["cluster"]["translation_table"] = code
     pangenome.parameters["cluster"]["read_clustering_from_file"] = False
 
+@measured(unit = "families", items = lambda pangenome, *args, **kwargs : pangenome.number_of_geneFamilies())
 def readClustering(pangenome, families_tsv_file, infer_singletons=False, force=False):
     """
         Creates the pangenome, the gene families and the genes with an associated gene family.
@@ -248,30 +286,13 @@ def readClustering(pangenome, families_tsv_file, infer_singletons=False, force=F
     checkPangenomeInfo(pangenome, needAnnotations=True)
 
     logging.getLogger().info("Reading "+families_tsv_file+" the gene families file ...")
-    filesize = os.stat(families_tsv_file).st_size
-    families_tsv_file = read_compressed_or_not(families_tsv_file)
-    frag = False
-    #the genome annotations are necessarily loaded.
-    nbGeneWtFam = 0
-    bar = tqdm(total = filesize, unit = "bytes")
-    for line in families_tsv_file:
-        bar.update(len(line))
-        elements = [el.strip() for el in line.split()] # 2 or 3 fields expected
-        if len(elements)<=1:
-            logging.getLogger().error("No tabulation separator found in gene families file")
-            exit(1)
-        (fam_id, gene_id, is_frag) = elements if len(elements) == 3 else elements+[None]
-
-        geneObj = pangenome.getGene(gene_id)
-        if geneObj is not None:
-            nbGeneWtFam+=1
-            fam = pangenome.addGeneFamily(fam_id)
-            geneObj.is_fragment =  True if is_frag == "F" else False
-            fam.addGene(geneObj)
-        if is_frag == "F":
-            frag=True
-    bar.close()
-    families_tsv_file.close()
+    with read_compressed_or_not(families_tsv_file) as tsvfile:
+        families, genes, geneFam, fragments = read_tsv_arrays(tsvfile)
+    #the genome annotations are necessarily loaded. The genes that are not in the pangenome are ignored.
+    geneObjs = [ pangenome.getGene(gene) for gene in genes ]
+    found = numpy.flatnonzero([ geneObj is not None for geneObj in geneObjs ])
+    nbGeneWtFam = len(found)
+    pangenome.addGenesToFamilies(geneObjs, families, found, geneFam[found], fragments[found])
     if nbGeneWtFam < len(pangenome.genes):#not all genes have an associated cluster
         if nbGeneWtFam == 0:
             raise Exception("No gene ID in the cluster file matched any gene ID from the annotation step. Please ensure that the annotations that you loaded previously and the clustering results that you have use the same gene IDs.")
@@ -281,7 +302,7 @@ def readClustering(pangenome, families_tsv_file, infer_singletons=False, force=F
             else:
                 raise Exception("Some genes did not have an associated cluster. Either change your cluster file so that each gene has a cluster, or use the --infer_singletons option to infer a cluster for each non-clustered gene.")
     pangenome.status["genesClustered"] = "Computed"
-    if frag:#if there was fragment informations in the file.
+    if fragments.any():#if there was fragment informations in the file.
         pangenome.status["defragmented"] = "Computed"
     pangenome.parameters["cluster"] = {}
     pangenome.parameters["cluster"]["read_clustering_from_file"] = True
@@ -292,7 +313,7 @@ def launch(args):
     pangenome = Pangenome()
     pangenome.addFile(args.pangenome)
     if args.clusters is None:
-        clustering(pangenome, args.tmpdir, args.cpu, args.defrag, args.translation_table, args.coverage, args.identity, args.force)
+        clustering(pangenome, args.tmpdir, args.cpu, args.defrag, args.translation_table, args.coverage, args.identity, args.force, args.mmseqs_cache)
         logging.getLogger().info("Done with the clustering")
     else:
         readClustering(pangenome, args.clusters, args.infer_singletons, args.force)
@@ -316,4 +337,5 @@ def clusterSubparser(subparser):
     optional.add_argument("--infer_singletons",required=False, action="store_true", help = "When reading a clustering result with --clusters, if a gene is not in the provided file it will be placed in a cluster where the gene is the only member.")
     optional.add_argument("--coverage", required=False, type=restricted_float, default=0.8, help = "Minimal coverage of the alignment for two proteins to be in the same cluster")
     optional.add_argument("--identity", required=False, type=restricted_float, default=0.8, help = "Minimal identity percent for two proteins to be in the same cluster")
+    optional.add_argument("--mmseqs_cache", required=False, type=str, default=None, help = "Directory where the mmseqs databases are kept, to be reused by the runs on the same sequences")
     return parser
\ No newline at end of file
@@ -7,12 +7,6 @@ from collections import defaultdict
 
 #installed libraries
 import numpy
-from scipy.spatial.distance import pdist
-from scipy.sparse import csc_matrix
-from scipy.cluster.hierarchy import linkage, dendrogram
-import plotly.graph_objs as go
-import plotly.offline as out_plotly
-import colorlover as cl
 #local libraries
 from ppanggolin.formats import checkPangenomeInfo
 
@@ -30,7 +24,14 @@ def jaccard_similarities(mat,jaccard_similarity_th):
     return similarities
 
 def drawTilePlot(pangenome, output, nocloud = False):
-    checkPangenomeInfo(pangenome, needAnnotations=True, needFamilies=True, needGraph=True)
+    #imported on call to keep the command line fast to start
+    from scipy.spatial.distance import pdist
+    from scipy.sparse import csc_matrix
+    from scipy.cluster.hierarchy import linkage, dendrogram
+    import plotly.graph_objs as go
+    import plotly.offline as out_plotly
+    import colorlover as cl
+    checkPangenomeInfo(pangenome, needAnnotations=True, needFamilies=True)
     if pangenome.status["partitionned"] == "No":
         raise Exception("Cannot draw the tile plot as your pangenome has not been partitionned")
     if len(pangenome.organisms) > 500 and nocloud is False:
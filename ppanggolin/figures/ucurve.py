@@ -2,14 +2,14 @@
 import logging
 from collections import defaultdict
 
-#installed libraries
-import plotly.graph_objs as go
-import plotly.offline as out_plotly
 #local libraries
 from ppanggolin.formats import checkPangenomeInfo
 
 def drawUCurve(pangenome, output, soft_core = 0.95):
-    checkPangenomeInfo(pangenome, needAnnotations=True, needFamilies=True, needGraph=True)
+    #imported on call to keep the command line fast to start
+    import plotly.graph_objs as go
+    import plotly.offline as out_plotly
+    checkPangenomeInfo(pangenome, needFamilies=True)
     logging.getLogger().info("Drawing the U-shaped curve...")
     max_bar = 0
     count = defaultdict(lambda : defaultdict(int))
@@ -8,9 +8,10 @@ import sys
 #installed libraries
 from tqdm import tqdm
 import tables
+import numpy
 
 #local libraries
-from ppanggolin.genome import Organism, Gene
+from ppanggolin.genome import Gene
 
 
 def getNumberOfOrganisms(pangenome):
@@ -23,11 +24,9 @@ def getNumberOfOrganisms(pangenome):
     annotations = h5f.root.annotations
 
     table = annotations.genes
-    orgSet = set()
-    for org in read_chunks(table, column = "organism"):
-        orgSet.add(org)
+    nbOrgs = len(numpy.unique(table.read(field = "organism")))
     h5f.close()
-    return len(orgSet)
+    return nbOrgs
 
 def getStatus(pangenome, pangenomeFile):
     """
@@ -61,56 +60,111 @@ def read_chunks(table, column = None, chunk=10000):
         for row in table.read(start = i, stop = i + chunk, field = column):
             yield row
 
-def getGeneSequencesFromFile(pangenome, fileObj, list_CDS=None):
+def getGeneSequenceBlocks(pangenome, list_CDS=None, chunk = 20000):
     """
-        Writes the CDS sequences of the Pangenome object to a tmpFile object that can by filtered or not by a list of CDS
-        Loads the sequences from a .h5 pangenome file
+        Yields the CDS sequences of a .h5 pangenome file, that can by filtered or not by a list of CDS, as blocks of fasta text in bytes.
+        The table is read chunk per chunk otherwise RAM dies on big pangenomes, and the sequences are never decoded.
     """
-    logging.getLogger().info("Extracting and writing all of the CDS sequences from a .h5 pangenome file to a fasta file")
     h5f = tables.open_file(pangenome.file,"r", driver_core_backing_store=0)
     table = h5f.root.geneSequences
     bar =  tqdm(range(table.nrows), unit="gene")
-    list_CDS=set(list_CDS) if list_CDS is not None else None
-    for row in read_chunks(table, chunk = 20000):#reading the table chunk per chunk otherwise RAM dies on big pangenomes
-        nameCDS = row[1].decode()
-        if row[2] == b"CDS" and (list_CDS is None or nameCDS in list_CDS):
-            fileObj.write('>' + nameCDS + "\n")
-            fileObj.write(row[0].decode() + "\n")
-        bar.update()
-    fileObj.flush()
+    list_CDS = numpy.array([ name.encode() for name in list_CDS ]) if list_CDS is not None else None
+    for rows in read_chunks_arrays(table, chunk):
+        keep = rows["type"] == b"CDS"
+        if list_CDS is not None:
+            keep &= numpy.isin(rows["gene"], list_CDS)
+        if keep.any():
+            yield b"".join( b">" + name + b"\n" + dna + b"\n" for name, dna in zip(rows["gene"][keep].tolist(), rows["dna"][keep].tolist()) )
+        bar.update(len(rows))
     bar.close()
     h5f.close()
 
-def launchReadOrganism(args):
-    return readOrganism(*args)
+def getGeneSequencesFromFile(pangenome, fileObj, list_CDS=None):
+    """
+        Writes the CDS sequences of the Pangenome object to a tmpFile object that can by filtered or not by a list of CDS
+        Loads the sequences from a .h5 pangenome file
+    """
+    logging.getLogger().info("Extracting and writing all of the CDS sequences from a .h5 pangenome file to a fasta file")
+    for block in getGeneSequenceBlocks(pangenome, list_CDS):
+        fileObj.write(block.decode())
+    fileObj.flush()
 
-def readOrganism(pangenome, orgName, contigDict, link = False):
-    org = Organism(orgName)
-    for contigName, geneList in contigDict.items():
-        contig = org.getOrAddContig(contigName, is_circular=geneList[0][0][0])
-        for row in geneList:
-            if link:#if the gene families are already computed/loaded the gene exists.
-                gene = pangenome.getGene(row[1][0].decode())
-            else:#else creating the gene.
-                gene = Gene(row[1][0].decode())
-            gene.fill_annotations(
-                start = row[1][6],
-                stop =row[1][7],
-                strand =  row[1][8].decode(),
-                geneType = row[1][9].decode(),
-                position = row[1][4],
-                genetic_code=row[1][1],
-                name = row[1][3].decode(),
-                product = row[1][5].decode())
-            gene.is_fragment = row[1][2]
-            gene.fill_parents(org, contig)
-            if gene.type == "CDS":
-                contig.addGene(gene)
-            elif "RNA" in gene.type.upper():
-                contig.addRNA(gene)
-            else:
-                raise Exception(f"A strange type ({gene.type}), which we do not know what to do with, was met.")
-    pangenome.addOrganism(org)
+def getSchemaVersion(h5f):
+    """
+        Returns the version of the schema with which the tables of the pangenome file were written.
+        Files written before the schema was versioned are version 1, where genes and gene families are referred to by their names in /geneFamilies and /edges.
+        From version 2, they are referred to by their row in /annotations/genes and in /geneFamiliesInfo.
+    """
+    if "/status" in h5f and "schemaVersion" in h5f.root.status._v_attrs._f_list():
+        return h5f.root.status._v_attrs.schemaVersion
+    return 1
+
+def read_chunks_arrays(table, chunk = 100000):
+    """
+        Reading entirely the provided table chunk per chunk, each chunk being returned as a numpy structured array.
+    """
+    for i in range(0, table.nrows, chunk):
+        yield table.read(start = i, stop = i + chunk)
+
+def getGenesByRow(pangenome, h5f):
+    """
+        Returns a numpy array with the gene objects of the pangenome at the index of their row in the annotation table.
+        If the annotations have not been loaded, the genes are created from their IDs.
+    """
+    genes = getattr(pangenome, "_genesByRow", None)
+    if genes is None:
+        IDs = decodeColumn(h5f.root.annotations.genes.read(field = "gene/ID"), shared = False)
+        genes = numpy.empty(len(IDs), dtype = object)
+        if pangenome.status["genomesAnnotated"] in ["Computed","Loaded"]:
+            genes[:] = [ pangenome.getGene(ID) for ID in IDs ]
+        else:
+            genes[:] = [ Gene(ID) for ID in IDs ]
+        pangenome._genesByRow = genes
+    return genes
+
+def getFamiliesByRow(pangenome, h5f):
+    """
+        Returns the gene families of the pangenome in the order of the rows of the gene family information table, which is what their indexes refer to.
+        The families are created if they do not exist.
+    """
+    return [ pangenome.addGeneFamily(name) for name in decodeColumn(h5f.root.geneFamiliesInfo.read(field = "name"), shared = False) ]
+
+def getOrganismsByRow(pangenome, h5f):
+    """
+        Returns the organisms of the pangenome in the order of the rows of the organism table, which is what their indexes refer to.
+        The organisms are created, without their contigs and genes, if they do not exist.
+    """
+    return [ pangenome.addOrganism(sys.intern(name)) for name in decodeColumn(h5f.root.organisms.read(field = "name"), shared = False) ]
+
+def readFamilyOrganisms(pangenome, h5f):
+    """
+        Reads the gene families and the organisms they are in, without their genes.
+    """
+    table = h5f.root.familyOrganisms
+    families = getFamiliesByRow(pangenome, h5f)
+    organisms = getOrganismsByRow(pangenome, h5f)
+    bar = tqdm(range(table.nrows), unit = "gene family in organism")
+    for rows in read_chunks_arrays(table):
+        for famIndex, orgIndex in zip(rows["geneFam"].tolist(), rows["organism"].tolist()):
+            families[famIndex].addOrganism(organisms[orgIndex])
+        bar.update(len(rows))
+    bar.close()
+    pangenome.status["genesClustered"] = "Loaded"
+
+def readFamilyEdges(pangenome, h5f):
+    """
+        Reads the edges between the gene families with the number of gene pairs they link in each organism, without the genes.
+    """
+    table = h5f.root.familyEdges
+    families = getFamiliesByRow(pangenome, h5f)
+    organisms = getOrganismsByRow(pangenome, h5f)
+    bar = tqdm(range(table.nrows), unit = "gene family adjacency")
+    for rows in read_chunks_arrays(table):
+        for source, target, orgIndex, nbGenePairs in zip(rows["source"].tolist(), rows["target"].tolist(), rows["organism"].tolist(), rows["nbGenePairs"].tolist()):
+            pangenome.addFamilyEdge(families[source], families[target], organisms[orgIndex], nbGenePairs)
+        bar.update(len(rows))
+    bar.close()
+    pangenome.status["neighborsGraph"] = "Loaded"
 
 def readGraph(pangenome, h5f):
     table = h5f.root.edges
@@ -118,11 +172,21 @@ def readGraph(pangenome, h5f):
     if not pangenome.status["genomesAnnotated"] in ["Computed","Loaded"] or not pangenome.status["genesClustered"] in ["Computed","Loaded"] :
         raise Exception("It's not possible to read the graph if the annotations and the gene families have not been loaded.")
     bar = tqdm(range(table.nrows), unit = "contig adjacency")
-    for row in read_chunks(table):
-        source = pangenome.getGene(row[0].decode())
-        target = pangenome.getGene(row[1].decode())
-        pangenome.addEdge(source, target)
-        bar.update()
+    if getSchemaVersion(h5f) < 2:
+        for row in read_chunks(table):
+            source = pangenome.getGene(row[0].decode())
+            target = pangenome.getGene(row[1].decode())
+            pangenome.addEdge(source, target)
+            bar.update()
+    else:
+        genes = getGenesByRow(pangenome, h5f)
+        sources = [numpy.zeros(0, dtype = numpy.int64)]
+        targets = [numpy.zeros(0, dtype = numpy.int64)]
+        for rows in read_chunks_arrays(table):
+            sources.append(rows["geneSource"].astype(numpy.int64))
+            targets.append(rows["geneTarget"].astype(numpy.int64))
+            bar.update(len(rows))
+        pangenome.addEdges(genes, numpy.concatenate(sources), numpy.concatenate(targets))
     bar.close()
     pangenome.status["neighborsGraph"] = "Loaded"
 
@@ -132,56 +196,177 @@ def readGeneFamilies(pangenome, h5f):
     link = True if pangenome.status["genomesAnnotated"] in ["Computed", "Loaded"] else False
 
     bar = tqdm(range(table.nrows), unit = "gene")
-    for row in read_chunks(table):
-        fam = pangenome.addGeneFamily(row[1].decode())
-        if link:#linking if we have loaded the annotations
-            geneObj = pangenome.getGene(row[0].decode())
-        else:#else, no
-            geneObj = Gene(row[1].decode())
-        fam.addGene(geneObj)
-        bar.update()
+    if getSchemaVersion(h5f) < 2:
+        for rows in read_chunks_arrays(table):
+            geneIDs = decodeColumn(rows["gene"], shared = False)
+            if link:#linking if we have loaded the annotations
+                genes = [ pangenome.getGene(ID) for ID in geneIDs ]
+            else:#else, no
+                genes = [ Gene(ID) for ID in geneIDs ]
+            famNames = decodeColumn(rows["geneFam"])
+            famIndex = { name : i for i, name in enumerate(dict.fromkeys(famNames)) }
+            pangenome.addGenesToFamilies(genes, list(famIndex), numpy.arange(len(genes)), [ famIndex[name] for name in famNames ])
+            bar.update(len(rows))
+    else:
+        families = getFamiliesByRow(pangenome, h5f)
+        genes = getGenesByRow(pangenome, h5f)
+        for rows in read_chunks_arrays(table):
+            pangenome.addGenesToFamilies(genes, families, rows["gene"], rows["geneFam"])
+            bar.update(len(rows))
     bar.close()
     pangenome.status["genesClustered"] = "Loaded"
 
+def lazyGeneAttribute(pangenome, attr):
+    """
+        Registers the loading of an attribute of the genes from the annotation table, to be done on the first access to the attribute of any gene.
+    """
+    def load():
+        logging.getLogger().debug(f"Reading the gene {attr}s from the pangenome file...")
+        h5f = tables.open_file(pangenome.file,"r")
+        values = decodeColumn(h5f.root.annotations.genes.read(field = "gene/" + attr))
+        h5f.close()
+        for gene, value in zip(pangenome._genesByRow, values):
+            setattr(gene, attr, value)
+    pangenome._lazyLoaders.setdefault(attr, []).append(load)
+
+def lazyFamilySequences(pangenome):
+    """
+        Registers the loading of the protein sequences of the gene families, to be done on the first access to the sequence of any gene family.
+    """
+    def load():
+        logging.getLogger().debug("Reading the gene family sequences from the pangenome file...")
+        h5f = tables.open_file(pangenome.file,"r")
+        table = h5f.root.geneFamiliesInfo
+        for name, protein in zip(decodeColumn(table.read(field = "name"), shared = False), decodeColumn(table.read(field = "protein"), shared = False)):
+            fam = pangenome.getGeneFamily(name)
+            if fam._sequence is None:#unless it has been given another sequence since.
+                fam.addSequence(protein)
+        h5f.close()
+    pangenome._lazyLoaders.setdefault("sequence", []).append(load)
+
+def getFamilySequencesDigest(pangenome):
+    """
+        Returns the digest of the gene family sequences that was written with them in the pangenome file, without reading them, or None if the file has none.
+    """
+    h5f = tables.open_file(pangenome.file,"r")
+    attrs = h5f.root.geneFamiliesInfo.attrs
+    digest = attrs.sequencesDigest if "sequencesDigest" in attrs._f_list() else None
+    h5f.close()
+    return digest
+
 def readGeneFamiliesInfo(pangenome, h5f):
     table = h5f.root.geneFamiliesInfo
 
     bar = tqdm(range(table.nrows), unit = "gene family")
-    for row in read_chunks(table):
-        fam = pangenome.addGeneFamily(row[0].decode())
-        fam.addPartition(row[1].decode())
-        fam.addSequence(row[2].decode())
+    #the protein sequences are only read if they are used.
+    for name, partition in zip(decodeColumn(table.read(field = "name"), shared = False), decodeColumn(table.read(field = "partition"))):
+        fam = pangenome.addGeneFamily(name)
+        fam.addPartition(partition)
         bar.update()
     bar.close()
     if h5f.root.status._v_attrs.Partitionned:
         pangenome.status["partitionned"] = "Loaded"
     if h5f.root.status._v_attrs.geneFamilySequences:
+        lazyFamilySequences(pangenome)
         pangenome.status["geneFamilySequences"] = "Loaded"
 
+def decodeColumn(column, shared = True):
+    """
+        Decodes a column of bytes read from a table into a list of str.
+        If shared is True, identical values are decoded once and share the same str object (for columns with a lot of redundancy such as products).
+    """
+    if not shared:
+        return list(map(bytes.decode, column.tolist()))
+    decoded = {}
+    values = []
+    for val in column.tolist():
+        strVal = decoded.get(val)
+        if strVal is None:
+            strVal = decoded[val] = val.decode()
+        values.append(strVal)
+    return values
+
+def groupAnnotationRows(table):
+    """
+        Reads the organism and contig columns of the annotation table, and returns the row indexes sorted so that the rows of a same organism, and of a same contig, are contiguous.
+        Organisms and contigs stay in the order in which they are met in the table.
+    """
+    _, orgFirst, orgCodes = numpy.unique(table.read(field="organism"), return_index = True, return_inverse = True)
+    _, contigCodes = numpy.unique(table.read(field="contig/name"), return_inverse = True)
+    #a contig is identified by its organism and its name, as contig names are not necessarily unique between organisms.
+    pairCodes = orgCodes.ravel().astype(numpy.int64) * (contigCodes.max(initial = 0) + 1) + contigCodes.ravel()
+    _, pairFirst, pairCodes = numpy.unique(pairCodes, return_index = True, return_inverse = True)
+    #ranking the organisms, then the contigs, by their first appearance in the table.
+    orgRank = numpy.argsort(numpy.argsort(orgFirst))[orgCodes.ravel()]
+    pairRank = numpy.argsort(numpy.argsort(pairFirst))[pairCodes.ravel()]
+    return numpy.lexsort((pairRank, orgRank))
+
+def read_sorted_chunks(table, order, chunk = 100000):
+    """
+        Reads the rows of the provided table in the given order, chunk per chunk to limit RAM usage.
+    """
+    contiguous = bool(numpy.all(order[1:] > order[:-1]))
+    for i in range(0, len(order), chunk):
+        if contiguous:
+            yield table.read(start = order[i], stop = order[min(i + chunk, len(order)) - 1] + 1)
+        else:
+            yield table.read_coordinates(order[i:i + chunk])
+
 def readAnnotation(pangenome, h5f, filename):
     annotations = h5f.root.annotations
 
     table = annotations.genes
-    bar = tqdm(range(table.nrows), unit="gene")
-    pangenomeDict = {}
-    for row in read_chunks(table):
-        try:
-            pangenomeDict[row[2].decode()][row[0][1].decode()].append(row)#new gene, seen contig, seen org
-        except KeyError:
-            try:
-                pangenomeDict[row[2].decode()][row[0][1].decode()] = [row]#new contig, seen org
-            except KeyError:
-                pangenomeDict[sys.intern(row[2].decode())] = { row[0][1].decode() : [row]}#new org
-        bar.update()
-    bar.close()
-
     link = True if pangenome.status["genesClustered"] in ["Computed","Loaded"] else False
 
-    bar = tqdm(range(len(pangenomeDict)), unit = "organism")
-    for orgName, contigDict in pangenomeDict.items():
-        readOrganism(pangenome, orgName, contigDict, link)
-        bar.update()
+    order = groupAnnotationRows(table)
+    bar = tqdm(range(table.nrows), unit="gene")
+    org = None
+    contig = None
+    genes = []
+    for rows in read_sorted_chunks(table, order):
+        orgNames = decodeColumn(rows["organism"])
+        contigNames = decodeColumn(rows["contig"]["name"])
+        geneRows = rows["gene"]
+        #all the columns are read and decoded at once for the whole chunk, then the objects are created in a single pass.
+        for orgName, contigName, is_circular, ID, start, stop, strand, geneType, position, genetic_code, is_fragment in zip(
+                orgNames, contigNames, rows["contig"]["is_circular"].tolist(),
+                decodeColumn(geneRows["ID"], shared = False), geneRows["start"].tolist(), geneRows["stop"].tolist(),
+                decodeColumn(geneRows["strand"]), decodeColumn(geneRows["type"]), geneRows["position"].tolist(),
+                geneRows["genetic_code"].tolist(), geneRows["is_fragment"].tolist()):
+            if org is None or org.name != orgName:
+                org = pangenome.addOrganism(sys.intern(orgName))
+                contig = None
+            if contig is None or contig.name != contigName:
+                contig = org.getOrAddContig(contigName, is_circular = is_circular)
+            if link:#if the gene families are already computed/loaded the gene exists.
+                gene = pangenome.getGene(ID)
+                if gene is None:
+                    raise Exception(f"The gene '{ID}' is not in the gene families. If they were read without their genes, the annotations must be read first.")
+            else:#else creating the gene.
+                gene = Gene(ID)
+            #the names and products are not set here, they are read on their first use.
+            gene.start = start
+            gene.stop = stop
+            gene.strand = strand
+            gene.type = geneType
+            gene.position = position
+            gene.genetic_code = genetic_code
+            gene.is_fragment = is_fragment
+            gene.fill_parents(org, contig)
+            if geneType == "CDS":
+                contig.addGene(gene)
+            elif "RNA" in geneType.upper():
+                contig.addRNA(gene)
+            else:
+                raise Exception(f"A strange type ({geneType}), which we do not know what to do with, was met.")
+            genes.append(gene)
+        bar.update(len(rows))
     bar.close()
+    #keeping the genes at the index of their row, as it is how the other tables refer to them.
+    pangenome._genesByRow = numpy.empty(table.nrows, dtype = object)
+    pangenome._genesByRow[order] = genes
+    lazyGeneAttribute(pangenome, "name")
+    lazyGeneAttribute(pangenome, "product")
     pangenome.status["genomesAnnotated"] = "Loaded"
 
 def readInfo(h5f):
@@ -223,23 +408,35 @@ def readPangenome(pangenome, annotation = False, geneFamilies = False, graph = F
     else:
         raise FileNotFoundError("The provided pangenome does not have an associated .h5 file")
     h5f = tables.open_file(filename,"r")
+    annotated = pangenome.status["genomesAnnotated"] in ["Computed","Loaded"]
+    if graph and not annotated and not "/familyEdges" in h5f:
+        annotation = True#without the gene family level tables, the graph can only be read from the genes.
     if annotation:
         if h5f.root.status._v_attrs.genomesAnnotated:
             logging.getLogger().info("Reading pangenome annotations...")
             readAnnotation(pangenome, h5f, filename)
+            annotated = True
         else:
             raise Exception(f"The pangenome in file '{filename}' has not been annotated, or has been improperly filled")
     if geneFamilies:
         if h5f.root.status._v_attrs.genesClustered:
-            logging.getLogger().info("Reading pangenome gene families...")
-            readGeneFamilies(pangenome, h5f)
+            if annotated or not "/familyOrganisms" in h5f:
+                logging.getLogger().info("Reading pangenome gene families...")
+                readGeneFamilies(pangenome, h5f)
+            else:
+                logging.getLogger().info("Reading pangenome gene families, without their genes...")
+                readFamilyOrganisms(pangenome, h5f)
             readGeneFamiliesInfo(pangenome, h5f)
         else:
             raise Exception(f"The pangenome in file '{filename}' does not have gene families, or has been improperly filled")
     if graph:
         if h5f.root.status._v_attrs.NeighborsGraph:
-            logging.getLogger().info("Reading the neighbors graph edges...")
-            readGraph(pangenome, h5f)
+            if annotated:
+                logging.getLogger().info("Reading the neighbors graph edges...")
+                readGraph(pangenome, h5f)
+            else:
+                logging.getLogger().info("Reading the neighbors graph edges between gene families...")
+                readFamilyEdges(pangenome, h5f)
         else:
             raise Exception(f"The pangenome in file '{filename}' does not have graph informations, or has been improperly filled")
     h5f.close()
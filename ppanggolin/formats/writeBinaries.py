@@ -9,6 +9,38 @@ import statistics
 #installed libraries
 from tqdm import tqdm
 import tables
+import numpy
+
+#local libraries
+from ppanggolin.formats.readBinaries import getSchemaVersion, decodeColumn
+from ppanggolin.metrics import measured
+from ppanggolin.mmseqsCache import fastaBlocks, blocksDigest
+
+#version of the schema of the tables written in the pangenome file. Version 2 refers to genes and gene families by their row index in /geneFamilies and /edges.
+schemaVersion = 2
+
+def getMaxLen(*columns):
+    """
+        Returns the length of the longest of the strings in the given columns, to size the string column that will hold them.
+    """
+    return max([1] + [ max(map(len, column), default = 1) for column in columns ])
+
+def appendColumns(table, columns, batchSize = 100000):
+    """
+        Appends the given columns to the table, batchSize rows at a time.
+        columns gives the list of values of each column, indexed by its path in the table (for instance 'contig/name'). The columns that are not given take their default value.
+    """
+    nbRows = len(next(iter(columns.values()), []))
+    for start in range(0, nbRows, batchSize):
+        batch = numpy.empty(min(batchSize, nbRows - start), dtype = table.dtype)
+        for path in table.colpathnames:
+            field = batch
+            for name in path.split("/"):
+                field = field[name]
+            values = columns.get(path)
+            field[:] = table.coldflts[path] if values is None else values[start:start + batchSize]
+        table.append(batch)
+    table.flush()
 
 def geneDesc(orgLen, contigLen, IDLen, typeLen, nameLen, productLen):
     return {
@@ -31,90 +63,69 @@ def geneDesc(orgLen, contigLen, IDLen, typeLen, nameLen, productLen):
             }
             }
 
-def getMaxLenAnnotations(pangenome):
-    maxOrgLen = 1
-    maxContigLen = 1
-    maxGeneIDLen = 1
-    maxNameLen = 1
-    maxProductLen = 1
-    maxTypeLen = 1
-    for org in pangenome.organisms:
-        if len(org.name) > maxOrgLen:
-            maxOrgLen = len(org.name)
-        for contig in org.contigs:
-            if len(contig.name) > maxContigLen:
-                maxContigLen = len(contig.name)
-            for gene in contig.genes:
-                if len(gene.ID) > maxGeneIDLen:
-                    maxGeneIDLen = len(gene.ID)
-                if len(gene.name) > maxNameLen:
-                    maxNameLen = len(gene.name)
-                if len(gene.product) > maxProductLen:
-                    maxProductLen = len(gene.product)
-                if len(gene.type) > maxTypeLen:
-                    maxTypeLen = len(gene.type)
-    return maxOrgLen, maxContigLen, maxGeneIDLen, maxTypeLen, maxNameLen, maxProductLen
-
-def writeAnnotations(pangenome, h5f):
+#string columns of the annotation tables, whose size is given to geneDesc in that order.
+annotationStringColumns = ["organism", "contig/name", "gene/ID", "gene/type", "gene/name", "gene/product"]
+
+def getAnnotationColumns(organisms):
     """
-        Function writing all of the pangenome's annotations
+        Returns the columns of the gene and of the RNA annotation tables for the given organisms.
     """
-    annotation = h5f.create_group("/","annotations","Annotations of the pangenome's organisms")
-    geneTable = h5f.create_table(annotation, "genes", geneDesc(*getMaxLenAnnotations(pangenome)), expectedrows=len(pangenome.genes))
-    nbRNA = 0
-    for org in pangenome.organisms:
-        for contig in org.contigs:
-            nbRNA += len(contig.RNAs)
-    rnaTable = h5f.create_table(annotation, "RNA",geneDesc(*getMaxLenAnnotations(pangenome)), expectedrows=nbRNA)
-    rnaRow = rnaTable.row
-    bar = tqdm(pangenome.organisms, unit="genome")
-    geneRow = geneTable.row
+    genes = defaultdict(list)
+    rnas = defaultdict(list)
+    bar = tqdm(organisms, unit="genome")
     for org in bar:
         for contig in org.contigs:
-            for gene in contig.genes:
-                geneRow["organism"] = org.name
-                geneRow["contig/name"] = contig.name
-                geneRow["contig/is_circular"] = contig.is_circular#this should be somewhere else.
-                geneRow["gene/ID"]= gene.ID
-                geneRow["gene/start"] = gene.start
-                geneRow["gene/stop"] = gene.stop
-                geneRow["gene/strand"] = gene.strand
-                geneRow["gene/type"] = gene.type
-                geneRow["gene/position"] = gene.position
-                geneRow["gene/name"] = gene.name
-                geneRow["gene/product"] = gene.product
-                geneRow["gene/is_fragment"] = gene.is_fragment
-                geneRow["gene/genetic_code"] = gene.genetic_code
-                geneRow.append()
-            for rna in contig.RNAs:
-                rnaRow["organism"] = org.name
-                rnaRow["contig/name"] = contig.name
-                rnaRow["contig/is_circular"] = contig.is_circular#this should be somewhere else.
-                rnaRow["gene/ID"]= rna.ID
-                rnaRow["gene/start"] = rna.start
-                rnaRow["gene/stop"] = rna.stop
-                rnaRow["gene/strand"] = rna.strand
-                rnaRow["gene/type"] = rna.type
-                rnaRow["gene/name"] = rna.name
-                rnaRow["gene/product"] = rna.product
-                rnaRow["gene/is_fragment"] = rna.is_fragment
-    geneTable.flush()
-    rnaTable.flush()
+            for columns, features in (genes, contig.genes), (rnas, contig.RNAs):
+                columns["organism"].extend([org.name] * len(features))
+                columns["contig/name"].extend([contig.name] * len(features))
+                columns["contig/is_circular"].extend([contig.is_circular] * len(features))#this should be somewhere else.
+                for attr in "ID", "start", "stop", "strand", "type", "name", "product", "is_fragment":
+                    columns["gene/" + attr].extend([ getattr(feature, attr) for feature in features ])
+            #RNAs have no position nor genetic code, they keep the default values of those columns.
+            genes["gene/position"].extend([ gene.position for gene in contig.genes ])
+            genes["gene/genetic_code"].extend([ gene.genetic_code for gene in contig.genes ])
     bar.close()
+    return genes, rnas
 
-
-def getGeneSequencesLen(pangenome):
-    maxSeqLen = 1
-    maxGeneIDLen = 1
-    maxGeneType = 1
-    for gene in pangenome.genes:
-        if len(gene.dna) > maxSeqLen:
-            maxSeqLen = len(gene.dna)
-        if len(gene.ID) > maxGeneIDLen:
-            maxGeneIDLen = len(gene.ID)
-        if len(gene.type) > maxGeneType:
-            maxGeneType = len(gene.type)
-    return maxGeneIDLen, maxSeqLen, maxGeneType
+@measured(unit = "organisms", items = lambda pangenome, *args, **kwargs : pangenome.number_of_organisms())
+def writeAnnotations(pangenome, h5f, batchSize = 100000):
+    """
+        Function writing all of the pangenome's annotations
+    """
+    annotation = h5f.create_group("/","annotations","Annotations of the pangenome's organisms")
+    genes, rnas = getAnnotationColumns(pangenome.organisms)
+    desc = geneDesc(*[ getMaxLen(genes[column], rnas[column]) for column in annotationStringColumns ])
+    geneTable = h5f.create_table(annotation, "genes", desc, expectedrows=len(genes["gene/ID"]))
+    appendColumns(geneTable, genes, batchSize)
+    rnaTable = h5f.create_table(annotation, "RNA", desc, expectedrows=len(rnas["gene/ID"]))
+    appendColumns(rnaTable, rnas, batchSize)
+
+def resizeTable(h5f, table, desc, chunk = 100000):
+    """
+        Returns the table with the given description. If its own description differs, as when its string columns are too small for new values, the table is first copied to a new one with the given description.
+    """
+    dtype = tables.Description(desc)._v_dtype
+    if table.dtype == dtype:
+        return table
+    where, name = table._v_parent, table.name
+    newTable = h5f.create_table(where, name + "_resized", desc, expectedrows=table.nrows)
+    for i in range(0, table.nrows, chunk):
+        newTable.append(table.read(start = i, stop = i + chunk).astype(dtype))
+    newTable.flush()
+    h5f.remove_node(where, name)
+    newTable.rename(name)
+    return newTable
+
+@measured(unit = "organisms", items = lambda organisms, *args, **kwargs : len(organisms))
+def appendAnnotations(organisms, h5f, batchSize = 100000):
+    """
+        Appends the annotations of the given organisms to the annotation tables of a pangenome file, after the rows that are already there.
+    """
+    genes, rnas = getAnnotationColumns(organisms)
+    geneTable, rnaTable = h5f.root.annotations.genes, h5f.root.annotations.RNA
+    desc = geneDesc(*[ max(getMaxLen(genes[column], rnas[column]), geneTable.coldtypes[column].itemsize, rnaTable.coldtypes[column].itemsize) for column in annotationStringColumns ])
+    appendColumns(resizeTable(h5f, geneTable, desc, batchSize), genes, batchSize)
+    appendColumns(resizeTable(h5f, rnaTable, desc, batchSize), rnas, batchSize)
 
 def geneSequenceDesc(geneIDLen, geneSeqLen, geneTypeLen):
     return {
@@ -123,18 +134,30 @@ def geneSequenceDesc(geneIDLen, geneSeqLen, geneTypeLen):
         "type":tables.StringCol(itemsize=geneTypeLen)
     }
 
-def writeGeneSequences(pangenome, h5f):
-    geneSeq = h5f.create_table("/","geneSequences", geneSequenceDesc(*getGeneSequencesLen(pangenome)), expectedrows=len(pangenome.genes))
-    geneRow = geneSeq.row
-    bar = tqdm(pangenome.genes, unit = "gene")
+def getGeneSequenceColumns(genes):
+    columns = defaultdict(list)
+    bar = tqdm(genes, unit = "gene")
     for gene in bar:
-        geneRow["gene"] = gene.ID
-        geneRow["dna"] = gene.dna
-        geneRow["type"] = gene.type
-        geneRow.append()
-    geneSeq.flush()
+        columns["gene"].append(gene.ID)
+        columns["dna"].append(gene.dna)
+        columns["type"].append(gene.type)
     bar.close()
+    return columns
+
+@measured()
+def writeGeneSequences(pangenome, h5f, batchSize = 100000):
+    columns = getGeneSequenceColumns(pangenome.genes)
+    geneSeq = h5f.create_table("/","geneSequences", geneSequenceDesc(getMaxLen(columns["gene"]), getMaxLen(columns["dna"]), getMaxLen(columns["type"])), expectedrows=len(columns["gene"]))
+    appendColumns(geneSeq, columns, batchSize)
 
+def appendGeneSequences(genes, h5f, batchSize = 100000):
+    """
+        Appends the sequences of the given genes to the gene sequence table of a pangenome file.
+    """
+    columns = getGeneSequenceColumns(genes)
+    table = h5f.root.geneSequences
+    desc = geneSequenceDesc(*[ max(getMaxLen(columns[column]), table.coldtypes[column].itemsize) for column in ["gene", "dna", "type"] ])
+    appendColumns(resizeTable(h5f, table, desc, batchSize), columns, batchSize)
 
 def geneFamDesc(maxNameLen, maxSequenceLength, maxPartLen):
      return {
@@ -143,111 +166,200 @@ def geneFamDesc(maxNameLen, maxSequenceLength, maxPartLen):
         "partition": tables.StringCol(itemsize=maxPartLen)
         }
 
-def getGeneFamLen(pangenome):
-    maxGeneFamNameLen = 1
-    maxGeneFamSeqLen = 1
-    maxPartLen = 1
-    for genefam in pangenome.geneFamilies:
-        if len(genefam.sequence) > maxGeneFamSeqLen:
-            maxGeneFamSeqLen = len(genefam.sequence)
-        if len(genefam.name) > maxGeneFamNameLen:
-            maxGeneFamNameLen = len(genefam.name)
-        if len(genefam.partition) > maxPartLen:
-            maxPartLen = len(genefam.partition)
-    return maxGeneFamNameLen, maxGeneFamSeqLen, maxPartLen
-
-def writeGeneFamInfo(pangenome, h5f, force):
+@measured(unit = "families", items = lambda pangenome, *args, **kwargs : pangenome.number_of_geneFamilies())
+def writeGeneFamInfo(pangenome, h5f, force, batchSize = 100000):
     """
         Writing a table containing the protein sequences of each family
     """
     if '/geneFamiliesInfo' in h5f and force is True:
         logging.getLogger().info("Erasing the formerly computed gene family representative sequences...")
         h5f.remove_node('/', 'geneFamiliesInfo')#erasing the table, and rewriting a new one.
-    geneFamSeq = h5f.create_table("/","geneFamiliesInfo",geneFamDesc(*getGeneFamLen(pangenome)), expectedrows=len(pangenome.geneFamilies))
-
-    row = geneFamSeq.row
+    columns = defaultdict(list)
     bar = tqdm( pangenome.geneFamilies, unit = "gene family")
     for fam in bar:
-        row["name"] = fam.name
-        row["protein"] = fam.sequence
-        row["partition"] = fam.partition
-        row.append()
-    geneFamSeq.flush()
+        columns["name"].append(fam.name)
+        columns["protein"].append(fam.sequence)
+        columns["partition"].append(fam.partition)
     bar.close()
+    geneFamSeq = h5f.create_table("/","geneFamiliesInfo",geneFamDesc(getMaxLen(columns["name"]), getMaxLen(columns["protein"]), getMaxLen(columns["partition"])), expectedrows=len(columns["name"]))
+    appendColumns(geneFamSeq, columns, batchSize)
+    #so that the mmseqs database of the representatives can be found in a cache without reading them.
+    geneFamSeq.attrs.sequencesDigest = blocksDigest(fastaBlocks(zip(columns["name"], columns["protein"])))
 
+def getGeneIndex(h5f):
+    """
+        Returns a dictionnary with the row of each gene in the annotation table, which is the index used to refer to the genes in the other tables.
+    """
+    return { ID : row for row, ID in enumerate(decodeColumn(h5f.root.annotations.genes.read(field = "gene/ID"), shared = False)) }
 
-def gene2famDesc(geneFamNameLen, geneIDLen):
+def gene2famDesc():
     return {
-        "geneFam": tables.StringCol(itemsize = geneFamNameLen),
-        "gene":tables.StringCol(itemsize= geneIDLen)
+        "geneFam": tables.UInt32Col(),
+        "gene":tables.UInt32Col()
         }
 
-def getGene2famLen(pangenome):
-    maxGeneFamName = 1
-    maxGeneID = 1
-    for geneFam in pangenome.geneFamilies:
-        if len(geneFam.name)>maxGeneFamName:
-            maxGeneFamName = len(geneFam.name)
-        for gene in geneFam.genes:
-            if len(gene.ID) > maxGeneID:
-                maxGeneID = len(gene.ID)
-    return maxGeneFamName, maxGeneID
-
-def writeGeneFamilies(pangenome, h5f, force):
+@measured(unit = "families", items = lambda pangenome, *args, **kwargs : pangenome.number_of_geneFamilies())
+def writeGeneFamilies(pangenome, h5f, force, batchSize = 100000):
     """
         Function writing all of the pangenome's gene families
     """
     if '/geneFamilies' in h5f and force is True:
         logging.getLogger().info("Erasing the formerly computed gene family to gene associations...")
         h5f.remove_node('/', 'geneFamilies')#erasing the table, and rewriting a new one.
-    geneFamilies = h5f.create_table("/", "geneFamilies",gene2famDesc(*getGene2famLen(pangenome)))
-    geneRow = geneFamilies.row
+        if '/familyOrganisms' in h5f:
+            h5f.remove_node('/', 'familyOrganisms')
+    geneIndex = getGeneIndex(h5f)
+    columns = defaultdict(list)
     bar = tqdm(pangenome.geneFamilies, unit = "gene family")
-    for geneFam in bar:
-        for gene in geneFam.genes:
-            geneRow["gene"] = gene.ID
-            geneRow["geneFam"] = geneFam.name
-            geneRow.append()
-    geneFamilies.flush()
+    for famIndex, geneFam in enumerate(bar):#the gene families are written in the same order in /geneFamiliesInfo, whose rows are the family indexes.
+        columns["gene"].extend([ geneIndex[gene.ID] for gene in geneFam.genes ])
+        columns["geneFam"].extend([famIndex] * len(geneFam.genes))
     bar.close()
+    geneFamilies = h5f.create_table("/", "geneFamilies", gene2famDesc(), expectedrows=len(columns["gene"]))
+    appendColumns(geneFamilies, columns, batchSize)
 
-
-def graphDesc(maxGeneIDLen):
+def graphDesc():
     return {
-            'geneTarget':tables.StringCol(itemsize = maxGeneIDLen),
-            'geneSource':tables.StringCol(itemsize = maxGeneIDLen)
+            'geneTarget':tables.UInt32Col(),
+            'geneSource':tables.UInt32Col()
         }
 
-def getGeneIDLen(pangenome):
-    maxGeneLen = 1
-    for gene in pangenome.genes:
-        if len(gene.ID) > maxGeneLen:
-            maxGeneLen=len(gene.ID)
-    return maxGeneLen
-
-def writeGraph(pangenome, h5f, force):
-    #if we want to be able to read the graph without reading the annotations (because it is one of the most time consumming parts to read), it might be good to add the organism name in the table here.
-    #for now, forcing the read of annotations.
+@measured(unit = "edges", items = lambda pangenome, *args, **kwargs : len(pangenome.edges))
+def writeGraph(pangenome, h5f, force, batchSize = 100000):
+    #the edges between gene families, which can be read without the annotations, are computed from this table in writeFamilyLevelTables.
     if '/edges' in h5f and force is True:
         logging.getLogger().info("Erasing the formerly computed edges")
         h5f.remove_node("/","edges")
-    edgeTable = h5f.create_table("/","edges", graphDesc(getGeneIDLen(pangenome)), expectedrows=len(pangenome.edges))
-    edgeRow = edgeTable.row
-    bar = tqdm(pangenome.edges, unit = "edge")
-    for edge in bar:
-        for _, genePairs in edge.organisms.items():
-            for gene1, gene2 in genePairs:
-                edgeRow["geneTarget"] = gene1.ID
-                edgeRow["geneSource"] = gene2.ID
-                edgeRow.append()
+        if '/familyEdges' in h5f:
+            h5f.remove_node("/","familyEdges")
+    geneIndex = getGeneIndex(h5f)
+    if hasattr(pangenome, "_graph"):#the gene pairs are read from the arrays, without making the edges.
+        graph = pangenome._graph
+        rows = numpy.array([ geneIndex[gene.ID] for gene in graph.genes ], dtype = numpy.int64)
+        sources, targets = graph.genePairs()
+        columns = {"geneTarget":rows[sources], "geneSource":rows[targets]}
+    else:
+        bar = tqdm(pangenome.edges, unit = "edge")
+        genePairs = [ genePair for edge in bar for orgGenePairs in edge.organisms.values() for genePair in orgGenePairs ]
+        bar.close()
+        columns = {"geneTarget":[ geneIndex[gene1.ID] for gene1, _ in genePairs ],
+                   "geneSource":[ geneIndex[gene2.ID] for _, gene2 in genePairs ]}
+    edgeTable = h5f.create_table("/","edges", graphDesc(), expectedrows=len(columns["geneTarget"]))
+    appendColumns(edgeTable, columns, batchSize)
+
+def organismDesc(maxNameLen):
+    return {
+        "name":tables.StringCol(itemsize = maxNameLen)
+        }
+
+def familyOrganismDesc():
+    return {
+        "geneFam":tables.UInt32Col(),
+        "organism":tables.UInt32Col(),
+        "nbGenes":tables.UInt32Col()
+        }
+
+def familyEdgeDesc():
+    return {
+        "source":tables.UInt32Col(),
+        "target":tables.UInt32Col(),
+        "organism":tables.UInt32Col(),
+        "nbGenePairs":tables.UInt32Col()
+        }
+
+@measured()
+def writeFamilyLevelTables(h5f):
+    """
+        Writes the tables giving, for each gene family, the organisms it is in and the families it is linked to in each organism.
+        They are computed from the gene level tables, and allow to read the families and the graph without the annotations.
+        Organisms are referred to by their row in /organisms, in the order in which they are met in the annotation table.
+    """
+    if not '/geneFamilies' in h5f or ('/familyOrganisms' in h5f and ('/familyEdges' in h5f or not '/edges' in h5f)):
+        return
+    logging.getLogger().info("Writing the gene family level tables...")
+    orgNames, orgFirst, orgCodes = numpy.unique(h5f.root.annotations.genes.read(field = "organism"), return_index = True, return_inverse = True)
+    orgOrder = numpy.argsort(orgFirst)
+    orgOfGene = numpy.argsort(orgOrder)[orgCodes.ravel()]
+    if '/organisms' in h5f:
+        h5f.remove_node("/", "organisms")
+    orgTable = h5f.create_table("/", "organisms", organismDesc(max(orgNames.dtype.itemsize, 1)), expectedrows = len(orgNames))
+    orgTable.append(numpy.array(orgNames[orgOrder], dtype = orgTable.dtype))
+    orgTable.flush()
+
+    gene2fam = h5f.root.geneFamilies.read()
+    if not '/familyOrganisms' in h5f:
+        keys, counts = numpy.unique(numpy.stack([gene2fam["geneFam"], orgOfGene[gene2fam["gene"]]], axis = 1), axis = 0, return_counts = True)
+        famOrgTable = h5f.create_table("/", "familyOrganisms", familyOrganismDesc(), expectedrows = len(keys))
+        rows = numpy.empty(len(keys), dtype = famOrgTable.dtype)
+        rows["geneFam"], rows["organism"], rows["nbGenes"] = keys[:,0], keys[:,1], counts
+        famOrgTable.append(rows)
+        famOrgTable.flush()
+    if '/edges' in h5f and not '/familyEdges' in h5f:
+        famOfGene = numpy.zeros(len(orgOfGene), dtype = numpy.int64)
+        famOfGene[gene2fam["gene"]] = gene2fam["geneFam"]
+        edges = h5f.root.edges.read()
+        sourceFams, targetFams = famOfGene[edges["geneSource"]], famOfGene[edges["geneTarget"]]
+        #an edge links the same two families whatever the direction in which its gene pairs were met.
+        keys, counts = numpy.unique(numpy.stack([numpy.minimum(sourceFams, targetFams), numpy.maximum(sourceFams, targetFams), orgOfGene[edges["geneSource"]]], axis = 1), axis = 0, return_counts = True)
+        famEdgeTable = h5f.create_table("/", "familyEdges", familyEdgeDesc(), expectedrows = len(keys))
+        rows = numpy.empty(len(keys), dtype = famEdgeTable.dtype)
+        rows["source"], rows["target"], rows["organism"], rows["nbGenePairs"] = keys[:,0], keys[:,1], keys[:,2], counts
+        famEdgeTable.append(rows)
+        famEdgeTable.flush()
+
+def mapToRows(keys, values):
+    """
+        Returns the index at which each of the values is found in keys (both being numpy arrays of bytes).
+    """
+    sorter = numpy.argsort(keys)
+    rows = sorter[numpy.minimum(numpy.searchsorted(keys, values, sorter = sorter), len(keys) - 1)]
+    missing = keys[rows] != values
+    if missing.any():
+        raise Exception(f"'{values[missing][0].decode()}' was not found in the pangenome file, which seems to have been improperly filled.")
+    return rows
+
+def migrateTable(h5f, name, desc, columns, chunk = 100000):
+    """
+        Rewrites the table of the given name with the new description.
+        columns gives for each new column the old column it is computed from, and the numpy array of bytes whose indexes are the new values.
+    """
+    oldTable = h5f.get_node("/", name)
+    newTable = h5f.create_table("/", name + "_migrated", desc, expectedrows=oldTable.nrows)
+    bar = tqdm(range(oldTable.nrows), unit = "row")
+    for i in range(0, oldTable.nrows, chunk):
+        oldRows = oldTable.read(start = i, stop = i + chunk)
+        newRows = numpy.empty(len(oldRows), dtype = newTable.dtype)
+        for newColumn, (oldColumn, keys) in columns.items():
+            newRows[newColumn] = mapToRows(keys, oldRows[oldColumn])
+        newTable.append(newRows)
+        bar.update(len(oldRows))
+    newTable.flush()
     bar.close()
-    edgeTable.flush()
+    h5f.remove_node("/", name)
+    newTable.rename(name)
+
+def migratePangenome(h5f):
+    """
+        Converts the tables of a pangenome file written with a former schema to the current one.
+    """
+    version = getSchemaVersion(h5f)
+    if version >= schemaVersion or not ('/geneFamilies' in h5f or '/edges' in h5f):
+        return
+    logging.getLogger().info(f"Converting the pangenome file from schema version {version} to version {schemaVersion}...")
+    geneIDs = h5f.root.annotations.genes.read(field = "gene/ID")
+    if '/geneFamilies' in h5f:
+        famNames = h5f.root.geneFamiliesInfo.read(field = "name")
+        migrateTable(h5f, "geneFamilies", gene2famDesc(), {"gene":("gene", geneIDs), "geneFam":("geneFam", famNames)})
+    if '/edges' in h5f:
+        migrateTable(h5f, "edges", graphDesc(), {"geneTarget":("geneTarget", geneIDs), "geneSource":("geneSource", geneIDs)})
+    h5f.root.status._v_attrs.schemaVersion = schemaVersion
 
 def writeStatus(pangenome, h5f):
     if "/status" in h5f:#if statuses are already written
         statusGroup = h5f.root.status
     else:#else create the status group.
         statusGroup = h5f.create_group("/","status","Statuses of the pangenome's content")
+    statusGroup._v_attrs.schemaVersion = schemaVersion
     statusGroup._v_attrs.genomesAnnotated = True if pangenome.status["genomesAnnotated"] in ["Computed","Loaded","inFile"] else False
     statusGroup._v_attrs.geneSequences = True if pangenome.status["geneSequences"] in ["Computed","Loaded","inFile"] else False
     statusGroup._v_attrs.genesClustered = True if pangenome.status["genesClustered"] in ["Computed","Loaded","inFile"] else False
@@ -316,6 +428,7 @@ def writeInfo(pangenome, h5f):
 
     infoGroup._v_attrs.parameters = pangenome.parameters#saving the pangenome parameters
 
+@measured(unit = "families", items = lambda pangenome, *args, **kwargs : pangenome.number_of_geneFamilies())
 def updateGeneFamPartition(pangenome, h5f):
     logging.getLogger().info("Updating gene families with partition information")
     table = h5f.root.geneFamiliesInfo
@@ -326,6 +439,7 @@ def updateGeneFamPartition(pangenome, h5f):
         bar.update()
     bar.close()
 
+@measured()
 def updateGeneFragments(pangenome, h5f):
     """
         updates the annotation table with the fragmentation informations from the defrag pipeline
@@ -342,6 +456,8 @@ def updateGeneFragments(pangenome, h5f):
 
 def ErasePangenome(pangenome, graph=False, geneFamilies = False):
     """ erases tables from a pangenome .h5 file """
+    #the attributes that are read from the file on their first access can not be read while it is open for writing.
+    pangenome.loadLazyAttributes()
     compressionFilter = tables.Filters(complevel=1, complib='blosc:lz4')
     h5f = tables.open_file(pangenome.file,"a", filters=compressionFilter)
     statusGroup = h5f.root.status
@@ -349,11 +465,15 @@ def ErasePangenome(pangenome, graph=False, geneFamilies = False):
     if '/edges' in h5f and (graph or geneFamilies):
         logging.getLogger().info("Erasing the formerly computed edges")
         h5f.remove_node("/","edges")
+        if '/familyEdges' in h5f:
+            h5f.remove_node("/","familyEdges")
         statusGroup._v_attrs.NeighborsGraph = False
         pangenome.status["neighborsGraph"] = "No"
     if '/geneFamilies' in h5f and geneFamilies:
         logging.getLogger().info("Erasing the formerly computed gene family to gene associations...")
         h5f.remove_node('/', 'geneFamilies')#erasing the table, and rewriting a new one.
+        if '/familyOrganisms' in h5f:
+            h5f.remove_node('/', 'familyOrganisms')
         pangenome.status["defragmented"] = "No"
         pangenome.status["genesClustered"] = "No"
         statusGroup._v_attrs.defragmented = False
@@ -367,17 +487,33 @@ def ErasePangenome(pangenome, graph=False, geneFamilies = False):
         statusGroup._v_attrs.Partitionned = False
     h5f.close()
 
-def writePangenome(pangenome, filename, force):
+def appendOrganisms(organisms, h5f, batchSize = 100000):
+    """
+        Appends the annotations and the gene sequences of organisms that were added to an already written pangenome to its file.
+        The rows of the genes that were written before do not change, so the rest of the pangenome can then be written.
+    """
+    logging.getLogger().info("Appending the annotations of the new genomes...")
+    appendAnnotations(organisms, h5f, batchSize)
+    if '/geneSequences' in h5f:
+        logging.getLogger().info("Appending the protein coding gene dna sequences of the new genomes...")
+        appendGeneSequences([ gene for org in organisms for contig in org.contigs for gene in contig.genes ], h5f, batchSize)
+
+@measured()
+def writePangenome(pangenome, filename, force, batchSize = 100000, newOrganisms = ()):
     """
         Writes or updates a pangenome file
         pangenome is the corresponding pangenome object, filename the h5 file and status what has been modified.
+        batchSize is the number of rows that are appended at once to the tables.
+        newOrganisms are organisms that were added to the pangenome since its annotations were written, which are appended to them.
     """
 
+    #the attributes that are read from the file on their first access can not be read while it is open for writing.
+    pangenome.loadLazyAttributes()
     compressionFilter = tables.Filters(complevel=1, complib='blosc:lz4')#test the other compressors from blosc, this one was arbitrarily chosen.
     if pangenome.status["genomesAnnotated"] == "Computed":
         h5f = tables.open_file(filename,"w", filters=compressionFilter)
         logging.getLogger().info("Writing genome annotations...")
-        writeAnnotations(pangenome, h5f)
+        writeAnnotations(pangenome, h5f, batchSize)
         pangenome.status["genomesAnnotated"] = "Loaded"
         h5f.close()
     elif pangenome.status["genomesAnnotated"] in ["Loaded", "inFile"]:
@@ -387,30 +523,34 @@ def writePangenome(pangenome, filename, force):
 
     #from there, appending to existing file.
     h5f = tables.open_file(filename,"a", filters=compressionFilter)
+    migratePangenome(h5f)#files written with a former schema are converted before anything is added to them.
+    if len(newOrganisms) > 0:
+        appendOrganisms(newOrganisms, h5f, batchSize)
 
     if pangenome.status["geneSequences"] == "Computed":
         logging.getLogger().info("writing the protein coding gene dna sequences")
-        writeGeneSequences(pangenome, h5f)
+        writeGeneSequences(pangenome, h5f, batchSize)
         pangenome.status["geneSequences"] = "Loaded"
 
     if pangenome.status["genesClustered"] == "Computed":
         logging.getLogger().info("Writing gene families and gene associations...")
-        writeGeneFamilies(pangenome, h5f, force)
+        writeGeneFamilies(pangenome, h5f, force, batchSize)
         logging.getLogger().info("Writing gene families information...")
-        writeGeneFamInfo(pangenome, h5f, force)
+        writeGeneFamInfo(pangenome, h5f, force, batchSize)
         if pangenome.status["genomesAnnotated"] in ["Loaded", "inFile"] and pangenome.status["defragmented"] == "Computed":
             #if the annotations have not been computed in this run, and there has been a clustering with defragmentation, then the annotations can be updated
             updateGeneFragments(pangenome,h5f)
         pangenome.status["genesClustered"] = "Loaded"
     if pangenome.status["neighborsGraph"] == "Computed":
         logging.getLogger().info("Writing the edges...")
-        writeGraph(pangenome, h5f, force)
+        writeGraph(pangenome, h5f, force, batchSize)
         pangenome.status["neighborsGraph"] = "Loaded"
 
     if pangenome.status["partitionned"] == "Computed" and pangenome.status["genesClustered"] in ["Loaded","inFile"]:#otherwise it's been written already.
         updateGeneFamPartition(pangenome, h5f)
         pangenome.status["partitionned"] = "Loaded"
 
+    writeFamilyLevelTables(h5f)
     writeStatus(pangenome, h5f)
     writeInfo(pangenome, h5f)
 
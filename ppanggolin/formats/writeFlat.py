@@ -6,17 +6,18 @@ import argparse
 from multiprocessing import Pool
 from collections import Counter, defaultdict
 import logging
-import pkg_resources
 from statistics import median
 import os
 
 #local libraries
 from ppanggolin.pangenome import Pangenome
-from ppanggolin.utils import write_compressed_or_not, mkOutdir
+from ppanggolin.utils import write_compressed_or_not, mkOutdir, getVersion
 from ppanggolin.formats import checkPangenomeInfo, getGeneSequencesFromFile
+from ppanggolin.metrics import measured, popStages, mergeStages
 
 #installed libraries
 from tqdm import tqdm
+import numpy
 
 #global variable to store the pangenome
 pan = None
@@ -101,6 +102,7 @@ def writeJSONedges(json):
         writeJSONedge(edge, json)
     json.write(']')
 
+@measured()
 def writeJSON(output, compress):
     logging.getLogger().info("Writing the json file for the pangenome graph...")
     outname = output + "/pangenomeGraph.json"
@@ -141,7 +143,7 @@ def writeGEXFheader(gexf, light):
     # gexf.write('      <attribute id="12" title="nb_organisms" type="long" />\n')#useless because it's the weight of the edge
     gexf.write('    </attributes>\n')
     gexf.write('    <meta>\n')
-    gexf.write(f'      <creator>PPanGGOLiN {pkg_resources.get_distribution("ppanggolin").version}</creator>\n')
+    gexf.write(f'      <creator>PPanGGOLiN {getVersion()}</creator>\n')
     gexf.write('    </meta>\n')
 
 def writeGEXFnodes(gexf, light, soft_core = 0.95):
@@ -205,6 +207,7 @@ def writeGEXFend(gexf):
     gexf.write("  </graph>")
     gexf.write("</gexf>")
 
+@measured()
 def writeGEXF(output, light = True, soft_core = 0.95, compress=False):
     txt = "Writing the gexf file for the pangenome graph..."
     if light:
@@ -220,6 +223,7 @@ def writeGEXF(output, light = True, soft_core = 0.95, compress=False):
         writeGEXFend(gexf)
     logging.getLogger().info(f"Done writing the gexf file : '{outname}'")
 
+@measured()
 def writeMatrix(sep, ext, output, compress=False, geneNames = False):
     logging.getLogger().info(f"Writing the .{ext} file ...")
     outname = output + "/matrix." + ext
@@ -276,6 +280,7 @@ def writeMatrix(sep, ext, output, compress=False, geneNames = False):
                                     +genes)+"\n")#15
     logging.getLogger().info(f"Done writing the matrix : '{outname}'")
 
+@measured()
 def writeGenePresenceAbsence(output, compress=False):
     logging.getLogger().info(f"Writing the gene presence absence file ...")
     outname = output + "/gene_presence_absence.Rtab"
@@ -299,6 +304,7 @@ def writeGenePresenceAbsence(output, compress=False):
                                     +genes)+"\n")#15
     logging.getLogger().info(f"Done writing the gene presence absence file : '{outname}'")
 
+@measured()
 def writeStats(output, soft_core, dup_margin, compress=False):
     logging.getLogger().info("Writing pangenome statistics...")
     logging.getLogger().info("Writing statistics on persistent duplication...")
@@ -387,21 +393,23 @@ def writeStats(output, soft_core, dup_margin, compress=False):
 
     logging.getLogger().info("Done writing genome per genome statistics")
 
-def writeOrgFile(org, output, compress=False):
+def neighborsPartitions():
+    """
+        Returns the number of persistent, shell and cloud neighbors of each gene family, from the arrays of the graph.
+    """
+    famIndptr, _, famNeighbors = pan.computeEdgeArrays()[:3]
+    partitions = numpy.array([ ["persistent", "shell"].index(fam.namedPartition) if fam.namedPartition in ["persistent", "shell"] else 2 for fam in pan.geneFamilies ], dtype = numpy.int64)
+    fams = numpy.repeat(numpy.arange(len(famIndptr) - 1), numpy.diff(famIndptr))
+    counts = numpy.zeros((len(famIndptr) - 1, 3), dtype = numpy.int64)
+    numpy.add.at(counts, (fams, partitions[famNeighbors]), 1)
+    return dict(zip(pan.geneFamilies, counts.tolist()))
+
+def writeOrgFile(org, output, neighborsCounts, compress=False):
     with write_compressed_or_not(output + "/" + org.name + ".tsv",compress) as outfile:
         outfile.write("\t".join(["gene","contig","start","stop","strand","ori","family","nb_copy_in_org","partition","persistent_neighbors","shell_neighbors","cloud_neighbors"]) + "\n")
         for contig in org.contigs:
             for gene in contig.genes:
-                nb_pers = 0
-                nb_shell = 0
-                nb_cloud = 0
-                for neighbor in gene.family.neighbors:
-                    if neighbor.namedPartition == "persistent":
-                        nb_pers+=1
-                    elif neighbor.namedPartition == "shell":
-                        nb_shell+=1
-                    else:
-                        nb_cloud+=1
+                nb_pers, nb_shell, nb_cloud = neighborsCounts[gene.family]
                 outfile.write("\t".join(map(str,[gene.ID,
                                         contig.name,
                                         gene.start,
@@ -416,15 +424,18 @@ def writeOrgFile(org, output, compress=False):
                                         nb_cloud
                                         ])) + "\n")
 
+@measured()
 def writeProjections(output, compress=False):
     logging.getLogger().info("Writing the projection files...")
     outdir = output+"/projection"
     if not os.path.exists(outdir):
         os.makedirs(outdir)
+    neighborsCounts = neighborsPartitions()
     for org in pan.organisms:
-        writeOrgFile(org, outdir, compress)
+        writeOrgFile(org, outdir, neighborsCounts, compress)
     logging.getLogger().info("Done writing the projection files")
 
+@measured()
 def writeParts(output, soft_core, compress=False):
     logging.getLogger().info("Writing the list of gene families for each partitions...")
     if not os.path.exists(output + "/partitions"):
@@ -454,6 +465,7 @@ def writeParts(output, soft_core, compress=False):
         currKeyFile.close()
     logging.getLogger().info("Done writing the list of gene families for each partition")
 
+@measured()
 def writeGeneFamiliesTSV(output, compress=False):
     logging.getLogger().info("Writing the file providing the association between genes and gene families...")
     outname = output + "/gene_families.tsv"
@@ -462,12 +474,14 @@ def writeGeneFamiliesTSV(output, compress=False):
             for gene in fam.genes:
             	tsv.write("\t".join([fam.name,gene.ID])+"\n")
     logging.getLogger().info(f"Done writing the file providing the association between genes and gene families : '{outname}'")
+@measured()
 def writeFastaGenFam(output, compress=False):
     logging.getLogger().info("Writing the representative nucleic sequences of all the gene families...")
     outname = output + "/representative_gene_families.fna"
     with write_compressed_or_not(outname,compress) as fasta:
         getGeneSequencesFromFile(pan,fasta,[fam.name for fam in pan.geneFamilies])
     logging.getLogger().info(f"Done writing the representative nucleic sequences of all the gene families : '{outname}'")
+@measured()
 def writeFastaProtFam(output, compress=False):
     logging.getLogger().info("Writing the representative proteic sequences of all the gene families...")
     outname = output + "/representative_gene_families.faa"
@@ -480,6 +494,7 @@ def writeFastaProtFam(output, compress=False):
         bar.close()
     logging.getLogger().info(f"Done writing the representative proteic sequences of all the gene families : '{outname}'")
 
+@measured(name = "writeFlatGeneSequences")
 def writeGeneSequences(output, compress=False):
     logging.getLogger().info("Writing all the gene nucleic sequences...")
     outname = output + "/all_genes.fna"
@@ -487,6 +502,14 @@ def writeGeneSequences(output, compress=False):
         getGeneSequencesFromFile(pan,fasta)
     logging.getLogger().info(f"Done writing all the gene sequences : '{outname}'")
 
+def launchWriter(writer, *args):
+    """
+        Runs a writer in a worker process.
+    """
+    writer(*args)
+    return popStages()#the measures of the worker are sent back to the main process
+
+@measured()
 def writeFlatFiles(pangenome, output, cpu = 1, soft_core = 0.95, dup_margin = 0.05, csv=False, genePA = False, gexf = False, light_gexf = False, projection = False, stats = False, json = False, partitions=False, families_tsv = False, all_genes = False, all_prot_families = False, all_gene_families = False, compress = False):
     global pan
     pan = pangenome
@@ -510,33 +533,42 @@ def writeFlatFiles(pangenome, output, cpu = 1, soft_core = 0.95, dup_margin = 0.
         if not pan.status["geneFamilySequences"] in ["Loaded","Computed"] and (all_prot_families):
             raise ex_geneFamilySequences
         pan.getIndex()#make the index because it will be used most likely
+        #the attributes read on demand are loaded once here rather than by each of the processes using them.
+        if gexf or light_gexf or json or projection:
+            pan.loadLazyAttributes("name")
+        if gexf or light_gexf or json or projection or csv:
+            pan.loadLazyAttributes("product")
+        if all_prot_families:
+            pan.loadLazyAttributes("sequence")
+        if gexf or light_gexf or json:
+            pan.loadLazyAttributes("edges")
         with Pool(processes = cpu) as p:
             if csv:
-                processes.append(p.apply_async(func = writeMatrix, args = (',', "csv", output, compress, True)))
+                processes.append(p.apply_async(func = launchWriter, args = (writeMatrix, ',', "csv", output, compress, True)))
             if genePA:
-                processes.append(p.apply_async(func = writeGenePresenceAbsence, args = (output, compress)))
+                processes.append(p.apply_async(func = launchWriter, args = (writeGenePresenceAbsence, output, compress)))
             if gexf:
-                processes.append(p.apply_async(func = writeGEXF, args = (output, False, soft_core, compress)))
+                processes.append(p.apply_async(func = launchWriter, args = (writeGEXF, output, False, soft_core, compress)))
             if light_gexf:
-                processes.append(p.apply_async(func = writeGEXF, args = (output, True, soft_core, compress)))
+                processes.append(p.apply_async(func = launchWriter, args = (writeGEXF, output, True, soft_core, compress)))
             if projection:
-                processes.append(p.apply_async(func=writeProjections, args=(output, compress)))
+                processes.append(p.apply_async(func = launchWriter, args = (writeProjections, output, compress)))
             if stats:
-                processes.append(p.apply_async(func=writeStats, args=(output, soft_core, dup_margin, compress)))
+                processes.append(p.apply_async(func = launchWriter, args = (writeStats, output, soft_core, dup_margin, compress)))
             if json:
-                processes.append(p.apply_async(func=writeJSON, args=(output, compress)))
+                processes.append(p.apply_async(func = launchWriter, args = (writeJSON, output, compress)))
             if partitions:
-                processes.append(p.apply_async(func=writeParts, args=(output, soft_core, compress)))
+                processes.append(p.apply_async(func = launchWriter, args = (writeParts, output, soft_core, compress)))
             if families_tsv:
-                processes.append(p.apply_async(func=writeGeneFamiliesTSV, args=(output, compress)))
+                processes.append(p.apply_async(func = launchWriter, args = (writeGeneFamiliesTSV, output, compress)))
             if all_genes:
-                processes.append(p.apply_async(func=writeGeneSequences, args=(output, compress)))
+                processes.append(p.apply_async(func = launchWriter, args = (writeGeneSequences, output, compress)))
             if all_prot_families:
-                processes.append(p.apply_async(func=writeFastaProtFam, args=(output, compress)))
+                processes.append(p.apply_async(func = launchWriter, args = (writeFastaProtFam, output, compress)))
             if all_gene_families:
-                processes.append(p.apply_async(func=writeFastaGenFam, args=(output, compress)))
+                processes.append(p.apply_async(func = launchWriter, args = (writeFastaGenFam, output, compress)))
             for process in processes:
-                process.get()#get all the results
+                mergeStages(process.get())#get all the results
 
 def launch(args):
     mkOutdir(args.output, args.force)
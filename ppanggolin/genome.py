@@ -2,11 +2,24 @@
 #coding: utf8
 
 class Feature:
+    #__slots__ instead of a per-instance __dict__, as there are millions of those objects in big pangenomes.
+    __slots__ = ("ID", "is_fragment", "type", "start", "stop", "strand", "product", "name", "organism", "contig", "dna")
+
     def __init__(self, ID):
         self.ID = ID
         self.is_fragment = False
         self.type = ""
 
+    def __getattr__(self, attr):
+        #only called when the attribute has not been set. If it can be loaded, it is loaded for all of the features of the pangenome of the organism at once.
+        if attr != "organism":
+            for load in getattr(getattr(self, "organism", None), "_lazyLoaders", {}).pop(attr, []):
+                load()
+        try:
+            return object.__getattribute__(self, attr)
+        except AttributeError:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{attr}'") from None
+
     def fill_annotations(self, start, stop, strand, geneType = "", name = "", product=""):
         self.start = int(start)
         self.stop = int(stop)
@@ -25,9 +38,11 @@ class Feature:
         self.dna = dna
 
 class RNA(Feature):
-    pass
+    __slots__ = ()
 
 class Gene(Feature):
+    __slots__ = ("position", "family", "genetic_code", "protein")
+
     def __init__(self, ID):
         super().__init__(ID)
         self.position = None
@@ -48,6 +63,8 @@ class Gene(Feature):
 
 
 class Contig:
+    __slots__ = ("name", "is_circular", "RNAs", "_genes_start", "_genes_position")
+
     def __init__(self, name, is_circular = False):
         self.name = name
         self.is_circular = is_circular
@@ -91,9 +108,12 @@ class Contig:
         self._genes_start[gene.start] = gene
 
 class Organism:
+    __slots__ = ("name", "_contigs_getter", "_lazyLoaders")
+
     def __init__(self, name):
         self.name = name
         self._contigs_getter = {}
+        self._lazyLoaders = {}#the lazy loaders of the pangenome of the organism, used by its features.
 
     @property
     def families(self):
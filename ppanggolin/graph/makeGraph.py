@@ -4,14 +4,17 @@
 #default libraries
 import logging
 import argparse
+from multiprocessing import Pool
 
 #installed libraries
 from tqdm import tqdm
+import numpy
 
 #local libraries
 from ppanggolin.pangenome import Pangenome
 from ppanggolin.utils import getCurrentRAM
 from ppanggolin.formats import readPangenome, writePangenome, ErasePangenome
+from ppanggolin.metrics import measured
 
 def checkPangenomeFormerGraph(pangenome, force):
     """ checks pangenome status and .h5 files for former neighbors graph, delete it if allowed or raise an error """
@@ -43,9 +46,61 @@ def remove_high_copy_number(pangenome, number):
                 fam.removed = True
 
 
-def computeNeighborsGraph(pangenome, remove_copy_number = 0, force = False):
+def organismArrays(org, famIndex):
+    """
+        Returns the genes of the organism, contig after contig, and what is needed to find their neighbors :
+        the index of their families, whether they are fragments, the start of each contig in the list of genes and whether the contigs are circular.
+    """
+    genes = []
+    contigIndptr = [0]
+    circular = []
+    for contig in org.contigs:
+        genes.extend(contig.genes)
+        contigIndptr.append(len(genes))
+        circular.append(contig.is_circular)
+    fams = numpy.array([ famIndex[gene.family] for gene in genes ], dtype = numpy.int64)
+    fragments = numpy.array([ gene.is_fragment for gene in genes ], dtype = bool)
+    return genes, (fams, fragments, numpy.array(contigIndptr, dtype = numpy.int64), numpy.array(circular, dtype = bool))
+
+def neighborPairs(fams, fragments, contigIndptr, circular, removed):
+    """
+        Returns the pairs of neighboring genes of an organism that are linked in the pangenome graph, as the indexes of their genes (sources, targets), in the order in which they are met along the contigs.
+        The genes of the removed families are skipped, and two fragments of the same family are not linked.
+        The first gene of a circular contig is linked to the last one that is kept.
+    """
+    kept = numpy.flatnonzero(~removed[fams])
+    contigOfKept = numpy.searchsorted(contigIndptr, kept, side = "right") - 1
+    sameContig = contigOfKept[1:] == contigOfKept[:-1]
+    sources, targets = kept[1:][sameContig], kept[:-1][sameContig]
+    linked = ~((fams[sources] == fams[targets]) & (fragments[sources] | fragments[targets]))
+    sources, targets = sources[linked], targets[linked]
+
+    lastKept = numpy.flatnonzero(numpy.diff(contigOfKept, append = -1) != 0)
+    circularContigs = circular[contigOfKept[lastKept]]
+    contigs = contigOfKept[lastKept][circularContigs]
+    #the pair closing a circular contig comes after the other pairs of the contig.
+    keys = numpy.concatenate((2 * sources, 2 * contigIndptr[contigs + 1] - 1))
+    order = numpy.argsort(keys, kind = "stable")
+    sources = numpy.concatenate((sources, contigIndptr[contigs]))[order]
+    targets = numpy.concatenate((targets, kept[lastKept][circularContigs]))[order]
+    return sources, targets
+
+def launchNeighborPairs(args):
+    return neighborPairs(*args)
+
+def addOrganismEdges(pangenome, org):
+    """ adds the edges between the neighboring genes of the organism to the pangenome graph """
+    families = list(pangenome.geneFamilies)
+    genes, arrays = organismArrays(org, { fam : row for row, fam in enumerate(families) })
+    sources, targets = neighborPairs(*arrays, numpy.array([ fam.removed for fam in families ], dtype = bool))
+    for source, target in zip(sources.tolist(), targets.tolist()):
+        pangenome.addEdge(genes[source], genes[target])
+
+@measured(unit = "organisms", items = lambda pangenome, *args, **kwargs : pangenome.number_of_organisms())
+def computeNeighborsGraph(pangenome, remove_copy_number = 0, force = False, cpu = 1):
     """
         Creates the Pangenome Graph. Will either load the informations from the pangenome file if they are not loaded, or use the informations loaded if they are.
+        The neighboring genes of each organism are found by 'cpu' processes, and the edges are made from all of them at once.
     """
     checkPangenomeForNeighborsGraph(pangenome, force)
 
@@ -53,20 +108,40 @@ def computeNeighborsGraph(pangenome, remove_copy_number = 0, force = False):
         remove_high_copy_number(pangenome, remove_copy_number)
 
     logging.getLogger().info("Computing the neighbors graph...")
-    bar = tqdm(pangenome.organisms, total = len(pangenome.organisms), unit = "organism")
-    for org in bar:
-        bar.set_description(f"Processing {org.name}")
-        bar.refresh()
-        for contig in org.contigs:
-            prev = None
-            for gene in contig.genes:
-                if not gene.family.removed:
-                    if prev is not None:
-                        if not (prev.family == gene.family and (prev.is_fragment or gene.is_fragment)):
-                            pangenome.addEdge(gene, prev)
-                    prev = gene
-            if contig.is_circular and len(contig.genes) > 0:
-                pangenome.addEdge(contig.genes[0],prev)
+    families = list(pangenome.geneFamilies)
+    famIndex = { fam : row for row, fam in enumerate(families) }
+    removed = numpy.array([ fam.removed for fam in families ], dtype = bool)
+    orgIndex = pangenome.getIndex()
+    genes = []
+    args = []
+    orgOfGene = []
+    for org in pangenome.organisms:
+        orgGenes, arrays = organismArrays(org, famIndex)
+        args.append(arrays + (removed,))
+        genes.extend(orgGenes)
+        orgOfGene.append(numpy.full(len(orgGenes), orgIndex[org], dtype = numpy.int64))
+
+    sources = [numpy.zeros(0, dtype = numpy.int64)]
+    targets = [numpy.zeros(0, dtype = numpy.int64)]
+    offsets = numpy.cumsum([0] + [ len(arrays[0]) for arrays in args ])
+    bar = tqdm(range(len(args)), unit = "organism")
+    if cpu > 1:
+        with Pool(processes = cpu) as p:
+            #the results are given in the order of the organisms, so that the edges are made in the same order whatever the number of cpus.
+            for offset, (orgSources, orgTargets) in zip(offsets, p.imap(launchNeighborPairs, args)):
+                sources.append(orgSources + offset)
+                targets.append(orgTargets + offset)
+                bar.update()
+    else:
+        for offset, arguments in zip(offsets, args):
+            orgSources, orgTargets = launchNeighborPairs(arguments)
+            sources.append(orgSources + offset)
+            targets.append(orgTargets + offset)
+            bar.update()
+    bar.close()
+    famOfGene = numpy.concatenate([numpy.zeros(0, dtype = numpy.int64)] + [ arrays[0] for arrays in args ])
+    orgOfGene = numpy.concatenate([numpy.zeros(0, dtype = numpy.int64)] + orgOfGene)
+    pangenome.addEdges(genes, numpy.concatenate(sources), numpy.concatenate(targets), famOfGene, orgOfGene)
     logging.getLogger().info("Done making the neighbors graph.")
     pangenome.status["neighborsGraph"] = "Computed"
 
@@ -81,7 +156,7 @@ def launch(args):
     logging.getLogger().debug(f"Ram used at the start : {getCurrentRAM()}")
     pangenome = Pangenome()
     pangenome.addFile(args.pangenome)
-    computeNeighborsGraph(pangenome, args.remove_high_copy_number, args.force)
+    computeNeighborsGraph(pangenome, args.remove_high_copy_number, args.force, args.cpu)
     writePangenome(pangenome, pangenome.file, args.force)
 
 
@@ -8,11 +8,9 @@ if sys.version_info < (3, 6):#minimum is python3.6
     raise AssertionError("Minimum python version to run PPanGGOLiN is 3.6. Your current python version is " + ".".join(map(str,sys.version_info)))
 import argparse
 import logging
-import resource
-import pkg_resources
+import os
 import tempfile
-#libraries to be installed
-import psutil
+from importlib import import_module
 
 try:
     import argcomplete
@@ -20,16 +18,21 @@ except ImportError:
     pass
 
 #local modules
-import ppanggolin.pangenome
-import ppanggolin.nem
-import ppanggolin.graph
-import ppanggolin.annotate
-import ppanggolin.cluster
-import ppanggolin.workflow
-import ppanggolin.figures
-import ppanggolin.formats
-import ppanggolin.info
-import ppanggolin.align
+import ppanggolin.metrics
+from ppanggolin.utils import getVersion
+
+#the module of each subcommand and the name of its subparser function. Only the module of the subcommand that is run is imported, as they import heavy libraries.
+subcommands = {"annotate" : ("ppanggolin.annotate.annotate", "syntaSubparser"),
+               "cluster" : ("ppanggolin.cluster.cluster", "clusterSubparser"),
+               "graph" : ("ppanggolin.graph.makeGraph", "graphSubparser"),
+               "partition" : ("ppanggolin.nem.partition", "partitionSubparser"),
+               "rarefaction" : ("ppanggolin.nem.rarefaction", "rarefactionSubparser"),
+               "workflow" : ("ppanggolin.workflow.workflow", "workflowSubparser"),
+               "draw" : ("ppanggolin.figures.drawing", "figureSubparser"),
+               "write" : ("ppanggolin.formats.writeFlat", "writeFlatSubparser"),
+               "align" : ("ppanggolin.align.alignOnPang", "alignSubparser"),
+               "update" : ("ppanggolin.update.update", "updateSubparser"),
+               "info" : ("ppanggolin.info.info", "infoSubparser")}
 
 def requirements():
     """
@@ -50,6 +53,7 @@ def cmdLine():
     desc += "    graph         Create the pangenome graph\n"
     desc += "    partition     Partition the pangenome graph\n"
     desc += "    rarefaction     Compute the rarefaction curve of the pangenome\n"
+    desc += "    update        Add new genomes to a partitionned pangenome\n"
     desc += "  \n"
     desc += "  Output:\n"
     desc += "    draw          Draw figures representing the pangenome through different aspects\n"
@@ -60,21 +64,21 @@ def cmdLine():
     desc += "    align        aligns proteins to the pangenome gene families representatives\n"
 
     parser = argparse.ArgumentParser(description = "Depicting microbial species diversity via a Partitioned PanGenome Graph Of Linked Neighbors", formatter_class=argparse.RawTextHelpFormatter)
-    parser.add_argument('-v','--version', action='version', version='%(prog)s ' + pkg_resources.get_distribution("ppanggolin").version)
+    parser.add_argument('-v','--version', action='version', version='%(prog)s ' + getVersion())
     subparsers = parser.add_subparsers( metavar = "", dest="subcommand", title="subcommands", description = desc)
     subparsers.required = True#because python3 sent subcommands to hell apparently
 
+    #the subcommand is the first argument that is one, unless the arguments are completed, which needs all the subparsers.
+    subcommand = next((arg for arg in sys.argv[1:] if arg in subcommands), None)
+    completing = "argcomplete" in sys.modules and "_ARGCOMPLETE" in os.environ
     subs = []#subparsers
-    subs.append(ppanggolin.annotate.syntaSubparser(subparsers))
-    subs.append(ppanggolin.cluster.clusterSubparser(subparsers))
-    subs.append(ppanggolin.graph.graphSubparser(subparsers))
-    subs.append(ppanggolin.nem.partition.partitionSubparser(subparsers))
-    subs.append(ppanggolin.nem.rarefaction.rarefactionSubparser(subparsers))
-    subs.append(ppanggolin.workflow.workflowSubparser(subparsers))
-    subs.append(ppanggolin.figures.figureSubparser(subparsers))
-    subs.append(ppanggolin.formats.writeFlat.writeFlatSubparser(subparsers))
-    subs.append(ppanggolin.align.alignSubparser(subparsers))
-    ppanggolin.info.infoSubparser(subparsers)#not adding to subs because the 'common' options are not needed for this.
+    for name, (module, subparserFunction) in subcommands.items():
+        if name != subcommand and not completing:
+            subparsers.add_parser(name)#so that argparse knows the subcommand, without importing its module.
+        elif name == "info":
+            getattr(import_module(module), subparserFunction)(subparsers)#not adding to subs because the 'common' options are not needed for this.
+        else:
+            subs.append(getattr(import_module(module), subparserFunction)(subparsers))
 
     for sub in subs:#add options common to all subcommands
         common = sub._action_groups.pop(1)#get the 'optional arguments' action group.
@@ -83,6 +87,7 @@ def cmdLine():
         common.add_argument("--verbose",required=False, type=int,default=1,choices=[0,1,2], help = "Indicate verbose level (0 for warning and errors only, 1 for info, 2 for debug)")
         common.add_argument("-c","--cpu",required = False, default = 1,type=int, help = "Number of available cpus")
         common.add_argument('-f', '--force', action="store_true", help="Force writing in output directory and in pangenome output file.")
+        common.add_argument("--metrics-out", dest = "metrics_out", required = False, type = str, default = None, help = "Write the wall time, cpu time, peak memory and number of items per second of each stage to this json file")
         sub._action_groups.append(common)
         if (len(sys.argv) == 2 and sub.prog.split()[1] == sys.argv[1]):
             sub.print_help()
@@ -111,28 +116,12 @@ def main():
             level = logging.WARNING#only warnings and errors
         logging.basicConfig(stream=sys.stdout, level = level, format = '%(asctime)s %(filename)s:l%(lineno)d %(levelname)s\t%(message)s', datefmt='%Y-%m-%d %H:%M:%S')
         logging.getLogger().info("Command: "+" ".join([arg for arg in sys.argv]))
-        logging.getLogger().info("PPanGGOLiN version: "+pkg_resources.get_distribution("ppanggolin").version)
+        logging.getLogger().info("PPanGGOLiN version: "+getVersion())
 
-    if args.subcommand == "annotate":
-        ppanggolin.annotate.launch(args)
-    elif args.subcommand == "cluster":
-        ppanggolin.cluster.launch(args)
-    elif args.subcommand == "graph":
-        ppanggolin.graph.launch(args)
-    elif args.subcommand == "partition":
-        ppanggolin.nem.partition.launch(args)
-    elif args.subcommand == "workflow":
-        ppanggolin.workflow.launch(args)
-    elif args.subcommand == "rarefaction":
-        ppanggolin.nem.rarefaction.launch(args)
-    elif args.subcommand == "draw":
-        ppanggolin.figures.launch(args)
-    elif args.subcommand == "write":
-        ppanggolin.formats.launch(args)
-    elif args.subcommand == "info":
-        ppanggolin.info.launch(args)
-    elif args.subcommand == "align":
-        ppanggolin.align.launch(args)
+    with ppanggolin.metrics.measure("ppanggolin " + args.subcommand):#the whole command
+        import_module(subcommands[args.subcommand][0]).launch(args)
+    if getattr(args, "metrics_out", None) is not None:
+        ppanggolin.metrics.writeMetrics(args.metrics_out, " ".join(sys.argv))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
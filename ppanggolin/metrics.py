@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+#default libraries
+import sys
+import os
+import time
+import resource
+import json
+from functools import wraps
+from contextlib import contextmanager
+
+#the measures of the stages run in this process, by stage name, and the process they belong to
+stages = {}
+pid = os.getpid()
+
+#ru_maxrss is in kilobytes on linux, and in bytes on macOS
+maxrssUnit = 1 if sys.platform == "darwin" else 1024
+
+class Stage:
+    """
+        What is being measured. The number of items processed during the stage can be given by setting its items attribute.
+    """
+    def __init__(self, name, unit = None):
+        self.name = name
+        self.unit = unit
+        self.items = None
+
+def localStages():
+    """
+        Returns the measures of the stages run in this process. A forked worker process starts with none instead of those of its parent.
+    """
+    global stages, pid
+    if pid != os.getpid():
+        stages = {}
+        pid = os.getpid()
+    return stages
+
+def getUsage():
+    """
+        Returns the cpu time used by this process and by its finished children, the peak RSS of this process, and the largest peak RSS of its finished children, in bytes.
+    """
+    selfUsage = resource.getrusage(resource.RUSAGE_SELF)
+    childUsage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = selfUsage.ru_utime + selfUsage.ru_stime + childUsage.ru_utime + childUsage.ru_stime
+    return cpu, selfUsage.ru_maxrss * maxrssUnit, childUsage.ru_maxrss * maxrssUnit
+
+@contextmanager
+def measure(name, unit = None):
+    """
+        Measures the wall time, the cpu time and the peak RSS of what is done within the context, and adds them to the measures of the stage of the given name.
+        The peak RSS are those of the process (and of its children) from its start up to the end of the stage. A stage that raises is measured up to there.
+    """
+    stage = Stage(name, unit)
+    localStages().setdefault(name, {"calls" : 0, "wall_time" : 0.0, "cpu_time" : 0.0, "peak_rss" : 0, "peak_children_rss" : 0, "items" : None, "unit" : unit})#so that the stages are listed in the order in which they start
+    startCpu = getUsage()[0]
+    startWall = time.perf_counter()
+    try:
+        yield stage
+    finally:
+        wall = time.perf_counter() - startWall
+        cpu, peak, childrenPeak = getUsage()
+        addMeasures(name, {"calls" : 1, "wall_time" : wall, "cpu_time" : cpu - startCpu, "peak_rss" : peak, "peak_children_rss" : childrenPeak, "items" : stage.items, "unit" : unit})
+
+def measured(name = None, unit = None, items = None):
+    """
+        Decorator measuring each call of a function as measure() does, in a stage named after the function by default.
+        items is a function returning the number of items that were processed, from the arguments of the call.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with measure(name or func.__name__, unit) as stage:
+                result = func(*args, **kwargs)
+                if items is not None:
+                    stage.items = items(*args, **kwargs)
+            return result
+        return wrapper
+    return decorator
+
+def addMeasures(name, measures):
+    """
+        Adds the measures of one or several calls to those of the stage of the given name.
+    """
+    stage = localStages().setdefault(name, {"calls" : 0, "wall_time" : 0.0, "cpu_time" : 0.0, "peak_rss" : 0, "peak_children_rss" : 0, "items" : None, "unit" : measures["unit"]})
+    stage["calls"] += measures["calls"]
+    stage["wall_time"] += measures["wall_time"]
+    stage["cpu_time"] += measures["cpu_time"]
+    stage["peak_rss"] = max(stage["peak_rss"], measures["peak_rss"])
+    stage["peak_children_rss"] = max(stage["peak_children_rss"], measures["peak_children_rss"])
+    if measures["items"] is not None:
+        stage["items"] = (stage["items"] or 0) + measures["items"]
+
+def popStages():
+    """
+        Returns the measures of the stages run in this process since the last call, and forgets them.
+        Worker processes send them back to the main process, which adds them to its own with mergeStages.
+    """
+    global stages
+    measures = localStages()
+    stages = {}
+    return measures
+
+def mergeStages(measures):
+    """
+        Adds the measures returned by popStages in a worker process to those of this process.
+    """
+    for name, stage in measures.items():
+        addMeasures(name, stage)
+
+def writeMetrics(filename, command):
+    """
+        Writes the measures of all the stages to a json file.
+    """
+    report = {"command" : command, "stages" : []}
+    for name, stage in localStages().items():
+        if stage["calls"] == 0:#it did not finish
+            continue
+        stage = dict(stage, name = name)
+        stage["items_per_second"] = stage["items"] / stage["wall_time"] if stage["items"] is not None and stage["wall_time"] > 0 else None
+        report["stages"].append(stage)
+    with open(filename, "w") as f:
+        json.dump(report, f, indent = 4)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+#default libraries
+import logging
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from functools import lru_cache
+
+@lru_cache(maxsize = None)
+def mmseqsVersion():
+    """ Returns the version of mmseqs, as the databases it makes may not be usable by other versions. """
+    return subprocess.run(["mmseqs", "version"], stdout = subprocess.PIPE, universal_newlines = True).stdout.strip()
+
+def makeDatabase(fastaFile, dbPath, tmpdir, cpu = 1, translation_table = None, createdbOptions = (), index = False):
+    """
+        Makes the mmseqs database of the sequences of the fasta file at the given path.
+        If translation_table is given, the sequences are nucleic ones, and the database is of their translation.
+        If index is True, the index that mmseqs search uses for a target database is precomputed.
+    """
+    cmds = []
+    if translation_table is None:
+        cmds.append(["mmseqs", "createdb", fastaFile, dbPath] + list(createdbOptions))
+    else:
+        cmds.append(["mmseqs", "createdb", fastaFile, dbPath + "_nucleic"] + list(createdbOptions))
+        cmds.append(["mmseqs", "translatenucs", dbPath + "_nucleic", dbPath, "--threads", str(cpu), "--translation-table", translation_table])
+    if index:
+        cmds.append(["mmseqs", "createindex", dbPath, tmpdir, "--threads", str(cpu)])
+    for cmd in cmds:
+        logging.getLogger().debug(" ".join(cmd))
+        subprocess.run(cmd, stdout = subprocess.DEVNULL, check = True)
+
+def cachedDatabase(cacheDir, key, tmpdir, make):
+    """
+        Returns the path of the database of the given key in the cache directory. It is made with make(path) in a temporary directory, and moved to the cache
+        once it is complete, so that a killed job or a concurrent one never leaves an incomplete database there.
+    """
+    dbDir = os.path.join(cacheDir, key)
+    if os.path.exists(dbDir):
+        logging.getLogger().info(f"Using the mmseqs database of the cache '{dbDir}'")
+        return os.path.join(dbDir, "db")
+    os.makedirs(cacheDir, exist_ok = True)
+    newDir = tempfile.mkdtemp(dir = cacheDir, prefix = key + ".tmp")
+    try:
+        make(os.path.join(newDir, "db"))
+    except BaseException:#a broken database must never be cached.
+        shutil.rmtree(newDir, ignore_errors = True)
+        raise
+    try:
+        os.rename(newDir, dbDir)
+    except OSError:#made by another job in the meantime.
+        shutil.rmtree(newDir)
+    return os.path.join(dbDir, "db")
+
+def fileDatabase(fastaFile, tmpdir, cacheDir = None, cpu = 1, translation_table = None, createdbOptions = (), index = False):
+    """
+        Returns the path of the mmseqs database of the sequences of the fasta file, made with makeDatabase.
+        If cacheDir is given, the database is kept there under a key of the content of the file and of the parameters, and it is made only if it is not there yet.
+    """
+    if cacheDir is None:
+        dbPath = os.path.join(tempfile.mkdtemp(dir = tmpdir), "db")
+        makeDatabase(fastaFile, dbPath, tmpdir, cpu, translation_table, createdbOptions, index)
+        return dbPath
+    key = hashlib.sha256(repr((mmseqsVersion(), translation_table, tuple(createdbOptions), index)).encode())
+    with open(fastaFile, "rb") as f:
+        for block in iter(lambda : f.read(2**20), b""):
+            key.update(block)
+    return cachedDatabase(cacheDir, key.hexdigest(), tmpdir, lambda dbPath : makeDatabase(fastaFile, dbPath, tmpdir, cpu, translation_table, createdbOptions, index))
+
+def fastaBlocks(records, chunk = 20000):
+    """ Yields the given (name, sequence) pairs as blocks of fasta text in bytes, of chunk sequences each. """
+    block = []
+    for name, sequence in records:
+        block.append(">" + name + "\n" + sequence + "\n")
+        if len(block) == chunk:
+            yield "".join(block).encode()
+            block = []
+    if len(block) > 0:
+        yield "".join(block).encode()
+
+def blocksDigest(blocks):
+    """ Returns the hexadecimal sha256 digest of the given blocks of bytes, as a whole. """
+    digest = hashlib.sha256()
+    for block in blocks:
+        digest.update(block)
+    return digest.hexdigest()
+
+def streamFasta(sequences, fifo, errors):
+    """ Writes the fasta blocks of sequences() to the named pipe as mmseqs reads them. What goes wrong is added to errors, for the main thread to raise it. """
+    try:
+        with open(fifo, "wb") as f:
+            for block in sequences():
+                f.write(block)
+    except BrokenPipeError:#mmseqs stopped reading, it says why.
+        pass
+    except Exception as err:
+        errors.append(err)
+
+def makeStreamedDatabase(sequences, dbPath, tmpdir, cpu = 1, translation_table = None, createdbOptions = (), index = False):
+    """
+        Makes the mmseqs database of the fasta blocks of sequences() as makeDatabase does, without writing them to a fasta file first.
+        They are written to a named pipe by another thread while createdb reads it, so that producing the sequences and making the database overlap.
+    """
+    fifoDir = tempfile.mkdtemp(dir = tmpdir)
+    fifo = os.path.join(fifoDir, "sequences.fasta")
+    os.mkfifo(fifo)
+    errors = []
+    writer = threading.Thread(target = streamFasta, args = (sequences, fifo, errors), daemon = True)
+    writer.start()
+    try:
+        makeDatabase(fifo, dbPath, tmpdir, cpu, translation_table, createdbOptions, index)
+    finally:
+        if writer.is_alive():#mmseqs did not open the pipe, or did not read all of it. Opening it lets the writer fail instead of waiting forever.
+            os.close(os.open(fifo, os.O_RDONLY | os.O_NONBLOCK))
+        writer.join()
+        shutil.rmtree(fifoDir)
+    if len(errors) > 0:
+        raise errors[0]
+
+def sequencesDatabase(sequences, tmpdir, cacheDir = None, cpu = 1, translation_table = None, createdbOptions = (), index = False, digest = None):
+    """
+        Returns the path of the mmseqs database of the sequences, made with makeStreamedDatabase. sequences() returns an iterable of blocks of fasta text in bytes.
+        If cacheDir is given, the database is kept there under a key of the sequences and of the parameters. digest is the blocksDigest of the sequences when it is
+        already known, otherwise sequences() is called a first time to compute it. sequences() is then called only if the database is not there yet.
+    """
+    make = lambda dbPath : makeStreamedDatabase(sequences, dbPath, tmpdir, cpu, translation_table, createdbOptions, index)
+    if cacheDir is None:
+        dbPath = os.path.join(tempfile.mkdtemp(dir = tmpdir), "db")
+        make(dbPath)
+        return dbPath
+    if digest is None:
+        digest = blocksDigest(sequences())
+    key = hashlib.sha256(repr((mmseqsVersion(), translation_table, tuple(createdbOptions), index, digest)).encode())
+    return cachedDatabase(cacheDir, key.hexdigest(), tmpdir, make)
@@ -113,6 +113,36 @@ static void FreeAllocatedData
  float*       ClassifM     /* O and deallocated */
 ) ;
 
+/* Called by nem and nem_arrays */
+
+    static int AllocModelParameters
+        (
+          const int    nk,                /* I */
+          const int    Nd,                /* I */
+          StatModelT*  StatModelP         /* O and allocated */
+        ) ;
+
+    static void SetDefaultParameters
+        (
+          const int    Seed,              /* I */
+          NemParaT*    NemParaP,          /* O */
+          StatModelT*  StatModelP         /* O */
+        ) ;
+
+    static int ReadModelArgs
+        (
+          const char*  algo,              /* I */
+          const float  beta,              /* I */
+          const char*  convergence,       /* I */
+          const float  convergence_th,    /* I */
+          const int    it_max,            /* I */
+          const char*  model_family,      /* I */
+          const char*  proportion,        /* I */
+          const char*  dispersion,        /* I */
+          NemParaT*    NemParaP,          /* O */
+          StatModelT*  StatModelP         /* O */
+        ) ;
+
 
     static int SetVisitOrder  /*V1.04-e*/
         ( 
@@ -310,93 +340,18 @@ int nem(const char* Fname,
                 &Spatial.Type) ) != STS_OK )
     return err ;
 
-      /* !!! Allocate model parameters */ /*V1.06-a*/
-    StatModel.Para.Prop_K    = GenAlloc( nk, sizeof(float), 
-                       1, func, "Prop_K" ) ;
-    StatModel.Para.Disp_KD   = GenAlloc( nk * Data.NbVars, sizeof(float), 
-                         1, func, "Disp_KD" ) ;
-    StatModel.Para.Center_KD = GenAlloc( nk * Data.NbVars, sizeof(float), 
-                       1, func, "Center_KD" ) ;
-    StatModel.Para.NbObs_K   = GenAlloc( nk, sizeof(float), 
-                       1, func, "NbObs_K" ) ;
-    StatModel.Para.NbObs_KD  = GenAlloc( nk * Data.NbVars, sizeof(float), 
-                       1, func, "NbObs_KD" ) ;
-    StatModel.Para.Iner_KD   = GenAlloc( nk * Data.NbVars, sizeof(float), 
-                       1, func, "NbObs_KD" ) ;
-    StatModel.Desc.DispSam_D = GenAlloc( Data.NbVars, sizeof(float), 
-                        1, func, "DispSam_D" );
-    StatModel.Desc.MiniSam_D = GenAlloc( Data.NbVars, sizeof(float), 
-                        1, func, "MiniSam_D" );
-    StatModel.Desc.MaxiSam_D = GenAlloc( Data.NbVars, sizeof(float), 
-                        1, func, "MaxiSam_D" );
-    /* Set default value of optional parameters */
-    StatModel.Spec.ClassFamily = DEFAULT_FAMILY ;
-    StatModel.Spec.ClassDisper = DEFAULT_DISPER ;
-    StatModel.Spec.ClassPropor = DEFAULT_PROPOR ;
-    NemPara.Algo          = DEFAULT_ALGO ;
-    StatModel.Para.Beta   = DEFAULT_BETA ;          /*V1.06-b*/
-    StatModel.Spec.BetaModel = DEFAULT_BTAMODE ;       /*V1.04-b*/
-    NemPara.BtaHeuStep    = DEFAULT_BTAHEUSTEP ;    /*V1.04-b*/
-    NemPara.BtaHeuMax     = DEFAULT_BTAHEUMAX ;
-    NemPara.BtaHeuDDrop   = DEFAULT_BTAHEUDDROP ;
-    NemPara.BtaHeuDLoss   = DEFAULT_BTAHEUDLOSS ;
-    NemPara.BtaHeuLLoss   = DEFAULT_BTAHEULLOSS ;
-    NemPara.BtaPsGrad.NbIter    = DEFAULT_BTAGRADNIT  ;/*V1.06-g*/
-    NemPara.BtaPsGrad.ConvThres = DEFAULT_BTAGRADCVTH ;
-    NemPara.BtaPsGrad.Step      = DEFAULT_BTAGRADSTEP ;
-    NemPara.BtaPsGrad.RandInit  = DEFAULT_BTAGRADRAND ;
-    NemPara.Crit          = DEFAULT_CRIT ;          /*V1.04-h*/
-    NemPara.CvThres       = DEFAULT_CVTHRES ;       /*V1.04-d*/
-    NemPara.CvTest        = CVTEST_CLAS ;           /*V1.06-g*/
-    NemPara.DoLog         = FALSE ;                 /*V1.03-a previously TRUE*/
-    NemPara.NbIters       = DEFAULT_NBITERS ;
-    NemPara.NbEIters      = DEFAULT_NBEITERS ;
-    NemPara.NbRandomInits = DEFAULT_NBRANDINITS ;  /*V1.06-h*/
-    NemPara.Seed          = seed ;//time( NULL )          /*V1.04-e*/
-    NemPara.Format        = DEFAULT_FORMAT ;
-    NemPara.InitMode      = DEFAULT_INIT ;
-    NemPara.ParamFileMode = DEFAULT_NO_PARAM_FILE ;
-    NemPara.SortedVar     = DEFAULT_SORTEDVAR ;
-    NemPara.NeighSpec     = DEFAULT_NEIGHSPEC ;
-    NemPara.VisitOrder    = DEFAULT_ORDER ;         /*V1.04-f*/
-    NemPara.SiteUpdate    = DEFAULT_UPDATE ;        /*V1.06-d*/
-    NemPara.TieRule       = DEFAULT_TIE ;           /*V1.06-e*/
-    NemPara.Debug         = FALSE ;                 /*V1.04-g*/
+    if ( ( err = AllocModelParameters( nk, Data.NbVars, &StatModel ) ) != STS_OK )
+        return err ;
+    SetDefaultParameters( seed, &NemPara, &StatModel ) ;
     strncpy( NemPara.OutBaseName, out_file_prefix, LEN_FILENAME ) ;
     strncpy( NemPara.NeighName, Fname, LEN_FILENAME ) ;
     strncpy( NemPara.ParamName, init_file, LEN_FILENAME ) ;
     strncat( NemPara.NeighName, ".nei", LEN_FILENAME ) ;
     strncpy( NemPara.RefName, "", LEN_FILENAME ) ;
 
-    //-----
-    NemPara.Algo = GetEnum( algo , AlgoStrVC, ALGO_NB ) ;
-    if ( NemPara.Algo == -1 )
-    {
-        fprintf( out_stderr, " Unknown type of algorithm %s\n", algo ) ;
-        err = STS_E_ARG ;
-    }
-    //-----
-    
-    if (beta < 0)
-    {
-        StatModel.Spec.BetaModel = BETA_PSGRAD ;
-    }
-    else{
-        StatModel.Para.Beta = beta ;
-    }
-    //-----
-    NemPara.CvTest=GetEnum( convergence, CvTestStrVC, CVTEST_NB );
-    if ( NemPara.CvTest == -1 ) {
-      fprintf( out_stderr, " Unknown convergence test %s\n", convergence ) ;
-      err = STS_E_ARG ;
-    }
-    else if ( NemPara.CvTest != CVTEST_NONE ) /* get threshold */ {
-        NemPara.CvThres = convergence_th ;
-        if ( NemPara.CvThres <= 0 ) {
-            fprintf( out_stderr, " Conv threshold must be > 0 (here %f)\n", convergence_th ) ;
-            err = STS_E_ARG ;
-        } /* else threshold > 0 : OK */
-    } 
+    err = ReadModelArgs( algo, beta, convergence, convergence_th, it_max,
+                         model_family, proportion, dispersion,
+                         &NemPara, &StatModel ) ;
     //-----
     NemPara.Format=GetEnum( format , FormatStrVC, FORMAT_NB );
     if ( NemPara.Format == -1 )
@@ -405,39 +360,11 @@ int nem(const char* Fname,
         err = STS_E_ARG ;
     }
     //-----
-    NemPara.NbIters = it_max ;
-    if ( NemPara.NbIters < 0 )
-    {
-        fprintf( out_stderr, "Nb iterations must be >= 0 (here %d)\n",  it_max ) ;
-        err = STS_E_ARG ;
-    }
-    //-----
     if ( dolog )
         NemPara.DoLog = TRUE ;
     else
         NemPara.DoLog = FALSE ;
     //-----
-    StatModel.Spec.ClassFamily = GetEnum( model_family, FamilyStrVC, FAMILY_NB );
-    if ( StatModel.Spec.ClassFamily == -1 )
-    {
-        fprintf( out_stderr, " Unknown family %s\n", model_family ) ;
-        err = STS_E_ARG ;
-    }
-    //-----
-    StatModel.Spec.ClassPropor = GetEnum( proportion, ProporStrVC, PROPOR_NB );
-    if ( StatModel.Spec.ClassPropor == -1 )
-    {
-        fprintf( out_stderr, " Unknown proportion %s\n", proportion ) ;
-        err = STS_E_ARG ;
-    }
-    //-----
-    StatModel.Spec.ClassDisper = GetEnum( dispersion, DisperStrVC, DISPER_NB );
-    if ( StatModel.Spec.ClassDisper == -1 )
-    {
-        fprintf( out_stderr, " Unknown dispersion %s\n", dispersion) ;
-        err = STS_E_ARG ;
-    }
-    //-----
     NemPara.NeighSpec = NEIGH_FILE;
     //-----
     NemPara.InitMode = init_mode;
@@ -711,9 +638,451 @@ int nem(const char* Fname,
 } /* end of mainfunc() */
 
 
+/* ------------------------------------------------------------------- */
+int nem_arrays(const float* points,
+        const int   Npt,
+        const int   Nd,
+        const int*  nei_indptr,
+        const int*  nei_indices,
+        const float* nei_weights,
+        const int   nk,
+        const char* algo,
+        const float beta,
+        const char* convergence,
+        const float convergence_th,
+        const int   it_max,
+        const char* model_family,
+        const char* proportion,
+        const char* dispersion,
+        const int   init_mode,
+        const float* init_prop,
+        const float* init_center,
+        const float* init_disp,
+        const char* log_prefix,
+        const int   seed,
+        float*      classif,
+        float*      prop,
+        float*      center,
+        float*      disp,
+        float*      criteria)
+/*\
+    NEM function working on arrays rather than files.
+
+    The points are given as a Npt x Nd row-major matrix, and the neighbours 
+    as a CSR graph : the neighbours of point i are nei_indices[ nei_indptr[ i ]
+    .. nei_indptr[ i + 1 ] - 1 ] (0-based), weighted by nei_weights.
+    If init_mode is INIT_PARAM_FILE, the initial parameters are read from 
+    init_prop (K), init_center (K x D) and init_disp (K x D).
+    The fuzzy classification (Npt x K), the parameters and the criteria 
+    (U, D, L, M, Z, error) are written in the output arrays, which are only 
+    filled if NEM returns EXIT_OK. Nothing is logged if log_prefix is "".
+\*/
+/* ------------------------------------------------------------------- */
+{
+    const char*     func = "nem_arrays" ;
+    StatusET        err ;
+    DataT           Data = {0} ;
+    NemParaT        NemPara = {0} ;
+    SpatialT        Spatial = {{{0}}} ;
+    StatModelT      StatModel = {{0}} ;
+    float           *ClassifM = NULL ;
+    CriterT         Criteria = {0} ;
+    int             ipt, k, d, iv ;
+
+    if ( strcmp( log_prefix, "" ) != 0 )
+    {
+        char name_out_stderr[LEN_FILENAME];
+        strncpy( name_out_stderr , log_prefix , LEN_FILENAME ) ;
+        strncat( name_out_stderr , ".stderr", LEN_FILENAME ) ;
+        out_stderr = fopen(name_out_stderr, "w");
+    }
+    else
+    {
+        out_stderr = fopen("/dev/null", "w");
+    }
+    if ( out_stderr == NULL )
+        return EXIT_E_SYSTEM ;
+
+    if ( ( nk <= 0 ) || ( Npt <= 0 ) || ( Nd <= 0 ) )
+    {
+        fprintf( out_stderr, "Nb of classes, points and variables must be > 0 (here %d, %d, %d)\n",
+                 nk, Npt, Nd ) ;
+        fclose(out_stderr);
+        return EXIT_E_ARGS ;
+    }
+
+    StatModel.Spec.K = nk ;
+    Data.NbPts = Npt ;
+    Data.NbVars = Nd ;
+    Spatial.Type = TYPE_NONSPATIAL ; /* nothing to free until the neighbours are allocated */
+
+    if ( ( err = AllocModelParameters( nk, Nd, &StatModel ) ) != STS_OK )
+        goto end ;
+    SetDefaultParameters( seed, &NemPara, &StatModel ) ;
+    err = ReadModelArgs( algo, beta, convergence, convergence_th, it_max,
+                         model_family, proportion, dispersion,
+                         &NemPara, &StatModel ) ;
+    NemPara.Format = FORMAT_FUZZY ;
+    NemPara.NeighSpec = NEIGH_FILE ;
+    NemPara.InitMode = init_mode ;
+    if ( strcmp( log_prefix, "" ) != 0 )
+    {
+        NemPara.DoLog = TRUE ;
+        strncpy( NemPara.OutBaseName, log_prefix, LEN_FILENAME ) ;
+        strncpy( NemPara.LogName, log_prefix, LEN_FILENAME ) ;
+        strncat( NemPara.LogName, EXT_LOGNAME, LEN_FILENAME ) ;
+    }
+    if ( err != STS_OK )
+        goto end ;
+
+    /* Copy points */
+    if ( ( Data.PointsM = GenAlloc( Npt * Nd, sizeof( float ),
+                                    0, func, "PointsM" ) ) == NULL )
+    {
+        err = STS_E_MEMORY ;
+        goto end ;
+    }
+    memcpy( Data.PointsM, points, Npt * Nd * sizeof( float ) ) ;
+    Data.NbMiss = 0 ;
+    for ( ipt = 0 ; ipt < Npt * Nd ; ipt ++ )
+    {
+        if ( isnan( Data.PointsM[ ipt ] ) )
+            Data.NbMiss ++ ;
+    }
+
+    /* Build neighbours from the CSR graph */
+    if ( ( Spatial.NeighData.PtsNeighsV = GenAlloc( Npt, sizeof( PtNeighsT ),
+                                                    1, func, "PtsNeighsV" ) ) == NULL )
+    {
+        err = STS_E_MEMORY ;
+        goto end ;
+    }
+    Spatial.Type = TYPE_SPATIAL ;
+    Spatial.MaxNeighs = 0 ;
+    for ( ipt = 0 ; ipt < Npt ; ipt ++ )
+    {
+        PtNeighsT* ptneighsP = & Spatial.NeighData.PtsNeighsV[ ipt ] ;
+        int        nbv = nei_indptr[ ipt + 1 ] - nei_indptr[ ipt ] ;
+
+        if ( nbv <= 0 )
+            continue ;
+        if ( ( ptneighsP->NeighsV = GenAlloc( nbv, sizeof( NeighT ),
+                                              0, func, "NeighsV" ) ) == NULL )
+        {
+            err = STS_E_MEMORY ;
+            goto end ;
+        }
+        for ( iv = 0 ; iv < nbv ; iv ++ )
+        {
+            int inei = nei_indptr[ ipt ] + iv ;
+
+            if ( ( nei_indices[ inei ] < 0 ) || ( nei_indices[ inei ] >= Npt ) )
+            {
+                fprintf( out_stderr, "Neighbor %d of point %d not in 0..%d\n",
+                         nei_indices[ inei ], ipt, Npt - 1 ) ;
+                err = STS_E_FUNCARG ;
+                goto end ;
+            }
+            ptneighsP->NeighsV[ iv ].Index = nei_indices[ inei ] ;
+            ptneighsP->NeighsV[ iv ].Weight = nei_weights[ inei ] ;
+        }
+        ptneighsP->NbNeigh = nbv ;
+        if ( nbv > Spatial.MaxNeighs )
+            Spatial.MaxNeighs = nbv ;
+    }
+
+    if ( ( err = SetVisitOrder( Npt, NemPara.VisitOrder,
+                                & Data.SiteVisitV ) ) != STS_OK )
+        goto end ;
+
+    switch( NemPara.InitMode )
+    {
+    case INIT_PARAM_FILE:
+        NemPara.ParamFileMode = PARAM_FILE_INIT ;
+        for ( k = 0 ; k < nk ; k ++ )
+        {
+            StatModel.Para.Prop_K[ k ] = init_prop[ k ] ;
+            if ( init_prop[ k ] <= 0.0 )
+                err = STS_E_FUNCARG ;
+            for ( d = 0 ; d < Nd ; d ++ )
+            {
+                StatModel.Para.Center_KD[ k * Nd + d ] = init_center[ k * Nd + d ] ;
+                if ( StatModel.Spec.ClassFamily == FAMILY_NORMAL )
+                    StatModel.Para.Disp_KD[ k * Nd + d ] = init_disp[ k * Nd + d ] * init_disp[ k * Nd + d ] ;
+                else
+                    StatModel.Para.Disp_KD[ k * Nd + d ] = init_disp[ k * Nd + d ] ;
+                if ( StatModel.Para.Disp_KD[ k * Nd + d ] <= 0 )
+                    err = STS_E_FUNCARG ;
+            }
+        }
+        if ( err != STS_OK )
+        {
+            fprintf( out_stderr, "Initial proportions and dispersions must be > 0\n" ) ;
+            goto end ;
+        }
+        /* then allocate partition as below */
+    case INIT_SORT:    /* allocate partition (will be initialized later) */
+    case INIT_RANDOM:  /* allocate partition (will be initialized later) */
+        if ( ( ClassifM = GenAlloc( Npt * nk, sizeof( float ),
+                                    0, func, "ClassifM" ) ) == NULL )
+        {
+            err = STS_E_MEMORY ;
+            goto end ;
+        }
+        break ;
+
+    default: /* error */
+        fprintf( out_stderr, "Unknown initialization mode (%d)\n",
+                 NemPara.InitMode );
+        err = STS_E_FUNCARG ;
+        goto end ;
+    }
+
+    if ( ( err = MakeErrinfo( "", Npt, nk, NemPara.TieRule,
+                              &Criteria.Errinfo, &Criteria.Errcur ) ) != STS_OK )
+        goto end ;
+
+#ifdef __TURBOC__
+    srand( (unsigned) NemPara.Seed ) ;
+#else
+    srandom( NemPara.Seed ) ;
+#endif
+
+    if ( ( err = ClassifyByNem( &NemPara, &Spatial, &Data,
+                                &StatModel, ClassifM,
+                                &Criteria ) ) == STS_OK )
+    {
+        memcpy( classif, ClassifM, Npt * nk * sizeof( float ) ) ;
+        memcpy( prop, StatModel.Para.Prop_K, nk * sizeof( float ) ) ;
+        memcpy( center, StatModel.Para.Center_KD, nk * Nd * sizeof( float ) ) ;
+        for ( k = 0 ; k < nk * Nd ; k ++ )
+        {
+            if ( StatModel.Spec.ClassFamily == FAMILY_NORMAL )
+                disp[ k ] = sqrt( StatModel.Para.Disp_KD[ k ] ) ;
+            else
+                disp[ k ] = StatModel.Para.Disp_KD[ k ] ;
+        }
+        criteria[ 0 ] = Criteria.U ;
+        criteria[ 1 ] = Criteria.D ;
+        criteria[ 2 ] = Criteria.L ;
+        criteria[ 3 ] = Criteria.M ;
+        criteria[ 4 ] = Criteria.Z ;
+        criteria[ 5 ] = Criteria.Errcur.Errorrate ;
+    }
+
+end:
+    FreeAllocatedData( &Data, &Spatial, &StatModel.Para,
+                       &Criteria, ClassifM ) ;
+    GenFree( StatModel.Desc.DispSam_D ) ;
+    GenFree( StatModel.Desc.MiniSam_D ) ;
+    GenFree( StatModel.Desc.MaxiSam_D ) ;
+
+    switch( err )
+    {
+        case STS_OK :
+        case STS_I_DONE :
+             fclose(out_stderr);
+             return EXIT_OK ;
+
+        case STS_W_EMPTYCLASS :
+             fprintf( out_stderr, "*** NEM warning status : empty class\n" );
+             fclose(out_stderr);
+             return EXIT_W_RESULT ;
+
+        case STS_E_ARG :
+             fprintf( out_stderr, "*** NEM error status : bad arguments\n" );
+             fclose(out_stderr);
+             return EXIT_E_ARGS ;
+
+        case STS_E_MEMORY :
+             fprintf( out_stderr, "*** NEM error status : not enough memory\n" );
+             fclose(out_stderr);
+             return EXIT_E_MEMORY ;
+
+        case STS_E_FUNCARG :
+             fprintf( out_stderr, "*** NEM internal error : bad arguments\n" );
+             fclose(out_stderr);
+             return EXIT_E_BUG ;
+
+        default :
+             fprintf( out_stderr, "*** NEM unknown error status (%d)\n", err );
+             fclose(out_stderr);
+             return EXIT_E_BUG ;
+    }
+} /* end of nem_arrays() */
+
+
 
 /* ==================== LOCAL FUNCTION DEFINITION =================== */
 
+/* ------------------------------------------------------------------- */
+static int AllocModelParameters
+        (
+          const int    nk,                /* I */
+          const int    Nd,                /* I */
+          StatModelT*  StatModelP         /* O and allocated */
+        )
+/* ------------------------------------------------------------------- */
+{
+    /* !!! Allocate model parameters */ /*V1.06-a*/
+    StatModelP->Para.Prop_K    = GenAlloc( nk, sizeof(float), 
+                       1, "AllocModelParameters", "Prop_K" ) ;
+    StatModelP->Para.Disp_KD   = GenAlloc( nk * Nd, sizeof(float), 
+                         1, "AllocModelParameters", "Disp_KD" ) ;
+    StatModelP->Para.Center_KD = GenAlloc( nk * Nd, sizeof(float), 
+                       1, "AllocModelParameters", "Center_KD" ) ;
+    StatModelP->Para.NbObs_K   = GenAlloc( nk, sizeof(float), 
+                       1, "AllocModelParameters", "NbObs_K" ) ;
+    StatModelP->Para.NbObs_KD  = GenAlloc( nk * Nd, sizeof(float), 
+                       1, "AllocModelParameters", "NbObs_KD" ) ;
+    StatModelP->Para.Iner_KD   = GenAlloc( nk * Nd, sizeof(float), 
+                       1, "AllocModelParameters", "NbObs_KD" ) ;
+    StatModelP->Desc.DispSam_D = GenAlloc( Nd, sizeof(float), 
+                        1, "AllocModelParameters", "DispSam_D" );
+    StatModelP->Desc.MiniSam_D = GenAlloc( Nd, sizeof(float), 
+                        1, "AllocModelParameters", "MiniSam_D" );
+    StatModelP->Desc.MaxiSam_D = GenAlloc( Nd, sizeof(float), 
+                        1, "AllocModelParameters", "MaxiSam_D" );
+
+    if ( ( StatModelP->Para.Prop_K == NULL ) ||
+         ( StatModelP->Para.Disp_KD == NULL ) ||
+         ( StatModelP->Para.Center_KD == NULL ) ||
+         ( StatModelP->Para.NbObs_K == NULL ) ||
+         ( StatModelP->Para.NbObs_KD == NULL ) ||
+         ( StatModelP->Para.Iner_KD == NULL ) ||
+         ( StatModelP->Desc.DispSam_D == NULL ) ||
+         ( StatModelP->Desc.MiniSam_D == NULL ) ||
+         ( StatModelP->Desc.MaxiSam_D == NULL ) )
+        return STS_E_MEMORY ;
+
+    return STS_OK ;
+}
+
+
+/* ------------------------------------------------------------------- */
+static void SetDefaultParameters
+        (
+          const int    Seed,              /* I */
+          NemParaT*    NemParaP,          /* O */
+          StatModelT*  StatModelP         /* O */
+        )
+/* ------------------------------------------------------------------- */
+{
+    /* Set default value of optional parameters */
+    StatModelP->Spec.ClassFamily = DEFAULT_FAMILY ;
+    StatModelP->Spec.ClassDisper = DEFAULT_DISPER ;
+    StatModelP->Spec.ClassPropor = DEFAULT_PROPOR ;
+    NemParaP->Algo          = DEFAULT_ALGO ;
+    StatModelP->Para.Beta   = DEFAULT_BETA ;          /*V1.06-b*/
+    StatModelP->Spec.BetaModel = DEFAULT_BTAMODE ;       /*V1.04-b*/
+    NemParaP->BtaHeuStep    = DEFAULT_BTAHEUSTEP ;    /*V1.04-b*/
+    NemParaP->BtaHeuMax     = DEFAULT_BTAHEUMAX ;
+    NemParaP->BtaHeuDDrop   = DEFAULT_BTAHEUDDROP ;
+    NemParaP->BtaHeuDLoss   = DEFAULT_BTAHEUDLOSS ;
+    NemParaP->BtaHeuLLoss   = DEFAULT_BTAHEULLOSS ;
+    NemParaP->BtaPsGrad.NbIter    = DEFAULT_BTAGRADNIT  ;/*V1.06-g*/
+    NemParaP->BtaPsGrad.ConvThres = DEFAULT_BTAGRADCVTH ;
+    NemParaP->BtaPsGrad.Step      = DEFAULT_BTAGRADSTEP ;
+    NemParaP->BtaPsGrad.RandInit  = DEFAULT_BTAGRADRAND ;
+    NemParaP->Crit          = DEFAULT_CRIT ;          /*V1.04-h*/
+    NemParaP->CvThres       = DEFAULT_CVTHRES ;       /*V1.04-d*/
+    NemParaP->CvTest        = CVTEST_CLAS ;           /*V1.06-g*/
+    NemParaP->DoLog         = FALSE ;                 /*V1.03-a previously TRUE*/
+    NemParaP->NbIters       = DEFAULT_NBITERS ;
+    NemParaP->NbEIters      = DEFAULT_NBEITERS ;
+    NemParaP->NbRandomInits = DEFAULT_NBRANDINITS ;  /*V1.06-h*/
+    NemParaP->Seed          = Seed ;//time( NULL )          /*V1.04-e*/
+    NemParaP->Format        = DEFAULT_FORMAT ;
+    NemParaP->InitMode      = DEFAULT_INIT ;
+    NemParaP->ParamFileMode = DEFAULT_NO_PARAM_FILE ;
+    NemParaP->SortedVar     = DEFAULT_SORTEDVAR ;
+    NemParaP->NeighSpec     = DEFAULT_NEIGHSPEC ;
+    NemParaP->VisitOrder    = DEFAULT_ORDER ;         /*V1.04-f*/
+    NemParaP->SiteUpdate    = DEFAULT_UPDATE ;        /*V1.06-d*/
+    NemParaP->TieRule       = DEFAULT_TIE ;           /*V1.06-e*/
+    NemParaP->Debug         = FALSE ;                 /*V1.04-g*/
+}
+
+
+/* ------------------------------------------------------------------- */
+static int ReadModelArgs
+        (
+          const char*  algo,              /* I */
+          const float  beta,              /* I */
+          const char*  convergence,       /* I */
+          const float  convergence_th,    /* I */
+          const int    it_max,            /* I */
+          const char*  model_family,      /* I */
+          const char*  proportion,        /* I */
+          const char*  dispersion,        /* I */
+          NemParaT*    NemParaP,          /* O */
+          StatModelT*  StatModelP         /* O */
+        )
+/* ------------------------------------------------------------------- */
+{
+    StatusET err = STS_OK ;
+
+    //-----
+    NemParaP->Algo = GetEnum( algo , AlgoStrVC, ALGO_NB ) ;
+    if ( NemParaP->Algo == -1 )
+    {
+        fprintf( out_stderr, " Unknown type of algorithm %s\n", algo ) ;
+        err = STS_E_ARG ;
+    }
+    //-----
+    if (beta < 0)
+    {
+        StatModelP->Spec.BetaModel = BETA_PSGRAD ;
+    }
+    else{
+        StatModelP->Para.Beta = beta ;
+    }
+    //-----
+    NemParaP->CvTest=GetEnum( convergence, CvTestStrVC, CVTEST_NB );
+    if ( NemParaP->CvTest == -1 ) {
+      fprintf( out_stderr, " Unknown convergence test %s\n", convergence ) ;
+      err = STS_E_ARG ;
+    }
+    else if ( NemParaP->CvTest != CVTEST_NONE ) /* get threshold */ {
+        NemParaP->CvThres = convergence_th ;
+        if ( NemParaP->CvThres <= 0 ) {
+            fprintf( out_stderr, " Conv threshold must be > 0 (here %f)\n", convergence_th ) ;
+            err = STS_E_ARG ;
+        } /* else threshold > 0 : OK */
+    } 
+    //-----
+    NemParaP->NbIters = it_max ;
+    if ( NemParaP->NbIters < 0 )
+    {
+        fprintf( out_stderr, "Nb iterations must be >= 0 (here %d)\n",  it_max ) ;
+        err = STS_E_ARG ;
+    }
+    //-----
+    StatModelP->Spec.ClassFamily = GetEnum( model_family, FamilyStrVC, FAMILY_NB );
+    if ( StatModelP->Spec.ClassFamily == -1 )
+    {
+        fprintf( out_stderr, " Unknown family %s\n", model_family ) ;
+        err = STS_E_ARG ;
+    }
+    //-----
+    StatModelP->Spec.ClassPropor = GetEnum( proportion, ProporStrVC, PROPOR_NB );
+    if ( StatModelP->Spec.ClassPropor == -1 )
+    {
+        fprintf( out_stderr, " Unknown proportion %s\n", proportion ) ;
+        err = STS_E_ARG ;
+    }
+    //-----
+    StatModelP->Spec.ClassDisper = GetEnum( dispersion, DisperStrVC, DISPER_NB );
+    if ( StatModelP->Spec.ClassDisper == -1 )
+    {
+        fprintf( out_stderr, " Unknown dispersion %s\n", dispersion) ;
+        err = STS_E_ARG ;
+    }
+
+    return err ;
+}
+
+
 /* ------------------------------------------------------------------- */
 static int SetVisitOrder   /*V1.04-e*/
         ( 
@@ -36,4 +36,31 @@ extern int nem(const char* Fname,
         const char* init_file,
         const char* out_file_prefix,
         const int seed);
+
+extern int nem_arrays(const float* points,
+        const int Npt,
+        const int Nd,
+        const int* nei_indptr,
+        const int* nei_indices,
+        const float* nei_weights,
+        const int nk,
+        const char* algo,
+        const float beta,
+        const char* convergence,
+        const float convergence_th,
+        const int it_max,
+        const char* model_family,
+        const char* proportion,
+        const char* dispersion,
+        const int init_mode,
+        const float* init_prop,
+        const float* init_center,
+        const float* init_disp,
+        const char* log_prefix,
+        const int seed,
+        float* classif,
+        float* prop,
+        float* center,
+        float* disp,
+        float* criteria);
 #endif
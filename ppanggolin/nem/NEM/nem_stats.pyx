@@ -15,3 +15,84 @@ cdef extern from "nem_exe.h":
                  const char* init_file,
                  const char* out_file_prefix,
                  const int   seed);
+   int c_nem_arrays "nem_arrays"(const float* points,
+                                 const int   Npt,
+                                 const int   Nd,
+                                 const int*  nei_indptr,
+                                 const int*  nei_indices,
+                                 const float* nei_weights,
+                                 const int   nk,
+                                 const char* algo,
+                                 const float beta,
+                                 const char* convergence,
+                                 const float convergence_th,
+                                 const int   it_max,
+                                 const char* model_family,
+                                 const char* proportion,
+                                 const char* dispersion,
+                                 const int   init_mode,
+                                 const float* init_prop,
+                                 const float* init_center,
+                                 const float* init_disp,
+                                 const char* log_prefix,
+                                 const int   seed,
+                                 float*      classif,
+                                 float*      prop,
+                                 float*      center,
+                                 float*      disp,
+                                 float*      criteria);
+
+import numpy
+
+def nem_arrays(const float[:, ::1] points,
+               const int[::1] nei_indptr,
+               const int[::1] nei_indices,
+               const float[::1] nei_weights,
+               int nk,
+               const char* algo,
+               float beta,
+               const char* convergence,
+               float convergence_th,
+               int it_max,
+               const char* model_family,
+               const char* proportion,
+               const char* dispersion,
+               int init_mode,
+               const float[::1] init_prop,
+               const float[:, ::1] init_center,
+               const float[:, ::1] init_disp,
+               const char* log_prefix,
+               int seed):
+    """
+        Runs NEM on a float32 points matrix (one row per point) and a CSR neighbors graph (int32 indptr and indices, float32 weights).
+        The initial parameters are only read if init_mode is INIT_PARAM_FILE, and nothing is logged if log_prefix is empty.
+        Returns the NEM exit status, the posterior probabilities (points x nk), the proportions (nk), the centers and dispersions (nk x variables) and the criteria (U, D, L, M, Z, error).
+    """
+    cdef int Npt = points.shape[0]
+    cdef int Nd = points.shape[1]
+    if Npt == 0 or Nd == 0:
+        raise ValueError("There are no points to partition.")
+    if nei_indptr.shape[0] != Npt + 1 or nei_indices.shape[0] != nei_weights.shape[0] or nei_indices.shape[0] < nei_indptr[Npt]:
+        raise ValueError("The neighbors arrays do not describe a CSR graph of the points.")
+    if init_prop.shape[0] != nk or init_center.shape[0] != nk or init_center.shape[1] != Nd or init_disp.shape[0] != nk or init_disp.shape[1] != Nd:
+        raise ValueError(f"The initial parameters must be given for {nk} classes and {Nd} variables.")
+    classif = numpy.zeros((Npt, nk), dtype=numpy.float32)
+    prop = numpy.zeros(nk, dtype=numpy.float32)
+    center = numpy.zeros((nk, Nd), dtype=numpy.float32)
+    disp = numpy.zeros((nk, Nd), dtype=numpy.float32)
+    criteria = numpy.zeros(6, dtype=numpy.float32)
+    cdef float[:, ::1] classif_view = classif
+    cdef float[::1] prop_view = prop
+    cdef float[:, ::1] center_view = center
+    cdef float[:, ::1] disp_view = disp
+    cdef float[::1] criteria_view = criteria
+    cdef const int* indices_ptr = NULL
+    cdef const float* weights_ptr = NULL
+    if nei_indices.shape[0] > 0:
+        indices_ptr = &nei_indices[0]
+        weights_ptr = &nei_weights[0]
+    status = c_nem_arrays(&points[0, 0], Npt, Nd, &nei_indptr[0], indices_ptr, weights_ptr,
+                          nk, algo, beta, convergence, convergence_th, it_max, model_family, proportion, dispersion,
+                          init_mode, &init_prop[0], &init_center[0, 0], &init_disp[0, 0], log_prefix, seed,
+                          &classif_view[0, 0], &prop_view[0], &center_view[0, 0], &disp_view[0, 0], &criteria_view[0])
+    return status, classif, prop, center, disp, criteria
@@ -6,7 +6,7 @@ import logging
 import random
 import tempfile
 import time
-from multiprocessing import Pool
+from multiprocessing import Pool, util
 import os
 import argparse
 from collections import defaultdict, Counter
@@ -14,37 +14,107 @@ import math
 from shutil import copytree
 #installed libraries
 from tqdm import tqdm
-import plotly.offline as out_plotly
-import plotly.graph_objs as go
+import numpy
 #local libraries
 from ppanggolin.pangenome import Pangenome
-from ppanggolin.utils import mkOutdir
+from ppanggolin.sharedPangenome import SharedPangenome
+from ppanggolin.utils import mkOutdir, readCheckpoint, writeCheckpoint
 from ppanggolin.formats import checkPangenomeInfo, writePangenome
+from ppanggolin.metrics import measured, popStages, mergeStages
 
 #cython library (local)
 import nem_stats
 
+#global variable to store the shared arrays of the pangenome, in the main process and in the workers
 pan = None
-samples = []
 
-def run_partitioning(nem_dir_path, nb_org, beta, free_dispersion, K = 3, seed = 42, init="param_file", keep_files = False, itermax=100, just_log_likelihood=False):
+def attach_pangenome(descriptor):
+    """
+        Initializes a worker process, which attaches to the shared arrays of the pangenome and detaches from them when it exits.
+    """
+    global pan
+    pan = SharedPangenome.attach(descriptor)
+    util.Finalize(pan, pan.close, exitpriority = 0)#the workers leave through os._exit, which skips atexit but not the finalizers of multiprocessing.
+
+def default_init_parameters(nb_org, K):
+    """
+        Returns the initial proportions (K), presence vectors (K x nb_org) and dispersion vectors (K x nb_org) of the K classes.
+        The first half of the classes are present in all organisms, the second half in none, with a dispersion that is larger for the classes in the middle.
+    """
+    proportions = numpy.full(K, round(1/float(K),2), dtype=numpy.float32)
+    mu = numpy.zeros((K, nb_org), dtype=numpy.float32)
+    epsilon = numpy.zeros((K, nb_org), dtype=numpy.float32)
+    step = 0.5/(math.ceil(K/2))
+    for k in range(1,K+1):
+        if k <= K/2:
+            mu[k-1] = 1
+            epsilon[k-1] = step*k
+        else:
+            epsilon[k-1] = step*(K-k+1)
+    return proportions, mu, epsilon
+
+def old_partitions_init_parameters(nem_input, K):
+    """
+        Returns the initial parameters of the K classes computed from the partitions that the gene families already have, to start NEM close to the former partitioning.
+        For each class, an organism is present if it is in most of the families of that class, and the dispersion is the share of those families that disagree.
+        The classes with no family keep the default parameters.
+    """
+    fam_names, data = nem_input[:2]
+    proportions, mu, epsilon = default_init_parameters(data.shape[1], K)
+    classes = {"P":0, "C":K-1}
+    classes.update({ "S"+str(k):k for k in range(1, K-1) })
+    fam_index = pan.getFamilyIndex()
+    fam_classes = numpy.array([ classes.get(pan.partitions[fam_index[name]], -1) for name in fam_names ])
+    total = numpy.count_nonzero(fam_classes >= 0)
+    for k in range(K):
+        in_class = fam_classes == k
+        nb_fams = numpy.count_nonzero(in_class)
+        if nb_fams > 0:
+            frequencies = data[in_class].sum(axis=0, dtype=numpy.float64) / nb_fams
+            #the dispersions are kept away from 0 as it would fix the class.
+            proportions[k] = round(max(nb_fams / total, 0.01), 4)
+            mu[k] = frequencies >= 0.5
+            epsilon[k] = numpy.round(numpy.maximum(numpy.minimum(frequencies, 1 - frequencies), 0.01), 4)
+    return proportions, mu, epsilon
+
+def write_nem_output_files(nem_dir_path, K, init_parameters, posteriors, parameters, criteria):
+    """
+        Writes the initial parameters, the posterior probabilities and the parameters estimated by NEM in the files that the NEM program would write.
+    """
+    proportions, mu, epsilon = init_parameters
+    with open(nem_dir_path+"/nem_file_init_"+str(K)+".m", "w") as m_file:
+        m_file.write("1 ")# 1 to initialize parameter,
+        m_file.write(" ".join([ str(round(float(proportion), 4)) for proportion in proportions[:-1] ])+" ")# the initial proportion of each class (the last proportion is automaticaly determined by substraction in nem)
+        m_file.write(" ".join([ str(int(m)) for m in mu.flat ])+" "+" ".join([ str(round(float(e), 4)) for e in epsilon.flat ]))
+    with open(nem_dir_path+"/nem_file_"+str(K)+".uf", "w") as uf_file:
+        for row in posteriors:
+            uf_file.write("".join([ f" {prob:5.3f} " for prob in row ]) + "\n")
+    proportions, mu, epsilon = parameters
+    with open(nem_dir_path+"/nem_file_"+str(K)+".mf", "w") as mf_file:
+        mf_file.write("Criteria U=NEM, D=Hathaway, L=mixture, M=markov ps-like, Z=log pseudo-l, error\n\n")
+        mf_file.write("  " + "    ".join([ f"{crit:g}" for crit in criteria ]) + "\n\n")
+        mf_file.write(f"Mu ({mu.shape[1]}), Pk, and disp ({mu.shape[1]}) of the {K} classes\n\n")
+        for k in range(K):
+            mf_file.write("".join([ f" {m:10.3g} " for m in mu[k] ]) + f"  {proportions[k]:5.3g}  " + "".join([ f" {e:10g} " for e in epsilon[k] ]) + "\n")
+
+@measured(unit = "families", items = lambda nem_input, *args, **kwargs : len(nem_input[0]))
+def run_partitioning(nem_input, beta, free_dispersion, K = 3, seed = 42, init="param_file", nem_dir_path = None, itermax=100, just_log_likelihood=False):
+    """
+        Runs NEM on the gene families described by nem_input (as returned by nem_inputs).
+        If nem_dir_path is given, NEM logs its run in this directory, and the parameters and results are written there.
+    """
     logging.getLogger().debug("run_partitioning...")
-    if init=="param_file":
-        with open(nem_dir_path+"/nem_file_init_"+str(K)+".m", "w") as m_file:
-            m_file.write("1 ")# 1 to initialize parameter,
-            m_file.write(" ".join([str(round(1/float(K),2)) for k in range(K-1)])+" ")# 1/K give the initial proportition to each class (the last proportion is automaticaly determined by substraction in nem)
-            mu=[]
-            epsilon=[]
-            step = 0.5/(math.ceil(K/2))
-            for k in range(1,K+1):
-                if k <= K/2:
-                    mu += ["1"]*nb_org
-                    epsilon += [str(step*k)]*nb_org
-                else:
-                    mu += ["0"]*nb_org
-                    epsilon += [str(step*(K-k+1))]*nb_org
-
-            m_file.write(" ".join(mu)+" "+" ".join(epsilon))
+    fam_names, data, indptr, indices, weights = nem_input
+    if len(fam_names) == 0:#the organisms share no gene family, NEM has nothing to partition.
+        logging.getLogger().debug("partitioning did not work, there are no gene families to partition")
+        return [{},None,None]
+    nb_org = data.shape[1]
+    if init in ["param_file","init_from_old"]:
+        init_parameters = default_init_parameters(nb_org, K) if init == "param_file" else old_partitions_init_parameters(nem_input, K)
+        #the last proportion is determined by substraction in nem
+        init_parameters[0][-1] = 1 - init_parameters[0][:-1].sum(dtype=numpy.float64)
+    else:
+        init_parameters = default_init_parameters(nb_org, K)#not used by nem.
 
     ALGO           = b"nem" #fuzzy classification by mean field approximation
     MODEL          = b"bern" # multivariate Bernoulli mixture model
@@ -55,224 +125,167 @@ def run_partitioning(nem_dir_path, nb_org, beta, free_dispersion, K = 3, seed =
     # (INIT_SORT, INIT_RANDOM, INIT_PARAM_FILE, INIT_FILE, INIT_LABEL, INIT_NB) = range(0,6)
     INIT_RANDOM, INIT_PARAM_FILE = range(1,3)
     logging.getLogger().debug("Running NEM...")
-    logging.getLogger().debug([nem_dir_path.encode('ascii')+b"/nem_file",
-        K,
-        ALGO,
-        beta,
-        CONVERGENCE,
-        CONVERGENCE_TH,
-        b"fuzzy",
-        itermax,
-        True,
-        MODEL,
-        PROPORTION,
-        VARIANCE_MODEL,
-        INIT_PARAM_FILE if init in ["param_file","init_from_old"] else INIT_RANDOM,
-        nem_dir_path.encode('ascii')+b"/nem_file_init_"+str(K).encode('ascii')+b".m",
-        nem_dir_path.encode('ascii')+b"/nem_file_"+str(K).encode('ascii'),
-        seed])
-    nem_stats.nem(Fname         = nem_dir_path.encode('ascii')+b"/nem_file",
+    logging.getLogger().debug([data.shape, K, ALGO, beta, CONVERGENCE, CONVERGENCE_TH, itermax, MODEL, PROPORTION, VARIANCE_MODEL,
+                               INIT_PARAM_FILE if init in ["param_file","init_from_old"] else INIT_RANDOM, nem_dir_path, seed])
+    status, posteriors, proportions, mu, epsilon, criteria = nem_stats.nem_arrays(
+                points          = data,
+                nei_indptr      = indptr,
+                nei_indices     = indices,
+                nei_weights     = weights,
                 nk              = K,
                 algo            = ALGO,
                 beta            = beta,
                 convergence     = CONVERGENCE,
                 convergence_th  = CONVERGENCE_TH,
-                format          = b"fuzzy",
                 it_max          = itermax,
-                dolog           = True,
                 model_family    = MODEL,
                 proportion      = PROPORTION,
                 dispersion      = VARIANCE_MODEL,
                 init_mode       = INIT_PARAM_FILE if init in ["param_file","init_from_old"] else INIT_RANDOM,
-                init_file       = nem_dir_path.encode('ascii')+b"/nem_file_init_"+str(K).encode('ascii')+b".m",
-                out_file_prefix = nem_dir_path.encode('ascii')+b"/nem_file_"+str(K).encode('ascii'),
+                init_prop       = init_parameters[0],
+                init_center     = init_parameters[1],
+                init_disp       = init_parameters[2],
+                log_prefix      = b"" if nem_dir_path is None else nem_dir_path.encode('ascii')+b"/nem_file_"+str(K).encode('ascii'),
                 seed            = seed)
-
     logging.getLogger().debug("After running NEM...")
 
-    no_nem = False
-    if os.path.isfile(nem_dir_path+"/nem_file_"+str(K)+".uf"):
-        logging.getLogger().debug("Reading NEM results...")
-    elif not just_log_likelihood:
-        # logging.getLogger().warning("No NEM output file found: "+ nem_dir_path+"/nem_file_"+str(K)+".uf")
-        no_nem = True
-    else:
-        logging.getLogger().debug("No NEM output file found: "+ nem_dir_path+"/nem_file_"+str(K)+".uf")
-        no_nem = True
-    index_fam = []
-    all_parameters = {}
-
-    with open(nem_dir_path+"/nem_file.index","r") as index_nem_file:
-        for line in index_nem_file:
-            index_fam.append(line.split("\t")[1].strip())
-
-    partitions_list = ["U"] * len(index_fam)
-    all_parameters  = {}
-    U,D,log_likelihood = [None]*3#L,Z, error
-    entropy         = None
-    try:
-        with open(nem_dir_path+"/nem_file_"+str(K)+".uf","r") as partitions_nem_file, open(nem_dir_path+"/nem_file_"+str(K)+".mf","r") as parameters_nem_file:
-            parameters      = parameters_nem_file.readlines()
-            U,D,_,log_likelihood,_,_ = [float(p) for p in parameters[2].split()]#L,Z, error
-
-            sum_mu_k       = []
-            sum_epsilon_k  = []
-
-            for k, line in enumerate(parameters[-K:]):
-                vector = line.split()
-                mu_k = [bool(float(mu_kj)) for mu_kj in vector[0:nb_org]]
-                epsilon_k = [float(epsilon_kj) for epsilon_kj in vector[nb_org+1:]]
-                proportion = float(vector[nb_org])
-                sum_mu_k.append(sum(mu_k))
-                sum_epsilon_k.append(sum(epsilon_k))
-                if k == 0:
-                    all_parameters["persistent"]=(mu_k,epsilon_k,proportion)
-                elif k == K-1:
-                    all_parameters["cloud"]=(mu_k,epsilon_k,proportion)
-                else:
-                    all_parameters["shell_"+str(k)]=(mu_k,epsilon_k,proportion)
-
-            partition               = {}
-            partition[0]   = "P"#PERSISTENT
-            partition[K-1] = "C"#CLOUD
-            for i in range(1,K-1):
-                partition[i]="S"+str(i)
-            entropy = 0
-
-            for i, line in enumerate(partitions_nem_file):
-                elements = [float(el) for el in line.split()]
-                if just_log_likelihood:
-                    entropy +=sum([math.log(float(el))*float(el) if float(el)>0 else 0 for el in elements])
-                else:
-                    max_prob = max([float(el) for el in elements])
-                    positions_max_prob = [pos for pos, prob in enumerate(elements) if prob == max_prob]
-                    if (len(positions_max_prob)>1 or max_prob<0.5):
-                        partitions_list[i]="S_"#SHELL in case of doubt gene families is attributed to shell
-                    else:
-                        partitions_list[i]=partition[positions_max_prob.pop()]
-    except IOError:
-        logging.getLogger().debug("partitioning did not work (the number of organisms used is probably too low), see logs here to obtain more details "+nem_dir_path+"/nem_file_"+str(K)+".log")
+    if status != 0:
+        logging.getLogger().debug(f"partitioning did not work (the number of organisms used is probably too low), NEM exited with status {status}")
         return  [{},None,None]#return empty objects.
-    except ValueError:
-        ## return the default partitions_list which correspond to undefined
-        pass
-
-    if not keep_files and no_nem is False:
-        os.remove(nem_dir_path+"/nem_file_"+str(K)+".uf")
-        os.remove(nem_dir_path+"/nem_file_"+str(K)+".mf")
-        os.remove(nem_dir_path+"/nem_file_"+str(K)+".log")
-        os.remove(nem_dir_path+"/nem_file_"+str(K)+".stderr")
-        os.remove(nem_dir_path+"/nem_file_init_"+str(K)+".m")
-        os.remove(nem_dir_path+"/nem_file.index")
-        os.remove(nem_dir_path+"/nem_file.dat")
-        os.remove(nem_dir_path+"/nem_file.nei")
-        os.remove(nem_dir_path+"/nem_file.str")
+
+    #the posterior probabilities are read with 3 decimals, as NEM writes them.
+    posteriors = numpy.round(posteriors.astype(numpy.float64), 3)
+    if nem_dir_path is not None:
+        write_nem_output_files(nem_dir_path, K, init_parameters, posteriors, (proportions, mu, epsilon), criteria)
+    U,D,_,log_likelihood,_,_ = criteria.tolist()#L,Z, error
 
     if just_log_likelihood:
+        entropy = float(numpy.sum(posteriors * numpy.log(numpy.where(posteriors > 0, posteriors, 1))))
         return (tuple([K,log_likelihood,entropy]))
-    else:
-        return((dict(zip(index_fam, partitions_list)),all_parameters,log_likelihood))
+
+    all_parameters = {}
+    for k in range(K):
+        parameters = ([ bool(mu_kj) for mu_kj in mu[k] ], epsilon[k].tolist(), float(proportions[k]))
+        if k == 0:
+            all_parameters["persistent"]=parameters
+        elif k == K-1:
+            all_parameters["cloud"]=parameters
+        else:
+            all_parameters["shell_"+str(k)]=parameters
+
+    partition = ["P"] + [ "S"+str(i) for i in range(1,K-1) ] + ["C"]#PERSISTENT, SHELLS and CLOUD
+    max_prob = posteriors.max(axis=1)
+    nb_max_prob = numpy.count_nonzero(posteriors == max_prob[:, None], axis=1)
+    #SHELL in case of doubt gene families is attributed to shell
+    partitions_list = [ "S_" if nb_max > 1 or prob < 0.5 else partition[k] for k, prob, nb_max in zip(posteriors.argmax(axis=1), max_prob, nb_max_prob) ]
+    return((dict(zip(fam_names, partitions_list)),all_parameters,log_likelihood))
 
 def nemSingle(args):
-    return run_partitioning(*args)
+    return run_partitioning(*args), popStages()#the measures of the worker are sent back to the main process
 
-def partition_nem(index, tmpdir, beta, sm_degree, free_dispersion, K, seed, init, keep_tmp_files):
-    currtmpdir = tmpdir + "/" +str(index)#unique directory name
-    samp = samples[index]#org_samples accessible because it is a global variable.
-    edges_weight, nb_fam = write_nem_input_files(tmpdir=currtmpdir, organisms=samp, sm_degree = sm_degree)
-    return run_partitioning( currtmpdir, len(samp), beta * (nb_fam/edges_weight), free_dispersion, K = K, seed = seed, init = init, keep_files = keep_tmp_files)
+def partition_nem(index, samp, tmpdir, beta, sm_degree, free_dispersion, K, seed, init, keep_tmp_files):
+    nem_input, edges_weight = nem_inputs(samp, sm_degree)
+    nem_dir_path = None
+    if keep_tmp_files:
+        nem_dir_path = tmpdir + "/" +str(index)#unique directory name
+        write_nem_input_files(nem_dir_path, samp, nem_input)
+    return run_partitioning(nem_input, beta * (len(nem_input[0])/edges_weight), free_dispersion, K = K, seed = seed, init = init, nem_dir_path = nem_dir_path)
 
 def nemSamples(pack):
     #run partitionning
-    return partition_nem(*pack)
-
-def write_nem_input_files( tmpdir, organisms, sm_degree):
+    return pack[0], partition_nem(*pack), popStages()
 
+def nem_inputs(organisms, sm_degree):
+    """
+        Returns the inputs of NEM for the organisms of the given indexes, and the total weight of the edges of the graph.
+        The inputs are the names of the gene families present in the organisms, their presence/absence matrix (families x organisms, float32),
+        and their neighbors as a CSR graph (int32 indptr and indices, float32 weights) where the edges are weighted by the number of gene pairs they link per organism.
+        The families with no neighbors or with sm_degree neighbors or more are not smoothed.
+    """
+    organisms = numpy.array(list(organisms), dtype = numpy.int64)
+    presences = pan.getFamilyPresences(organisms)
+    present = presences.any(axis = 1)
+    data = presences[present].astype(numpy.float32)
+    fam_indptr, fam_edges, fam_neighbors, edge_indptr, edge_orgs, edge_counts = pan.computeEdgeArrays()
+
+    #number of gene pairs linked by each edge in the organisms
+    in_sample = numpy.zeros(pan.number_of_organisms(), dtype = bool)
+    in_sample[organisms] = True
+    edges = numpy.repeat(numpy.arange(len(edge_indptr) - 1), numpy.diff(edge_indptr))
+    coverage = numpy.bincount(edges, weights = edge_counts * in_sample[edge_orgs], minlength = len(edge_indptr) - 1)
+
+    #the edges that exist with this subset of organisms, for the families that are smoothed.
+    fams = numpy.repeat(numpy.arange(len(fam_indptr) - 1), numpy.diff(fam_indptr))
+    exists = coverage[fam_edges] > 0
+    degrees = numpy.bincount(fams[exists], minlength = len(fam_indptr) - 1)
+    kept = exists & ((degrees > 0) & (degrees < sm_degree))[fams]
+
+    local_index = numpy.cumsum(present) - 1#index of the families among those present in the organisms
+    distance_scores = coverage[fam_edges[kept]] / len(organisms)
+    indptr = numpy.zeros(len(data) + 1, dtype = numpy.int32)
+    numpy.cumsum(numpy.bincount(local_index[fams[kept]], minlength = len(data)), out = indptr[1:])
+    indices = local_index[fam_neighbors[kept]].astype(numpy.int32)
+    weights = numpy.round(distance_scores, 4).astype(numpy.float32)
+
+    nem_input = (pan.famNames[present].tolist(), data, indptr, indices, weights)
+    return nem_input, distance_scores.sum()/2
+
+@measured(unit = "families", items = lambda tmpdir, organisms, nem_input : len(nem_input[0]))
+def write_nem_input_files(tmpdir, organisms, nem_input):
+    """
+        Writes the inputs of NEM in the files that the NEM program reads, to keep them.
+    """
     mkOutdir(tmpdir, force = False)
-    total_edges_weight = 0
+    fam_names, data, indptr, indices, weights = nem_input
 
     with open(tmpdir+"/column_org_file", "w") as org_file:
-        org_file.write(" ".join([ f'"{org.name}"' for org in organisms]) + "\n")
-
+        org_file.write(" ".join([ f'"{pan.orgNames[org]}"' for org in organisms]) + "\n")
 
     logging.getLogger().debug("Writing nem_file.str nem_file.index nem_file.nei and nem_file.dat files")
     with open(tmpdir+"/nem_file.str", "w") as str_file,\
         open(tmpdir+"/nem_file.index", "w") as index_file,\
         open(tmpdir+"/nem_file.nei", "w") as nei_file,\
         open(tmpdir+"/nem_file.dat", "w") as dat_file:
-
         nei_file.write("1\n")
-        index_fam = {}
-
-        index_org = {}
-        default_dat = []
-        for index, org in enumerate(organisms):
-            default_dat.append('0')
-            index_org[org] = index
-        # logging.getLogger().info("write families : "+getCurrentRAM())
-        for fam in pan.geneFamilies:
-            #could use bitarrays if this part is limiting?
-            if not organisms.isdisjoint(fam.organisms):
-                currDat = list(default_dat)
-                curr_orgs = fam.organisms & organisms
-                for org in curr_orgs:
-                    currDat[index_org[org]] = "1"
-                dat_file.write("\t".join(currDat) + "\n")
-                index_fam[fam] = len(index_fam) +1
-                index_file.write(f"{len(index_fam)}\t{fam.name}\n")
-        # logging.getLogger().info("write graph : "+getCurrentRAM())
-
-        for fam in index_fam.keys():
-            row_fam = []
-            row_dist_score = []
-            neighbor_number = 0
-            sum_dist_score = 0
-            for edge in fam.edges:#iter on the family's edges.
-                coverage = sum([ len(gene_list) for org, gene_list in edge.organisms.items() if org in organisms ])
-                if coverage == 0:
-                    continue#nothing interesting to write, this edge does not exist with this subset of organisms.
-                distance_score = coverage / len(organisms)
-                sum_dist_score += distance_score
-                row_fam.append(str(index_fam[ edge.target if fam == edge.source else edge.source]))
-                row_dist_score.append(str(round(distance_score, 4)))
-                neighbor_number+=1
-            if neighbor_number > 0 and float(neighbor_number) < sm_degree:
-                total_edges_weight += sum_dist_score
-                nei_file.write('\t'.join([str(item) for sublist in [[index_fam[fam]],[neighbor_number],row_fam,row_dist_score] for item in sublist])+"\n")
-            else:
-                nei_file.write(str(index_fam[fam]) + "\t0\n")
-
-        str_file.write("S\t"+str(len(index_fam))+"\t"+str(len(organisms))+"\n")
-    # logging.getLogger().info("done writing input files : "+getCurrentRAM())
-    return total_edges_weight/2, len(index_fam)
-
-def evaluate_nb_partitions(organisms, sm_degree, free_dispersion, chunk_size, Krange, ICL_margin, draw_ICL, cpu, tmpdir, seed, outputdir):
-    Newtmpdir = tmpdir + "/eval_partitions"
+        for index, fam_name in enumerate(fam_names):
+            index_file.write(f"{index+1}\t{fam_name}\n")
+            dat_file.write("\t".join([ str(int(present)) for present in data[index] ]) + "\n")
+            neighbors = indices[indptr[index]:indptr[index+1]]
+            nei_file.write("\t".join([ str(item) for item in [index+1, len(neighbors)] + [ nei+1 for nei in neighbors ] + [ round(float(w), 4) for w in weights[indptr[index]:indptr[index+1]] ] ]) + "\n")
+        str_file.write("S\t"+str(len(fam_names))+"\t"+str(data.shape[1])+"\n")
+
+@measured()
+def evaluate_nb_partitions(organisms, sm_degree, free_dispersion, chunk_size, Krange, ICL_margin, draw_ICL, cpu, seed, outputdir):
+    """
+        Returns the number of partitions that maximizes the ICL of the partitioning of the organisms of the given indexes (or of a chunk of them).
+    """
     ChosenK = 3
     if len(organisms) > chunk_size:
-        select_organisms = set(random.sample(set(organisms), chunk_size))
+        select_organisms = set(random.sample(list(organisms), chunk_size))
     else:
         select_organisms = set(organisms)
 
-    _, nb_fam = write_nem_input_files( Newtmpdir, select_organisms, sm_degree)
+    nem_input, _ = nem_inputs(select_organisms, sm_degree)
+    nb_fam = len(nem_input[0])
     max_icl_K      = 0
     argsPartitionning = []
     for k in range(Krange[0]-1, Krange[1]+1):
-        argsPartitionning.append((Newtmpdir, len(select_organisms), 0, free_dispersion, k, seed, "param_file", True, 10, True))#those arguments follow the order of the arguments of run_partitionning
+        argsPartitionning.append((nem_input, 0, free_dispersion, k, seed, "param_file", None, 10, True))#those arguments follow the order of the arguments of run_partitionning
     allLogLikelihood = []
 
     if cpu > 1:
         bar = tqdm(range(len(argsPartitionning)), unit = "Number of number of partitions")
         with Pool(processes = cpu) as p:
-            for result in p.imap_unordered(nemSingle, argsPartitionning):
+            for result, measures in p.imap_unordered(nemSingle, argsPartitionning):
                 allLogLikelihood.append(result)
+                mergeStages(measures)
                 bar.update()
             p.close()
             p.join()
         bar.close()
     else:#for the case where it is called in a daemonic subprocess with a single cpu
         for arguments in argsPartitionning:
-            allLogLikelihood.append(nemSingle(arguments))
+            allLogLikelihood.append(run_partitioning(*arguments))
 
     def calculate_BIC(log_likelihood,nb_params,nb_points):
         return( log_likelihood - 0.5 *(math.log(nb_points) * nb_params))
@@ -293,6 +306,9 @@ def evaluate_nb_partitions(organisms, sm_degree, free_dispersion, chunk_size, Kr
         best_K = min({k for k, icl in all_ICLs.items() if icl>=all_ICLs[max_icl_K]-delta_ICL and k <= max_icl_K})
         ChosenK = best_K if best_K >=3 else ChosenK
     if len(all_BICs)>0 and draw_ICL:
+        #imported on call to keep the command line fast to start
+        import plotly.offline as out_plotly
+        import plotly.graph_objs as go
         traces = []
         traces.append(go.Scatter(x=[ key for key in sorted(all_BICs.keys()) ],
                                     y=[ all_BICs[key] for key in sorted(all_BICs.keys()) ],
@@ -319,18 +335,23 @@ def evaluate_nb_partitions(organisms, sm_degree, free_dispersion, chunk_size, Kr
         out_plotly.plot(fig, filename=outputdir+"/ICL_curve_K"+str(best_K)+".html", auto_open=False)
     return ChosenK
 
-def partition(pangenome, tmpdir, outputdir = None, beta = 2.5, sm_degree = 10, free_dispersion=False, chunk_size=500, K=-1, Krange=None, ICL_margin=0.05, draw_ICL = False, cpu = 1, seed = 42, keep_tmp_files = False):
+@measured(unit = "families", items = lambda pangenome, *args, **kwargs : pangenome.number_of_geneFamilies())
+def partition(pangenome, tmpdir, outputdir = None, beta = 2.5, sm_degree = 10, free_dispersion=False, chunk_size=500, K=-1, Krange=None, ICL_margin=0.05, draw_ICL = False, cpu = 1, seed = 42, keep_tmp_files = False, init = "param_file", checkpointDir = None):
+    """
+        Partitions the pangenome graph with NEM.
+        init is 'param_file' to start from the default parameters, or 'init_from_old' to start from the partitions that the gene families already have, in which case K must be given.
+        If checkpointDir is given, the results of the samples are saved there, and those saved by a killed run with the same samples and parameters are used.
+    """
 
     Krange = Krange or [3,20]
     global pan
-    global samples
-    pan = pangenome
 
     if draw_ICL and outputdir is None:
         raise Exception("Combination of option impossible: You asked to draw the ICL curves but did not provide an output directory!")
 
-    checkPangenomeInfo(pangenome, needAnnotations=True, needFamilies=True, needGraph=True)
+    checkPangenomeInfo(pangenome, needFamilies=True, needGraph=True)
     organisms = set(pangenome.organisms)
+    index = pangenome.getIndex()
 
     tmpdirObj = tempfile.TemporaryDirectory(dir=tmpdir)
     tmpdir = tmpdirObj.name
@@ -347,89 +368,110 @@ def partition(pangenome, tmpdir, outputdir = None, beta = 2.5, sm_degree = 10, f
         pangenome.parameters["partition"]["chunk_size"] = chunk_size
     pangenome.parameters["partition"]["computed_K"] = False
 
-    if K < 3:
-        pangenome.parameters["partition"]["computed_K"] = True
-        logging.getLogger().info("Estimating the optimal number of partitions...")
-        K = evaluate_nb_partitions( organisms, sm_degree, free_dispersion, chunk_size, Krange, ICL_margin, draw_ICL, cpu, tmpdir, seed, outputdir)
-        logging.getLogger().info(f"The number of partitions has been evaluated at {K}")
-
-    pangenome.parameters["partition"]["K"] = K
-    init = "param_file"
-
-    partitionning_results = {}
-
-    families = set()
-    cpt = 0
-    cpt_partition = {}
-    random.seed(seed)
-
-    for fam in pangenome.geneFamilies:
-        families.add(fam)
+    pan = SharedPangenome.fromPangenome(pangenome)#the workers attach to the arrays of the pangenome instead of copying it.
+    try:
+        if K < 3:
+            if init == "init_from_old":
+                raise Exception("The number of partitions must be given to start the partitioning from the former partitions.")
+            pangenome.parameters["partition"]["computed_K"] = True
+            logging.getLogger().info("Estimating the optimal number of partitions...")
+            K = evaluate_nb_partitions([ index[org] for org in organisms ], sm_degree, free_dispersion, chunk_size, Krange, ICL_margin, draw_ICL, cpu, seed, outputdir)
+            logging.getLogger().info(f"The number of partitions has been evaluated at {K}")
+
+        pangenome.parameters["partition"]["K"] = K
+
+        partitionning_results = {}
+        samples = []
+
+        families = set()
+        cpt = 0
+        cpt_partition = {}
+        random.seed(seed)
+
+        for fam in pangenome.geneFamilies:
+            families.add(fam)
+            if chunk_size < len(organisms):
+                cpt_partition[fam.name] = {"P":0,"S":0,"C":0,"U":0}
+
+        start_partitionning = time.time()
+        logging.getLogger().info("Partitioning...")
+        pansize = len(families)
         if chunk_size < len(organisms):
-            cpt_partition[fam.name] = {"P":0,"S":0,"C":0,"U":0}
-
-    start_partitionning = time.time()
-    logging.getLogger().info("Partitioning...")
-    pansize = len(families)
-    if chunk_size < len(organisms):
-        validated = set()
-
-        def validate_family(result):
-            for node, nem_class in result[0].items():
-                cpt_partition[node][nem_class[0]]+=1
-                sum_partionning = sum(cpt_partition[node].values())
-                if (sum_partionning > len(organisms)/chunk_size and max(cpt_partition[node].values()) >= sum_partionning*0.5) or (sum_partionning > len(organisms)):
-                    if node not in validated:
-                        if max(cpt_partition[node].values()) < sum_partionning*0.5:
-                            cpt_partition[node]["U"] = len(organisms) #if despite len(select_organisms) partionning, an abosolute majority is not found then the families is set to undefined
-                        validated.add(node)
-
-        org_nb_sample = Counter()
-        for org in organisms:
-            org_nb_sample[org] = 0
-        condition = len(organisms)/chunk_size
-        while len(validated) < pansize:
-            prev = len(samples)#if we've been sampling already, samples is not empty.
-            while not all(val >= condition for val in org_nb_sample.values()):#each family must be tested at least len(select_organisms)/chunk_size times.
-                shuffled_orgs = list(organisms)#copy select_organisms
-                random.shuffle(shuffled_orgs)#shuffle the copied list
-                while len(shuffled_orgs) > chunk_size:
-                    samples.append(set(shuffled_orgs[:chunk_size]))
-                    for org in samples[-1]:
-                        org_nb_sample[org] +=1
-                    shuffled_orgs = shuffled_orgs[chunk_size:]
-            args = []
-            # tmpdir, beta, sm_degree, free_dispersion, K, seed
-            for i, _ in enumerate(samples[prev:], start=prev):
-                args.append((i, tmpdir, beta,sm_degree, free_dispersion, K, seed, init, keep_tmp_files))
-
-            logging.getLogger().info("Launching NEM")
-            with Pool(processes = cpu) as p:
-                #launch partitionnings
-                bar = tqdm(range(len(args)), unit = " samples partitionned")
-                for result in p.imap_unordered(nemSamples, args):
-                    validate_family(result)
-                    bar.update()
-
-                bar.close()
-                condition += 1#if len(validated) < pan_size, we will want to resample more.
-                logging.getLogger().debug(f"There are {len(validated)} validated families out of {pansize} families.")
-                p.close()
-                p.join()
-        for fam, data in cpt_partition.items():
-            partitionning_results[fam]=max(data, key=data.get)
-
-        ## need to compute the median vectors of each partition ???
-        partitionning_results = [partitionning_results,[]]##introduces a 'non feature'.
-
-        logging.getLogger().info(f"Did {len(samples)} partitionning with chunks of size {chunk_size} among {len(organisms)} genomes in {round(time.time() - start_partitionning,2)} seconds.")
-    else:
-        edges_weight, nb_fam = write_nem_input_files( tmpdir+"/"+str(cpt)+"/", organisms, sm_degree = sm_degree)
-        partitionning_results = run_partitioning( tmpdir+"/"+str(cpt)+"/", len(organisms), beta * (nb_fam/edges_weight), free_dispersion, K = K, seed = seed, init = init, keep_files=keep_tmp_files)
-        if partitionning_results == [{},None,None]:
-            raise Exception("Statistical partitionning does not work on your data. This usually happens because you used very few (<15) genomes.")
-        cpt+=1
-        logging.getLogger().info(f"Partitionned {len(organisms)} genomes in {round(time.time() - start_partitionning,2)} seconds.")
+            validated = set()
+
+            def validate_family(result):
+                for node, nem_class in result[0].items():
+                    cpt_partition[node][nem_class[0]]+=1
+                    sum_partionning = sum(cpt_partition[node].values())
+                    if (sum_partionning > len(organisms)/chunk_size and max(cpt_partition[node].values()) >= sum_partionning*0.5) or (sum_partionning > len(organisms)):
+                        if node not in validated:
+                            if max(cpt_partition[node].values()) < sum_partionning*0.5:
+                                cpt_partition[node]["U"] = len(organisms) #if despite len(select_organisms) partionning, an abosolute majority is not found then the families is set to undefined
+                            validated.add(node)
+
+            org_nb_sample = Counter()
+            for org in organisms:
+                org_nb_sample[org] = 0
+            condition = len(organisms)/chunk_size
+            while len(validated) < pansize:
+                prev = len(samples)#if we've been sampling already, samples is not empty.
+                while not all(val >= condition for val in org_nb_sample.values()):#each family must be tested at least len(select_organisms)/chunk_size times.
+                    shuffled_orgs = list(pangenome.organisms)#copy select_organisms, always in the same order so that the samples only depend on the seed
+                    random.shuffle(shuffled_orgs)#shuffle the copied list
+                    while len(shuffled_orgs) > chunk_size:
+                        samples.append(shuffled_orgs[:chunk_size])
+                        for org in samples[-1]:
+                            org_nb_sample[org] +=1
+                        shuffled_orgs = shuffled_orgs[chunk_size:]
+                args = []
+                keys = {}
+                bar = tqdm(range(len(samples) - prev), unit = " samples partitionned")
+                # tmpdir, beta, sm_degree, free_dispersion, K, seed
+                for i, _ in enumerate(samples[prev:], start=prev):
+                    keys[i] = ([ org.name for org in samples[i] ], beta, sm_degree, free_dispersion, K, seed, init)
+                    result = readCheckpoint(checkpointDir, i, keys[i])
+                    if result is not None:#partitionned by a former run
+                        validate_family(result)
+                        bar.update()
+                    else:
+                        args.append((i, [ index[org] for org in samples[i] ], tmpdir, beta,sm_degree, free_dispersion, K, seed, init, keep_tmp_files))
+
+                logging.getLogger().info("Launching NEM")
+                with Pool(processes = cpu, initializer = attach_pangenome, initargs = (pan.descriptor,)) as p:
+                    #launch partitionnings
+                    for i, result, measures in p.imap_unordered(nemSamples, args):
+                        mergeStages(measures)
+                        writeCheckpoint(checkpointDir, i, keys[i], result)
+                        validate_family(result)
+                        bar.update()
+
+                    bar.close()
+                    condition += 1#if len(validated) < pan_size, we will want to resample more.
+                    logging.getLogger().debug(f"There are {len(validated)} validated families out of {pansize} families.")
+                    p.close()
+                    p.join()
+            for fam, data in cpt_partition.items():
+                partitionning_results[fam]=max(data, key=data.get)
+
+            ## need to compute the median vectors of each partition ???
+            partitionning_results = [partitionning_results,[]]##introduces a 'non feature'.
+
+            logging.getLogger().info(f"Did {len(samples)} partitionning with chunks of size {chunk_size} among {len(organisms)} genomes in {round(time.time() - start_partitionning,2)} seconds.")
+        else:
+            org_indexes = [ index[org] for org in organisms ]
+            nem_input, edges_weight = nem_inputs(org_indexes, sm_degree)
+            nem_dir_path = None
+            if keep_tmp_files:
+                nem_dir_path = tmpdir+"/"+str(cpt)
+                write_nem_input_files(nem_dir_path, org_indexes, nem_input)
+            partitionning_results = run_partitioning(nem_input, beta * (len(nem_input[0])/edges_weight), free_dispersion, K = K, seed = seed, init = init, nem_dir_path = nem_dir_path)
+            if partitionning_results == [{},None,None]:
+                raise Exception("Statistical partitionning does not work on your data. This usually happens because you used very few (<15) genomes.")
+            cpt+=1
+            logging.getLogger().info(f"Partitionned {len(organisms)} genomes in {round(time.time() - start_partitionning,2)} seconds.")
+    finally:
+        pan.unlink()
+        pan = None
 
     # pangenome.savePartitionParameters(K, beta, free_dispersion, sm_degree, partitionning_results[1], chunk_size)
 
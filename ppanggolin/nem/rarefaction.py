@@ -14,36 +14,28 @@ import warnings
 
 #installed libraries
 from tqdm import tqdm
-import gmpy2
 import numpy
-from pandas import Series, read_csv
-import plotly.offline as out_plotly
-import plotly.graph_objs as go
-import scipy.optimize as optimization
 
 #local libraries
 from ppanggolin.pangenome import Pangenome
+from ppanggolin.sharedPangenome import SharedPangenome
 from ppanggolin.utils import mkOutdir
 from ppanggolin.formats import checkPangenomeInfo
+from ppanggolin.metrics import measured, popStages, mergeStages
 import ppanggolin.nem.partition as ppp#import this way to use the global variable pan defined in ppanggolin.nem.partition
 
-samples = []
-
-def raref_nem(index, tmpdir, beta, sm_degree, free_dispersion, chunk_size, K, krange, seed):
-    samp = samples[index]
-    currtmpdir = tmpdir+"/"+str(index)+"/"
+def raref_nem(index, samp, beta, sm_degree, free_dispersion, chunk_size, K, krange, seed):
     if K < 3:
-        K = ppp.evaluate_nb_partitions(samp, sm_degree, free_dispersion, chunk_size, krange, 0.05, False, 1, tmpdir + "/" + str(index) + "_eval", seed, None)
+        K = ppp.evaluate_nb_partitions(samp, sm_degree, free_dispersion, chunk_size, krange, 0.05, False, 1, seed, None)
 
-    if len(samp) <= chunk_size:#all good, just write stuff.
-        edges_weight, nb_fam = ppp.write_nem_input_files(tmpdir=currtmpdir,organisms= set(samp), sm_degree = sm_degree)
-        cpt_partition = ppp.run_partitioning( currtmpdir, len(samp), beta * (nb_fam/edges_weight), free_dispersion, K = K, seed = seed, init = "param_file")[0]
+    if len(samp) <= chunk_size:#all good, just partition.
+        nem_input, edges_weight = ppp.nem_inputs(samp, sm_degree)
+        cpt_partition = ppp.run_partitioning(nem_input, beta * (len(nem_input[0])/edges_weight), free_dispersion, K = K, seed = seed, init = "param_file")[0]
     else:#going to need multiple partitionnings for this sample...
 
         families = set()
         cpt_partition = {}
         validated = set()
-        cpt=0
 
         def validate_family(result):
             for node, nem_class in result[0].items():
@@ -55,10 +47,9 @@ def raref_nem(index, tmpdir, beta, sm_degree, free_dispersion, chunk_size, K, kr
                             cpt_partition[node]["U"] = len(samp)
                         validated.add(node)
 
-        for fam in ppp.pan.geneFamilies:
-            if not samp.isdisjoint(fam.organisms):#otherwise useless to keep track of
-                families.add(fam)
-                cpt_partition[fam.name] = {"P":0,"S":0,"C":0,"U":0}
+        for famName in ppp.pan.famNames[ppp.pan.getFamilyPresences(samp).any(axis = 1)].tolist():#the others are useless to keep track of
+            families.add(famName)
+            cpt_partition[famName] = {"P":0,"S":0,"C":0,"U":0}
 
         org_nb_sample = Counter()
         for org in samp:
@@ -78,9 +69,8 @@ def raref_nem(index, tmpdir, beta, sm_degree, free_dispersion, chunk_size, K, kr
                     shuffled_orgs = shuffled_orgs[chunk_size:]
             #making arguments for all samples:
             for samp in org_samples:
-                edges_weight, nb_fam = ppp.write_nem_input_files( currtmpdir+"/"+str(cpt)+"/", samp, sm_degree = sm_degree)
-                validate_family(ppp.run_partitioning( currtmpdir+"/"+str(cpt)+"/", len(samp), beta * (nb_fam/edges_weight), free_dispersion, K = K, seed = seed, init = "param_file"))
-                cpt+=1
+                nem_input, edges_weight = ppp.nem_inputs(samp, sm_degree)
+                validate_family(ppp.run_partitioning(nem_input, beta * (len(nem_input[0])/edges_weight), free_dispersion, K = K, seed = seed, init = "param_file"))
     if len(cpt_partition) == 0:
         counts = {"persistent":"NA","shell":"NA","cloud":"NA", "undefined":"NA", "K": K}
     else:
@@ -102,9 +92,14 @@ def raref_nem(index, tmpdir, beta, sm_degree, free_dispersion, chunk_size, K, kr
     return (counts, index)
 
 def launch_raref_nem(args):
-    return raref_nem(*args)
+    return raref_nem(*args), popStages()#the measures of the worker are sent back to the main process
 
 def drawCurve(output, maxSampling, data):
+    #imported on call to keep the command line fast to start
+    from pandas import Series, read_csv
+    import plotly.offline as out_plotly
+    import plotly.graph_objs as go
+    import scipy.optimize as optimization
     logging.getLogger().info("Drawing the rarefaction curve ...")
     rarefName = output + "/rarefaction.csv"
     raref = open(rarefName, "w")
@@ -249,16 +244,65 @@ def drawCurve(output, maxSampling, data):
     out_plotly.plot(fig, filename=output+"/rarefaction_curve.html", auto_open=False)
     params_file.close()
 
-def makeRarefactionCurve( pangenome, output, tmpdir, beta=2.5, depth = 30, minSampling =1, maxSampling = 100, sm_degree = 10, free_dispersion=False, chunk_size = 500, K=-1, cpu = 1, seed=42, kestimate = False, krange = [3,-1], soft_core = 0.95):
+def organismFamilyMatrix(pangenome, chunk_size = 4096):
+    """
+        Returns the presence of the gene families (columns, in the order of geneFamilies) in the organisms (rows, in the order of the organism index) as a sparse matrix.
+    """
+    from scipy.sparse import csr_matrix#imported on call to keep the command line fast to start
+    packed = pangenome.computeFamilyMatrix()
+    nbOrg = pangenome.number_of_organisms()
+    orgs = []
+    fams = []
+    for start in range(0, packed.shape[0], chunk_size):
+        chunkFams, chunkOrgs = numpy.nonzero(numpy.unpackbits(packed[start:start+chunk_size], axis = 1)[:, :nbOrg])
+        orgs.append(chunkOrgs)
+        fams.append(chunkFams + start)
+    orgs = numpy.concatenate(orgs) if len(orgs) > 0 else numpy.zeros(0, dtype = numpy.int64)
+    fams = numpy.concatenate(fams) if len(fams) > 0 else numpy.zeros(0, dtype = numpy.int64)
+    return csr_matrix((numpy.ones(len(orgs), dtype = numpy.int32), (orgs, fams)), shape = (nbOrg, packed.shape[0]))
+
+def coreCounts(pangenome, presences, samples, soft_core, batch_size = 100):
+    """
+        Returns the number of exact core, exact accessory, soft core and soft accessory gene families of each sample of organisms.
+        The number of organisms of each sample that each family is in is given by a sparse product of the samples with the presence matrix, a batch of samples at a time.
+    """
+    from scipy.sparse import csr_matrix
+    index = pangenome.getIndex()
+    counts = []
+    bar = tqdm(range(len(samples)), unit = "sample")
+    for start in range(0, len(samples), batch_size):
+        batch = samples[start:start+batch_size]
+        sizes = numpy.array([ len(samp) for samp in batch ])
+        rows = numpy.repeat(numpy.arange(len(batch)), sizes)
+        cols = [ index[org] for samp in batch for org in samp ]
+        sampleMatrix = csr_matrix((numpy.ones(len(cols), dtype = numpy.int32), (rows, cols)), shape = (len(batch), presences.shape[0]))
+        nbCommonOrgs = (sampleMatrix @ presences).tocsr()#the families that are not in a sample have no value in its row, they 'do not exist'.
+        nbCommonOrgs.eliminate_zeros()
+        rowOfValues = numpy.repeat(numpy.arange(len(batch)), numpy.diff(nbCommonOrgs.indptr))
+        nbFams = numpy.diff(nbCommonOrgs.indptr)
+        exactCore = numpy.bincount(rowOfValues, weights = nbCommonOrgs.data == sizes[rowOfValues], minlength = len(batch)).astype(int)
+        softCore = numpy.bincount(rowOfValues, weights = nbCommonOrgs.data >= sizes[rowOfValues] * soft_core, minlength = len(batch)).astype(int)
+        for i in range(len(batch)):
+            part = Counter()
+            part["soft_core"] = int(softCore[i])
+            part["exact_core"] = int(exactCore[i])
+            part["exact_accessory"] = int(nbFams[i] - exactCore[i])
+            part["soft_accessory"] = int(nbFams[i] - softCore[i])
+            part["nborgs"] = int(sizes[i])
+            counts.append(part)
+        bar.update(len(batch))
+    bar.close()
+    return counts
 
-    ppp.pan = pangenome#use the global from partition to store the pangenome, so that it is usable
+@measured()
+def makeRarefactionCurve( pangenome, output, tmpdir, beta=2.5, depth = 30, minSampling =1, maxSampling = 100, sm_degree = 10, free_dispersion=False, chunk_size = 500, K=-1, cpu = 1, seed=42, kestimate = False, krange = [3,-1], soft_core = 0.95):
 
     try:
-        krange[0] = ppp.pan.parameters["partition"]["K"] if krange[0]<0 else krange[0]
-        krange[1] = ppp.pan.parameters["partition"]["K"] if krange[1]<0 else krange[1]
+        krange[0] = pangenome.parameters["partition"]["K"] if krange[0]<0 else krange[0]
+        krange[1] = pangenome.parameters["partition"]["K"] if krange[1]<0 else krange[1]
     except KeyError:
         krange=[3,20]
-    checkPangenomeInfo(pangenome, needAnnotations=True, needFamilies=True, needGraph=True)
+    checkPangenomeInfo(pangenome, needFamilies=True, needGraph=True)
 
     tmpdirObj = tempfile.TemporaryDirectory(dir=tmpdir)
     tmpdir = tmpdirObj.name
@@ -268,73 +312,50 @@ def makeRarefactionCurve( pangenome, output, tmpdir, beta=2.5, depth = 30, minSa
     else:
         maxSampling = int(maxSampling)
 
-    if K < 3 and kestimate is False:#estimate K once and for all.
-        try:
-            K = ppp.pan.parameters["partition"]["K"]
-            logging.getLogger().info(f"Reuse the number of partitions {K}")
-        except KeyError:
-            logging.getLogger().info("Estimating the number of partitions...")
-            K = ppp.evaluate_nb_partitions(pangenome.organisms, sm_degree, free_dispersion, chunk_size, krange, 0.05, False, cpu, tmpdir, seed, None)
-            logging.getLogger().info(f"The number of partitions has been evaluated at {K}")
-
-    logging.getLogger().info("Extracting samples ...")
-    AllSamples = []
-    for i in range(minSampling,maxSampling):#each point
-        for _ in range(depth):#number of samples per points
-            AllSamples.append(set(random.sample(set(pangenome.organisms), i+1)))
-    logging.getLogger().info(f"Done sampling organisms in the pangenome, there are {len(AllSamples)} samples")
-    SampNbPerPart = []
-
-    logging.getLogger().info("Computing bitarrays for each family...")
-    index_org = pangenome.computeFamilyBitarrays()
-    logging.getLogger().info(f"Done computing bitarrays. Comparing them to get exact and soft core stats for {len(AllSamples)} samples...")
-
-    bar = tqdm( range(len(AllSamples) * len(pangenome.geneFamilies)), unit = "gene family")
-    for samp in AllSamples:
-        #make the sample's organism bitarray.
-        sampBitarray = gmpy2.xmpz(0)
-        for org in samp:
-            sampBitarray[index_org[org]] = 1
-
-        part = Counter()
-        part["soft_core"] = 0
-        part["exact_core"] = 0
-        part["exact_accessory"] = 0
-        part["soft_accessory"] = 0
-        for fam in pangenome.geneFamilies:
-            nbCommonOrg = gmpy2.popcount(fam.bitarray & sampBitarray)
-            part["nborgs"] = len(samp)
-            if nbCommonOrg != 0:#in that case the node 'does not exist'
-                if nbCommonOrg == len(samp):
-                    part["exact_core"] +=1
-                else:
-                    part["exact_accessory"] +=1
-
-                if float(nbCommonOrg) >= len(samp) * soft_core:
-                    part["soft_core"] +=1
-                else:
-                    part["soft_accessory"] +=1
-            bar.update()
-        SampNbPerPart.append(part)
-    bar.close()
-    #done with frequency of each family for each sample.
-
-    global samples
-    samples = AllSamples
-
-    args = []
-    for index, samp in enumerate(samples):
-        args.append((index, tmpdir, beta, sm_degree, free_dispersion, chunk_size, K, krange, seed))
-
-    with Pool(processes = cpu) as p:
-        #launch partitionnings
-        logging.getLogger().info("Partitionning all samples...")
-        bar = tqdm(range(len(args)), unit = "samples partitionned")
-        random.shuffle(args)#shuffling the processing so that the progress bar is closer to reality.
-        for result in p.imap_unordered(launch_raref_nem, args):
-            SampNbPerPart[result[1]] = {**result[0], **SampNbPerPart[result[1]]}
-            bar.update()
-    bar.close()
+    index = pangenome.getIndex()
+    ppp.pan = SharedPangenome.fromPangenome(pangenome)#the workers attach to the arrays of the pangenome instead of copying it.
+    try:
+        if K < 3 and kestimate is False:#estimate K once and for all.
+            try:
+                K = pangenome.parameters["partition"]["K"]
+                logging.getLogger().info(f"Reuse the number of partitions {K}")
+            except KeyError:
+                logging.getLogger().info("Estimating the number of partitions...")
+                K = ppp.evaluate_nb_partitions([ index[org] for org in pangenome.organisms ], sm_degree, free_dispersion, chunk_size, krange, 0.05, False, cpu, seed, None)
+                logging.getLogger().info(f"The number of partitions has been evaluated at {K}")
+
+        logging.getLogger().info("Extracting samples ...")
+        AllSamples = []
+        for i in range(minSampling,maxSampling):#each point
+            for _ in range(depth):#number of samples per points
+                AllSamples.append(set(random.sample(list(pangenome.organisms), i+1)))
+        logging.getLogger().info(f"Done sampling organisms in the pangenome, there are {len(AllSamples)} samples")
+
+        logging.getLogger().info("Computing the presence matrix of the families...")
+        presences = organismFamilyMatrix(pangenome)
+        logging.getLogger().info(f"Done computing the presence matrix. Comparing it to the samples to get exact and soft core stats for {len(AllSamples)} samples...")
+        SampNbPerPart = coreCounts(pangenome, presences, AllSamples, soft_core)
+        #done with frequency of each family for each sample.
+
+        args = []
+        for i, samp in enumerate(AllSamples):
+            args.append((i, [ index[org] for org in samp ], beta, sm_degree, free_dispersion, chunk_size, K, krange, seed))
+
+        with Pool(processes = cpu, initializer = ppp.attach_pangenome, initargs = (ppp.pan.descriptor,)) as p:
+            #launch partitionnings
+            logging.getLogger().info("Partitionning all samples...")
+            bar = tqdm(range(len(args)), unit = "samples partitionned")
+            random.shuffle(args)#shuffling the processing so that the progress bar is closer to reality.
+            for result, measures in p.imap_unordered(launch_raref_nem, args):
+                mergeStages(measures)
+                SampNbPerPart[result[1]] = {**result[0], **SampNbPerPart[result[1]]}
+                bar.update()
+            p.close()
+            p.join()#so that the workers exit on their own, and detach from the shared arrays.
+        bar.close()
+    finally:
+        ppp.pan.unlink()
+        ppp.pan = None
 
     logging.getLogger().info("Done partitionning everything")
     warnings.filterwarnings("ignore")
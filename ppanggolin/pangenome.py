@@ -4,7 +4,7 @@
 #default libraries
 from collections import defaultdict
 #installed libraries
-import gmpy2
+import numpy
 
 #local libraries
 from ppanggolin.genome import Organism, Gene
@@ -35,19 +35,58 @@ class Edge:
             raise Exception(f"You tried to create an edge between two genes that are not even in the same organism ! (genes are '{sourceGene.ID}' and '{targetGene.ID}')")
         self.organisms[org].append((sourceGene, targetGene))
 
+    def getOrgCounts(self):
+        """ returns the number of gene pairs linking the two families in each organism """
+        return { org : len(genePairs) for org, genePairs in self.organisms.items() }
+
+class FamilyEdge(Edge):
+    """
+        Edge between two gene families that is read without the genes it links, so it only knows how many gene pairs link the two families in each organism.
+    """
+    def __init__(self, sourceFam, targetFam):
+        self.source = sourceFam
+        self.target = targetFam
+        self.source._edges[self.target] = self
+        self.target._edges[self.source] = self
+        self._orgCounts = {}
+
+    def addOrganism(self, org, nbGenePairs):
+        self._orgCounts[org] = nbGenePairs
+
+    def getOrgCounts(self):
+        return self._orgCounts
+
+class GraphEdge(Edge):
+    """
+        Edge between two gene families that is made on demand from the arrays of a NeighborsGraph. It is not linked to the gene families.
+    """
+    def __init__(self, sourceFam, targetFam, organisms):
+        self.source = sourceFam
+        self.target = targetFam
+        self.organisms = organisms
+
 class GeneFamily:
     def __init__(self, ID, name):
         self.name = name
         self.ID = ID
+        self._lazyLoaders = {}#the lazy loaders of the pangenome of the family.
+        self._arrays = {}#the arrays computed by the pangenome of the family, which are forgotten when it changes.
         self._edges = {}
         self._genePerOrg = defaultdict(set)
         self.genes = set()
         self.removed = False#for the repeated family not added in the main graph
-        self.sequence = ""
+        self._sequence = None
         self.partition = ""
 
+    @property
+    def sequence(self):
+        if self._sequence is None:
+            for load in self._lazyLoaders.pop("sequence", []):
+                load()
+        return self._sequence if self._sequence is not None else ""
+
     def addSequence(self, seq):
-        self.sequence = seq
+        self._sequence = seq
 
     def addPartition(self, partition):
         self.partition = partition
@@ -68,13 +107,20 @@ class GeneFamily:
     def addGene(self, gene):
         if not isinstance(gene, Gene):
             raise TypeError(f"'Gene' type object was expected, but '{type(gene)}' type object was provided.")
+        self._arrays.clear()
         self.genes.add(gene)
         gene.family = self
         if hasattr(gene, "organism"):
             self._genePerOrg[gene.organism].add(gene)
 
+    def addOrganism(self, org):
+        """ adds an organism in which the family is present, for when the genes of the family are not loaded """
+        self._arrays.clear()
+        self._genePerOrg.setdefault(org, set())
+
     def mkBitarray(self, index):
         """ produces a bitarray representing the presence / absence of the family in the pangenome"""
+        import gmpy2#imported on call, as it is rarely needed
         self.bitarray = gmpy2.xmpz(0)
         for org in self.organisms:
             self.bitarray[index[org]] = 1
@@ -97,10 +143,14 @@ class GeneFamily:
 
     @property
     def neighbors(self):
+        for load in self._lazyLoaders.pop("edges", []):
+            load()
         return set(self._edges.keys())
 
     @property
     def edges(self):
+        for load in self._lazyLoaders.pop("edges", []):
+            load()
         return self._edges.values()
 
     @property
@@ -112,6 +162,95 @@ class GeneFamily:
                 self._genePerOrg[gene.organism].add(gene)
             return self._genePerOrg.keys()
 
+class NeighborsGraph:
+    """
+        The neighbors graph stored as arrays instead of Edge objects, which take several times more memory than the annotations.
+        The gene pairs are given by the indexes of their genes in 'genes', and are grouped by edge then by organism in the order in which they were given.
+        The edges are in the order in which they were first met, as with Pangenome.addEdge. Each edge goes from the family of the first gene of its first pair to the family of the second one.
+        It gives :
+        the families of each edge (edgeSource, edgeTarget, as indexes in 'families'),
+        the organisms of each edge as CSR arrays (edgeIndptr, organism indexes, number of gene pairs linked in the organism), the gene pairs of each of those being stored one after the other,
+        and the edges and the neighbors of each gene family as CSR arrays (famIndptr, edge indexes, neighbor family indexes), as in Pangenome.computeEdgeArrays.
+        Edge objects are made on demand when iterating over the graph.
+    """
+    def __init__(self, families, orgIndex, genes, sources, targets, famOfGene = None, orgOfGene = None):
+        self.families = list(families)
+        self.genes = genes
+        sources = numpy.asarray(sources, dtype = numpy.int64)
+        targets = numpy.asarray(targets, dtype = numpy.int64)
+        if famOfGene is None or orgOfGene is None:
+            famIndex = { fam : row for row, fam in enumerate(self.families) }
+            famOfGene = numpy.zeros(len(genes), dtype = numpy.int64)
+            orgOfGene = numpy.zeros(len(genes), dtype = numpy.int64)
+            for geneIndex in numpy.unique(numpy.concatenate((sources, targets))).tolist():#only the genes of the pairs are used
+                gene = genes[geneIndex]
+                if gene.family is None:
+                    raise Exception(f"You cannot create a graph without gene families. gene {gene.ID} did not have a gene family.")
+                famOfGene[geneIndex] = famIndex[gene.family]
+                orgOfGene[geneIndex] = orgIndex[gene.organism]
+        wrongPairs = numpy.flatnonzero(orgOfGene[sources] != orgOfGene[targets])
+        if len(wrongPairs) > 0:
+            raise Exception(f"You tried to create an edge between two genes that are not even in the same organism ! (genes are '{genes[sources[wrongPairs[0]]].ID}' and '{genes[targets[wrongPairs[0]]].ID}')")
+
+        #the edges, numbered in the order in which they are first met
+        sourceFams, targetFams = famOfGene[sources], famOfGene[targets]
+        keys = numpy.minimum(sourceFams, targetFams) * len(self.families) + numpy.maximum(sourceFams, targetFams)
+        _, firstPairs, edgeOfPair = numpy.unique(keys, return_index = True, return_inverse = True)
+        order = numpy.argsort(firstPairs)
+        rank = numpy.empty(len(order), dtype = numpy.int64)
+        rank[order] = numpy.arange(len(order))
+        edgeOfPair = rank[edgeOfPair.ravel()]
+        self.edgeSource = sourceFams[firstPairs[order]]
+        self.edgeTarget = targetFams[firstPairs[order]]
+
+        #the organisms of each edge, in the order in which they are first met, with their gene pairs in the given order
+        orgOfPair = orgOfGene[sources]
+        _, firstGroupPairs, groupOfPair = numpy.unique(edgeOfPair * max(len(orgIndex), 1) + orgOfPair, return_index = True, return_inverse = True)
+        pairOrder = numpy.lexsort((numpy.arange(len(sources)), firstGroupPairs[groupOfPair.ravel()], edgeOfPair))
+        self.pairSources = sources[pairOrder]
+        self.pairTargets = targets[pairOrder]
+        groupStarts = numpy.flatnonzero(numpy.diff(groupOfPair.ravel()[pairOrder], prepend = -1))
+        self.edgeOrgs = orgOfPair[pairOrder][groupStarts]
+        self.edgeCounts = numpy.diff(numpy.append(groupStarts, len(sources)))
+        self.edgeIndptr = numpy.zeros(len(self.edgeSource) + 1, dtype = numpy.int64)
+        numpy.cumsum(numpy.bincount(edgeOfPair[pairOrder][groupStarts], minlength = len(self.edgeSource)), out = self.edgeIndptr[1:])
+        self.pairIndptr = numpy.append(groupStarts, len(sources))
+
+        #the edges of each family, in the order of the edges. Loops are given once.
+        edges = numpy.arange(len(self.edgeSource))
+        notLoop = self.edgeSource != self.edgeTarget
+        fams = numpy.concatenate((self.edgeSource, self.edgeTarget[notLoop]))
+        neighbors = numpy.concatenate((self.edgeTarget, self.edgeSource[notLoop]))
+        famEdges = numpy.concatenate((edges, edges[notLoop]))
+        famOrder = numpy.lexsort((famEdges, fams))
+        self.famEdges = famEdges[famOrder]
+        self.famNeighbors = neighbors[famOrder]
+        self.famIndptr = numpy.zeros(len(self.families) + 1, dtype = numpy.int64)
+        numpy.cumsum(numpy.bincount(fams, minlength = len(self.families)), out = self.famIndptr[1:])
+
+    def __len__(self):
+        return len(self.edgeSource)
+
+    def __iter__(self):
+        for edge in range(len(self)):
+            yield self.getEdge(edge)
+
+    def getEdge(self, edge):
+        """
+            Returns the edge of the given index as a GraphEdge, with its gene pairs.
+        """
+        organisms = {}
+        for group in range(self.edgeIndptr[edge], self.edgeIndptr[edge+1]):
+            start, stop = self.pairIndptr[group], self.pairIndptr[group+1]
+            organisms[self.genes[self.pairSources[start]].organism] = [ (self.genes[source], self.genes[target]) for source, target in zip(self.pairSources[start:stop].tolist(), self.pairTargets[start:stop].tolist()) ]
+        return GraphEdge(self.families[self.edgeSource[edge]], self.families[self.edgeTarget[edge]], organisms)
+
+    def genePairs(self):
+        """
+            Returns the genes of the gene pairs, as indexes in 'genes', in the order of the edges and of their organisms.
+        """
+        return self.pairSources, self.pairTargets
+
 class Pangenome:
     def __init__(self):
         #basic parameters
@@ -129,12 +268,35 @@ class Pangenome:
                     'partitionned':  "No"
                 }
         self.parameters = {}
+        #functions loading the attributes of the genes and gene families that were not read with the others, indexed by the attribute's name.
+        #They are called on the first access to the attribute, and reached from the organisms and the gene families of the pangenome.
+        self._lazyLoaders = {}
+        #the arrays computed from the gene families and the edges, indexed by their name. They are forgotten whenever those change, from the pangenome or from its gene families.
+        self._arrays = {}
 
     def addFile(self, pangenomeFile):
         from ppanggolin.formats import getStatus#importing on call instead of importing on top to avoid cross-reference problems.
         getStatus(self, pangenomeFile)
         self.file = pangenomeFile
 
+    def _forgetComputed(self, *attrs):
+        """
+            Forgets the arrays computed from the gene families and the edges, and the given attributes computed from the organisms, as the pangenome changed. They will be computed again when needed.
+        """
+        self._arrays.clear()
+        for attr in attrs:
+            if hasattr(self, attr):
+                delattr(self, attr)
+
+    def loadLazyAttributes(self, *attrs):
+        """
+            Loads the given attributes of the genes and gene families now if their loading is pending, as their first access would, e.g. before forking processes that all use them.
+            Without any attribute, all of those whose loading is pending are loaded.
+        """
+        for attr in attrs or list(self._lazyLoaders):
+            for load in self._lazyLoaders.pop(attr, []):
+                load()
+
     @property
     def genes(self):
         try:
@@ -151,6 +313,8 @@ class Pangenome:
 
     @property
     def edges(self):
+        if hasattr(self, "_graph"):
+            return self._graph
         return self._edgeGetter.values()
 
     @property
@@ -231,13 +395,18 @@ class Pangenome:
         if isinstance(newOrg, Organism):
             oldLen = len(self._orgGetter)
             self._orgGetter[newOrg.name] = newOrg
+            newOrg._lazyLoaders = self._lazyLoaders
             if len(self._orgGetter) == oldLen:
                 raise KeyError(f"Redondant organism name was found ({newOrg.name}). All of your organisms must have unique names.")
+            #the gene getter and the organism index do not know the new organism, they will be made again when needed.
+            self._forgetComputed("_geneGetter", "_orgIndex")
         elif isinstance(newOrg, str):
             org = self._orgGetter.get(newOrg)
             if org is None:
                 org = Organism(newOrg)
+                org._lazyLoaders = self._lazyLoaders
                 self._orgGetter[org.name] = org
+                self._forgetComputed("_geneGetter", "_orgIndex")
             newOrg = org
         return newOrg
 
@@ -255,7 +424,46 @@ class Pangenome:
     def getGeneFamily(self, name):
         return self._famGetter[name]
 
+    def addGenesToFamilies(self, genes, families, geneIndexes, famIndexes, fragments = None):
+        """
+            Adds genes to gene families in one pass, as GeneFamily.addGene would do for each of them in order : genes[geneIndexes[i]] goes to families[famIndexes[i]].
+            families are GeneFamily objects or names. The families of the names are created if they do not exist, in the order in which they first appear in famIndexes.
+            If fragments is given, it tells whether each of the genes is a fragment. The genes are expected to all have an organism, or none of them.
+        """
+        self._forgetComputed()
+        geneIndexes = numpy.asarray(geneIndexes, dtype = numpy.int64)
+        #a list of genes is not made into a numpy array, as numpy would look for array attributes on each gene.
+        take = (lambda indexes : genes[indexes].tolist()) if isinstance(genes, numpy.ndarray) else (lambda indexes : [ genes[i] for i in indexes.tolist() ])
+        famIndexes = numpy.asarray(famIndexes, dtype = numpy.int64)
+        families = list(families)
+        _, firsts = numpy.unique(famIndexes, return_index = True)
+        for famIndex in famIndexes[numpy.sort(firsts)].tolist():
+            if not isinstance(families[famIndex], GeneFamily):
+                families[famIndex] = self.addGeneFamily(families[famIndex])
+        if fragments is not None:
+            for gene, is_frag in zip(take(geneIndexes), numpy.asarray(fragments, dtype = bool).tolist()):
+                gene.is_fragment = is_frag
+
+        #the genes grouped by family, in the given order within each family.
+        order = numpy.argsort(famIndexes, kind = "stable")
+        sortedFams = famIndexes[order]
+        sortedGenes = take(geneIndexes[order])
+        starts = numpy.flatnonzero(numpy.diff(sortedFams, prepend = -1))
+        withOrganisms = len(sortedGenes) > 0 and hasattr(sortedGenes[0], "organism")
+        for famIndex, start, stop in zip(sortedFams[starts].tolist(), starts.tolist(), numpy.append(starts[1:], len(sortedFams)).tolist()):
+            fam = families[famIndex]
+            famGenes = sortedGenes[start:stop]
+            fam.genes.update(famGenes)
+            genePerOrg = fam._genePerOrg
+            for gene in famGenes:
+                gene.family = fam
+                if withOrganisms:
+                    genePerOrg[gene.organism].add(gene)
+
     def addEdge(self, gene1, gene2):
+        if hasattr(self, "_graph"):
+            self._mkEdges()
+        self._forgetComputed()
         key = frozenset([gene1.family,gene2.family])
         edge = self._edgeGetter.get(key)
         if edge is None:
@@ -265,8 +473,26 @@ class Pangenome:
             edge.addGenes(gene1,gene2)
         return edge
 
+    def addFamilyEdge(self, fam1, fam2, org, nbGenePairs):
+        """
+            adds the number of gene pairs linking two gene families in an organism, for when the genes are not loaded.
+        """
+        if hasattr(self, "_graph"):
+            self._mkEdges()
+        self._forgetComputed()
+        key = frozenset([fam1, fam2])
+        edge = self._edgeGetter.get(key)
+        if edge is None:
+            edge = FamilyEdge(fam1, fam2)
+            self._edgeGetter[key] = edge
+        edge.addOrganism(org, nbGenePairs)
+        return edge
+
     def _createGeneFamily(self, name):
         newFam = GeneFamily(ID = self.max_fam_id, name = name)
+        newFam._lazyLoaders = self._lazyLoaders
+        newFam._arrays = self._arrays
+        self._forgetComputed()
         self.max_fam_id+=1
         self._famGetter[newFam.name] = newFam
         return newFam
@@ -285,3 +511,91 @@ class Pangenome:
                 fam.mkBitarray(self._orgIndex)
         #case where there is an index but the bitarrays have not been computed???
         return self._orgIndex
+
+    def computeFamilyMatrix(self):
+        """
+            Returns the presence/absence of the gene families (rows, in the order of geneFamilies) in the organisms (columns, in the order of the organism index) as a matrix of bits packed along the organisms.
+            It is computed once, and again if the pangenome changed since.
+        """
+        if "famMatrix" not in self._arrays:
+            index = self.getIndex()
+            rows = []
+            cols = []
+            for row, fam in enumerate(self.geneFamilies):
+                for org in fam.organisms:
+                    rows.append(row)
+                    cols.append(index[org])
+            cols = numpy.array(cols, dtype = numpy.int64)
+            famMatrix = numpy.zeros((self.number_of_geneFamilies(), (self.number_of_organisms() + 7) // 8), dtype = numpy.uint8)
+            numpy.bitwise_or.at(famMatrix, (numpy.array(rows, dtype = numpy.int64), cols >> 3), (0x80 >> (cols & 7)).astype(numpy.uint8))
+            self._arrays["famMatrix"] = famMatrix
+        return self._arrays["famMatrix"]
+
+    def getFamilyPresences(self, organisms):
+        """
+            Returns the presence (1) or absence (0) of the gene families (rows, in the order of geneFamilies) in the given organisms (columns, in the given order) as a matrix of uint8.
+        """
+        index = self.getIndex()
+        cols = numpy.array([ index[org] for org in organisms ], dtype = numpy.int64)
+        return (self.computeFamilyMatrix()[:, cols >> 3] >> (7 - (cols & 7)).astype(numpy.uint8)) & 1
+
+    def computeEdgeArrays(self):
+        """
+            Returns the graph as arrays, to compute things on subsets of organisms :
+            the edges and the neighbors of each gene family (in the order of geneFamilies, and of the family's edges) as CSR arrays (indptr, edge indexes, neighbor family indexes),
+            and the organisms of each edge (in the order of edges) as CSR arrays (indptr, organism indexes, number of gene pairs linked in the organism).
+            They are computed once, and again if the pangenome changed since.
+        """
+        if hasattr(self, "_graph"):
+            graph = self._graph
+            #the families that were added after the graph have no edges.
+            famIndptr = numpy.append(graph.famIndptr, numpy.full(self.number_of_geneFamilies() - len(graph.families), graph.famIndptr[-1], dtype = numpy.int64))
+            return famIndptr, graph.famEdges, graph.famNeighbors, graph.edgeIndptr, graph.edgeOrgs, graph.edgeCounts
+        if "edgeArrays" not in self._arrays:
+            index = self.getIndex()
+            famIndex = { fam : row for row, fam in enumerate(self.geneFamilies) }
+            edgeIndex = {}
+            edgeIndptr = [0]
+            edgeOrgs = []
+            edgeCounts = []
+            for edge in self.edges:
+                edgeIndex[edge] = len(edgeIndex)
+                for org, nbGenePairs in edge.getOrgCounts().items():
+                    edgeOrgs.append(index[org])
+                    edgeCounts.append(nbGenePairs)
+                edgeIndptr.append(len(edgeOrgs))
+            famIndptr = [0]
+            famEdges = []
+            famNeighbors = []
+            for fam in self.geneFamilies:
+                for edge in fam.edges:
+                    famEdges.append(edgeIndex[edge])
+                    famNeighbors.append(famIndex[edge.target if fam == edge.source else edge.source])
+                famIndptr.append(len(famEdges))
+            self._arrays["edgeArrays"] = tuple(numpy.array(array, dtype = numpy.int64) for array in (famIndptr, famEdges, famNeighbors, edgeIndptr, edgeOrgs, edgeCounts))
+        return self._arrays["edgeArrays"]
+
+    def addEdges(self, genes, sources, targets, famOfGene = None, orgOfGene = None):
+        """
+            Adds the edges linking the gene pairs given by the indexes of their genes in 'genes' (sources[i] with targets[i]), as addEdge would do for each pair in order.
+            If the graph is empty, it is stored as a NeighborsGraph and the Edge objects are only made when they are needed.
+            The index of the family (in geneFamilies) and of the organism (in getIndex) of each gene can be given if they are known already.
+        """
+        self._forgetComputed()
+        if len(self._edgeGetter) > 0 or hasattr(self, "_graph"):
+            for source, target in zip(sources, targets):
+                self.addEdge(genes[source], genes[target])
+        else:
+            self._graph = NeighborsGraph(self.geneFamilies, self.getIndex(), genes, sources, targets, famOfGene, orgOfGene)
+            self._lazyLoaders.setdefault("edges", []).append(self._mkEdges)
+
+    def _mkEdges(self):
+        """
+            Makes the Edge objects of a graph that is stored as a NeighborsGraph, linked to their gene families, for when they are needed.
+        """
+        if hasattr(self, "_graph"):
+            graph = self._graph
+            del self._graph
+            sources, targets = graph.genePairs()
+            for source, target in zip(sources.tolist(), targets.tolist()):
+                self.addEdge(graph.genes[source], graph.genes[target])
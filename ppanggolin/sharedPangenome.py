@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+#default libraries
+from multiprocessing import shared_memory
+
+#installed libraries
+import numpy
+
+class SharedPangenome:
+    """
+        A read-only copy of the arrays of a pangenome that are needed to partition it : the presence/absence of the gene families in the organisms,
+        the graph as CSR arrays, the names of the gene families and of the organisms, and the partitions of the gene families.
+        The arrays are stored in shared memory, so that the worker processes attach to them instead of getting their own copy of the pangenome.
+    """
+    arrayNames = ("famMatrix", "famIndptr", "famEdges", "famNeighbors", "edgeIndptr", "edgeOrgs", "edgeCounts", "famNames", "orgNames", "partitions")
+
+    def __init__(self, arrays, blocks):
+        self._blocks = blocks
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    @classmethod
+    def fromPangenome(cls, pangenome):
+        """
+            Copies the arrays of the pangenome in new shared memory blocks. They must be freed with unlink() once the workers are done.
+        """
+        arrays = [pangenome.computeFamilyMatrix()]
+        arrays.extend(pangenome.computeEdgeArrays())
+        arrays.append(numpy.array([ fam.name for fam in pangenome.geneFamilies ], dtype = str))
+        arrays.append(numpy.array([ org.name for org in pangenome.organisms ], dtype = str))
+        arrays.append(numpy.array([ fam.partition for fam in pangenome.geneFamilies ], dtype = str))
+        shared = {}
+        blocks = {}
+        try:
+            for name, array in zip(cls.arrayNames, arrays):
+                blocks[name] = shared_memory.SharedMemory(create = True, size = max(array.nbytes, 1))#a block can not be empty
+                shared[name] = numpy.ndarray(array.shape, dtype = array.dtype, buffer = blocks[name].buf)
+                shared[name][...] = array
+                shared[name].flags.writeable = False
+        except BaseException:#the blocks created so far would outlive the process otherwise, e.g. when the shared memory is full.
+            shared.clear()#the blocks can not be closed while arrays use them.
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+            raise
+        return cls(shared, blocks)
+
+    @classmethod
+    def attach(cls, descriptor):
+        """
+            Attaches to the shared memory blocks described by the descriptor of a SharedPangenome, in a worker process.
+        """
+        arrays = {}
+        blocks = {}
+        for name, (blockName, shape, dtype) in descriptor.items():
+            blocks[name] = shared_memory.SharedMemory(name = blockName)
+            arrays[name] = numpy.ndarray(shape, dtype = dtype, buffer = blocks[name].buf)
+            arrays[name].flags.writeable = False
+        return cls(arrays, blocks)
+
+    @property
+    def descriptor(self):
+        """
+            Returns what the worker processes need to attach to the shared memory blocks : the name of the block, the shape and the type of each array.
+        """
+        return { name : (self._blocks[name].name, getattr(self, name).shape, getattr(self, name).dtype.str) for name in self.arrayNames }
+
+    def number_of_organisms(self):
+        return len(self.orgNames)
+
+    def number_of_geneFamilies(self):
+        return len(self.famNames)
+
+    def getFamilyIndex(self):
+        """
+            Returns the index of each gene family in the arrays, by name.
+        """
+        if not hasattr(self, "_famIndex"):
+            self._famIndex = { name : row for row, name in enumerate(self.famNames.tolist()) }
+        return self._famIndex
+
+    def getFamilyPresences(self, organisms):
+        """
+            Returns the presence (1) or absence (0) of the gene families (rows) in the organisms of the given indexes (columns, in the given order) as a matrix of uint8.
+        """
+        cols = numpy.array(organisms, dtype = numpy.int64)
+        return (self.famMatrix[:, cols >> 3] >> (7 - (cols & 7)).astype(numpy.uint8)) & 1
+
+    def computeEdgeArrays(self):
+        """
+            Returns the graph as the CSR arrays given by Pangenome.computeEdgeArrays.
+        """
+        return self.famIndptr, self.famEdges, self.famNeighbors, self.edgeIndptr, self.edgeOrgs, self.edgeCounts
+
+    def close(self):
+        """
+            Detaches from the shared memory blocks. The arrays can not be used afterwards.
+        """
+        for name in self.arrayNames:
+            delattr(self, name)#the blocks can not be closed while arrays use them.
+        for block in self._blocks.values():
+            block.close()
+
+    def unlink(self):
+        """
+            Detaches from the shared memory blocks and frees them, in the process that created them.
+        """
+        blocks = list(self._blocks.values())
+        self.close()
+        for block in blocks:
+            block.unlink()
@@ -0,0 +1 @@
+from .update import *
\ No newline at end of file
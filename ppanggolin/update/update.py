@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+#coding:utf-8
+
+#default libraries
+import logging
+import tempfile
+import subprocess
+import argparse
+
+#installed libraries
+import numpy
+
+#local libraries
+from ppanggolin.pangenome import Pangenome
+from ppanggolin.annotate import readAnnotations, annotatePangenome, getGeneSequencesFromFastas
+from ppanggolin.cluster import firstClustering, alignRep, refineClustering, read_faa, read_tsv_arrays, read_fam2seq, getGeneSequenceBlocksFromAnnotations
+from ppanggolin.align import familiesDatabase, readAlignments
+from ppanggolin.graph import addOrganismEdges, remove_high_copy_number
+from ppanggolin.nem.partition import partition
+from ppanggolin.formats import checkPangenomeInfo, writePangenome
+from ppanggolin.mmseqsCache import sequencesDatabase
+
+def checkPangenomeForUpdate(pangenome):
+    """
+        Checks that the pangenome has been fully computed, with gene families representatives to align the new genes to, and loads it.
+    """
+    for status in "genomesAnnotated", "genesClustered", "neighborsGraph", "partitionned":
+        if pangenome.status[status] not in ["inFile","Loaded","Computed"]:
+            raise Exception("Only a partitionned pangenome can be updated with new genomes. Run the whole analysis first (or use the workflow command).")
+    if pangenome.status["geneFamilySequences"] not in ["inFile","Loaded","Computed"]:
+        raise Exception("Cannot update this pangenome as it does not have gene families representatives to align the new genes to. For now this works only if the clustering is realised by PPanGGOLiN.")
+    checkPangenomeInfo(pangenome, needAnnotations=True, needFamilies=True, needGraph=True)
+
+def readNewOrganisms(pangenome, anno, fasta, tmpdir, cpu, pseudo = False):
+    """
+        Reads or annotates the new genomes in a pangenome of their own. They are annotated with the parameters that were used for the pangenome.
+    """
+    newPangenome = Pangenome()
+    if anno is not None:
+        readAnnotations(newPangenome, anno, pseudo = pseudo, cpu = cpu)
+        if newPangenome.status["geneSequences"] == "No":
+            if fasta is None:
+                raise Exception("You provided gff files without sequences, and you did not provide fasta sequences. The genes of the new genomes cannot be assigned to gene families without their sequences.")
+            getGeneSequencesFromFastas(newPangenome, fasta)
+    else:
+        parameters = pangenome.parameters.get("annotation", {})
+        annotatePangenome(newPangenome, fasta, tmpdir, cpu, parameters.get("translation_table", "11"), parameters.get("kingdom", "bacteria"),
+                          not parameters.get("annotate_RNA", True), parameters.get("remove_Overlapping_CDS", True))
+    return newPangenome
+
+def addNewOrganisms(pangenome, newPangenome):
+    """
+        Adds the organisms of newPangenome to the pangenome, after checking that neither their names nor their gene IDs are already used.
+        Returns the new organisms.
+    """
+    organisms = list(newPangenome.organisms)
+    if len(organisms) == 0:
+        raise Exception("There are no genomes in the provided file")
+    orgNames = { org.name for org in pangenome.organisms }
+    for org in organisms:
+        if org.name in orgNames:
+            raise KeyError(f"Redondant organism name was found ({org.name}). The organism is already in the pangenome.")
+    for gene in newPangenome.genes:
+        if pangenome.getGene(gene.ID) is not None:
+            raise Exception(f"The gene '{gene.ID}' of the new genomes has the same ID as a gene of the pangenome. All of your genes must have unique IDs.")
+    for org in organisms:
+        pangenome.addOrganism(org)
+    return organisms
+
+def alignGenesToFamilies(pangenome, genes, tmpdir, cpu, code, identity, coverage, defrag, cacheDir = None):
+    """
+        Aligns the translated sequences of the genes to the gene families representatives.
+        Returns the gene family of the best hit of each gene that has one.
+    """
+    newtmpdir = tempfile.TemporaryDirectory(dir = tmpdir.name)
+    famdb = familiesDatabase(pangenome, newtmpdir, cacheDir, cpu)
+    seqdb = sequencesDatabase(lambda : getGeneSequenceBlocksFromAnnotations(pangenome, genes), newtmpdir.name, None, cpu, translation_table = code)
+    covmode = "0"
+    if defrag:
+        covmode = "1"
+    alndb = tempfile.NamedTemporaryFile(mode="w", dir = newtmpdir.name)
+    cmd = ["mmseqs","search",seqdb , famdb, alndb.name, newtmpdir.name, "-a","--min-seq-id", str(identity), "-c", str(coverage), "--cov-mode", covmode, "--threads", str(cpu)]
+    logging.getLogger().debug(" ".join(cmd))
+    logging.getLogger().info("Aligning the new genes to the gene families representatives...")
+    subprocess.run(cmd, stdout=subprocess.DEVNULL)
+    outfile = tempfile.NamedTemporaryFile(mode="w", dir = newtmpdir.name)
+    cmd = ["mmseqs","convertalis", seqdb, famdb, alndb.name, outfile.name,"--format-mode","2"]
+    logging.getLogger().debug(" ".join(cmd))
+    logging.getLogger().info("Extracting alignments...")
+    subprocess.run(cmd, stdout=subprocess.DEVNULL)
+    gene2fam = { pangenome.getGene(geneID) : fam for geneID, fam in readAlignments(outfile.name, pangenome).items() }
+    for fileObj in alndb, outfile:
+        fileObj.close()
+    newtmpdir.cleanup()
+    return gene2fam
+
+def clusterGenes(pangenome, genes, tmpdir, cpu, code, identity, coverage, defrag):
+    """
+        Clusters the genes into new gene families, as the clustering of the pangenome did.
+    """
+    rep, tsv = firstClustering(lambda : getGeneSequenceBlocksFromAnnotations(pangenome, genes), tmpdir, cpu, code, coverage, identity)
+    fam2seq = read_faa(rep)
+    if not defrag:
+        with open(tsv.name, "r") as tsvfile:
+            genes2fam = read_tsv_arrays(tsvfile)
+    else:
+        logging.getLogger().info("Associating fragments to their original gene family...")
+        aln = alignRep(rep, tmpdir, cpu, coverage, identity)
+        genes2fam, fam2seq = refineClustering(tsv, aln, fam2seq)
+        aln.close()
+    tsv.close()
+    rep.close()
+    famNames = { fam.name for fam in pangenome.geneFamilies }
+    for family in fam2seq:
+        if family in famNames:
+            raise Exception(f"A new gene family has the same name as a gene family of the pangenome ({family}).")
+    read_fam2seq(pangenome, fam2seq)
+    families, geneIDs, geneFam, fragments = genes2fam
+    pangenome.addGenesToFamilies([ pangenome.getGene(ID) for ID in geneIDs ], families, numpy.arange(len(geneIDs)), geneFam, fragments)
+
+def getNbPartitions(pangenome):
+    """ returns the number of partitions that were used to partition the pangenome """
+    if "K" in pangenome.parameters.get("partition", {}):
+        return pangenome.parameters["partition"]["K"]
+    return len({ fam.partition for fam in pangenome.geneFamilies if fam.partition in ["P","C"] or (fam.partition.startswith("S") and fam.partition != "S_") })
+
+def update(pangenome, anno, fasta, tmpdir, cpu = 1, pseudo = False, seed = 42, cacheDir = None):
+    """
+        Adds new genomes to a partitionned pangenome.
+        Their genes are assigned to the existing gene families when they align to their representative, and the others are clustered into new gene families.
+        The edges of the new genomes are added to the graph, and the pangenome is partitionned again starting from the former partitions.
+        Returns the new organisms.
+    """
+    checkPangenomeForUpdate(pangenome)
+    organisms = addNewOrganisms(pangenome, readNewOrganisms(pangenome, anno, fasta, tmpdir, cpu, pseudo))
+    genes = [ gene for org in organisms for contig in org.contigs for gene in contig.genes ]
+    logging.getLogger().info(f"Adding {len(organisms)} genomes with {len(genes)} genes to the pangenome")
+
+    parameters = pangenome.parameters.get("cluster", {})
+    code = parameters.get("translation_table", "11")
+    identity = parameters.get("identity", 0.8)
+    coverage = parameters.get("coverage", 0.8)
+    defrag = parameters.get("defragmentation", False)
+    newtmpdir = tempfile.TemporaryDirectory(dir = tmpdir)
+    for gene, fam in alignGenesToFamilies(pangenome, genes, newtmpdir, cpu, code, identity, coverage, defrag, cacheDir).items():
+        fam.addGene(gene)
+    leftovers = [ gene for gene in genes if gene.family is None ]
+    logging.getLogger().info(f"{len(genes) - len(leftovers)} genes were assigned to existing gene families")
+    if len(leftovers) > 0:
+        logging.getLogger().info(f"Clustering the {len(leftovers)} other genes into new gene families...")
+        clusterGenes(pangenome, leftovers, newtmpdir, cpu, code, identity, coverage, defrag)
+    newtmpdir.cleanup()
+
+    logging.getLogger().info("Adding the new genomes to the neighbors graph...")
+    parameters = pangenome.parameters.get("graph", {})
+    if parameters.get("removed_high_copy_number_families", False):
+        remove_high_copy_number(pangenome, parameters["removed_high_copy_number_of_families_above"])
+    for org in organisms:
+        addOrganismEdges(pangenome, org)
+
+    parameters = pangenome.parameters.get("partition", {})
+    partition(pangenome, tmpdir, beta = parameters.get("beta", 2.5), sm_degree = parameters.get("max_node_degree_for_smoothing", 10), free_dispersion = parameters.get("free_dispersion", False),
+              chunk_size = parameters.get("chunk_size", 500), K = getNbPartitions(pangenome), cpu = cpu, seed = seed, init = "init_from_old")
+    pangenome.parameters["partition"]["computed_K"] = parameters.get("computed_K", False)#K is the one that was computed for the pangenome, if it was.
+    return organisms
+
+def launch(args):
+    if args.fasta is None and args.anno is None:
+        raise Exception( "You must provide at least a file with the --fasta option to annotate the new genomes from sequences, or a file with the --anno option to load their annotations from.")
+    pangenome = Pangenome()
+    pangenome.addFile(args.pangenome)
+    organisms = update(pangenome, args.anno, args.fasta, args.tmpdir, args.cpu, args.use_pseudo, args.seed, args.mmseqs_cache)
+    pangenome.status["genesClustered"] = "Computed"
+    pangenome.status["neighborsGraph"] = "Computed"
+    pangenome.status["partitionned"] = "Loaded"#the partitions are written with the gene families.
+    #the new genomes are appended to the file only once the whole update has succeeded, in the same step as the rest of it.
+    writePangenome(pangenome, pangenome.file, force = True, newOrganisms = organisms)
+
+def updateSubparser(subparser):
+    parser = subparser.add_parser("update", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    required = parser.add_argument_group(title = "Required arguments", description = "The pangenome and one of --fasta or --anno are required :")
+    required.add_argument('-p','--pangenome',  required=True, type=str, help="The pangenome .h5 file to add the new genomes to")
+    required.add_argument('--fasta',  required=False, type=str, help="A tab-separated file listing the names of the new organisms, and the fasta filepath of their genomic sequence(s) (the fastas can be compressed with gzip). One line per organism.")
+    required.add_argument('--anno', required=False, type=str, help="A tab-separated file listing the names of the new organisms, and the gff/gbff filepath of their annotations (the files can be compressed with gzip). One line per organism. If this is provided, those annotations will be used.")
+
+    optional = parser.add_argument_group(title = "Optional arguments")
+    optional.add_argument("--use_pseudo",required=False, action="store_true",help = "In the context of provided annotation, use this option to use pseudogenes. (Default behavior is to ignore them)")
+    optional.add_argument("-se", "--seed", type = int, default = 42, help="seed used to generate random numbers")
+    optional.add_argument("--mmseqs_cache", required=False, type=str, default=None, help = "Directory where the mmseqs database of the gene families representatives is kept, so that the updates of the same pangenome do not make it again")
+    return parser
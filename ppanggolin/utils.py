@@ -7,9 +7,7 @@ from io import TextIOWrapper
 import mmap
 from pathlib import Path
 import os
-
-#installed libraries
-import psutil
+import pickle
 
 def read_compressed_or_not(file_or_file_path):
     """
@@ -67,8 +65,11 @@ def get_num_lines(file):
     return lines
 
 def getCurrentRAM():
+    """ Returns the RSS of this process and of its children, in a readable unit. """
+    import psutil#imported on call to keep the command line fast to start
     units = ["o","Ko","Mo","Go","To"]
-    mem = float(psutil.virtual_memory()._asdict()["used"])
+    process = psutil.Process()
+    mem = float(process.memory_info().rss + sum(child.memory_info().rss for child in process.children(recursive = True)))
     unit = 0
     while mem >= 1024:
         mem = mem / 1024
@@ -93,4 +94,37 @@ def mkFilename(basename, output, force):
 
     if filename.exists() and not force:
         raise FileExistsError(f"{filename.name} already exists. Use -f if you want to overwrite the file")
-    return filename
\ No newline at end of file
+    return filename
+
+def readCheckpoint(checkpointDir, name, key):
+    """
+        Returns what writeCheckpoint saved under the given name in the checkpoint directory, or None.
+        What was saved with another key (the arguments of the computation) is not used.
+    """
+    if checkpointDir is None or not os.path.exists(f"{checkpointDir}/{name}.pkl"):
+        return None
+    with open(f"{checkpointDir}/{name}.pkl","rb") as f:
+        savedKey, data = pickle.load(f)
+    if savedKey != key:
+        return None
+    return data
+
+def writeCheckpoint(checkpointDir, name, key, data):
+    """
+        Saves the result of a part of a computation in the checkpoint directory, so that a killed job does not need to compute it again.
+    """
+    if checkpointDir is None:
+        return
+    os.makedirs(checkpointDir, exist_ok = True)
+    with open(f"{checkpointDir}/{name}.pkl.tmp","wb") as f:
+        pickle.dump((key, data), f)
+    os.replace(f"{checkpointDir}/{name}.pkl.tmp", f"{checkpointDir}/{name}.pkl")#so that a killed job never leaves an incomplete checkpoint
+
+def getVersion():
+    """ Returns the version of the installed ppanggolin, without the cost of importing pkg_resources when possible. """
+    try:
+        from importlib.metadata import version
+    except ImportError:#python < 3.8
+        from pkg_resources import get_distribution
+        return get_distribution("ppanggolin").version
+    return version("ppanggolin")
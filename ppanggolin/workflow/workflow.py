@@ -6,6 +6,7 @@ import logging
 import os
 import time
 import argparse
+from shutil import rmtree
 
 #local libraries
 from ppanggolin.pangenome import Pangenome
@@ -15,50 +16,103 @@ from ppanggolin.cluster import clustering, readClustering
 from ppanggolin.graph import computeNeighborsGraph
 from ppanggolin.nem.rarefaction import makeRarefactionCurve
 from ppanggolin.nem.partition import partition
-from ppanggolin.formats import writePangenome, writeFlatFiles
+from ppanggolin.formats import writePangenome, writeFlatFiles, checkPangenomeInfo
 from ppanggolin.figures import drawTilePlot, drawUCurve
 from ppanggolin.info import printInfo
 ### a global workflow that does everything in one go.
 
+def readDoneStages(checkpointDir):
+    """
+        Returns the stages of the workflow that are not saved in the pangenome file and were done by a former run.
+    """
+    if not os.path.exists(checkpointDir + "/stages"):
+        return set()
+    with open(checkpointDir + "/stages","r") as f:
+        return set(line.strip() for line in f)
+
+def setStageDone(checkpointDir, stage):
+    """
+        Records that a stage of the workflow that is not saved in the pangenome file is done.
+    """
+    os.makedirs(checkpointDir, exist_ok = True)
+    with open(checkpointDir + "/stages","a") as f:
+        f.write(stage + "\n")
+
+def resumeFormerRun(pangenome, filename, checkpointDir, resume):
+    """
+        If the run is resumed, uses the pangenome file of the former run if it was written, and its checkpoints, which are all there is when it was killed during the annotation.
+        Otherwise, removes the checkpoints of a former run, as a new run can not use them.
+    """
+    if resume:
+        if filename.exists():
+            pangenome.addFile(filename)
+    elif os.path.exists(checkpointDir):
+        rmtree(checkpointDir)
+
 def launch(args):
     pangenome = Pangenome()
-    filename = mkFilename(args.basename, args.output, args.force)
-    if args.anno:#if the annotations are provided, we read from it
+    filename = mkFilename(args.basename, args.output, args.force or args.resume)
+    checkpointDir = args.output + "/checkpoints"
+    resumeFormerRun(pangenome, filename, checkpointDir, args.resume)
+    doneStages = readDoneStages(checkpointDir)
+
+    if pangenome.status["genomesAnnotated"] == "inFile":
+        logging.getLogger().info("The genomes were annotated by a former run")
+    elif args.anno:#if the annotations are provided, we read from it
         getSeq = True
         if args.clusters is not None:
             getSeq = False
-        readAnnotations(pangenome, args.anno, getSeq)
-        writePangenome(pangenome, filename, args.force)
-        if args.clusters is None and pangenome.status["geneSequences"] == "No" and args.fasta is None:
-            raise Exception("The gff/gbff provided did not have any sequence informations, you did not provide clusters and you did not provide fasta file. Thus, we do not have the information we need to continue the analysis.")
-
-        elif args.clusters is None and pangenome.status["geneSequences"] == "No" and args.fasta is not None:
+        readAnnotations(pangenome, args.anno, getSeq, cpu = args.cpu, checkpointDir = checkpointDir + "/annotations")
+        if args.clusters is None and pangenome.status["geneSequences"] == "No" and args.fasta is not None:
             getGeneSequencesFromFastas(pangenome, args.fasta)
+        writePangenome(pangenome, filename, args.force)
+        rmtree(checkpointDir + "/annotations", ignore_errors = True)#they are in the pangenome file now
+    elif args.fasta is not None:
+        annotatePangenome(pangenome, args.fasta, args.tmpdir, args.cpu, checkpointDir = checkpointDir + "/annotations")
+        writePangenome(pangenome, filename, args.force)
+        rmtree(checkpointDir + "/annotations", ignore_errors = True)
 
+    if pangenome.status["genesClustered"] == "inFile":
+        logging.getLogger().info("The genes were clustered by a former run")
+    else:
+        if args.clusters is None and pangenome.status["geneSequences"] == "No":
+            raise Exception("The gff/gbff provided did not have any sequence informations, you did not provide clusters and you did not provide fasta file. Thus, we do not have the information we need to continue the analysis.")
+        checkPangenomeInfo(pangenome, needAnnotations = True)#the genes are read from the file if the genomes were annotated by a former run
         if args.clusters is not None:
             readClustering(pangenome, args.clusters)
-
-        elif args.clusters is None:#we should have the sequences here.
-            clustering(pangenome, args.tmpdir, args.cpu)
-    elif args.fasta is not None:
-            pangenome = Pangenome()
-            annotatePangenome(pangenome, args.fasta, args.tmpdir, args.cpu)
-            writePangenome(pangenome, filename, args.force)
+        else:#we should have the sequences here.
             clustering(pangenome, args.tmpdir, args.cpu)
+        writePangenome(pangenome, filename, args.force)
 
-    computeNeighborsGraph(pangenome)
+    if pangenome.status["neighborsGraph"] == "inFile":
+        logging.getLogger().info("The neighbors graph was computed by a former run")
+    else:
+        computeNeighborsGraph(pangenome, cpu = args.cpu)
+        writePangenome(pangenome, filename, args.force)
 
-    partition(pangenome, tmpdir = args.tmpdir, cpu = args.cpu, K=args.nb_of_partitions)
-    writePangenome(pangenome, filename, args.force)
+    if pangenome.status["partitionned"] == "inFile":
+        logging.getLogger().info("The pangenome was partitionned by a former run")
+    else:
+        partition(pangenome, tmpdir = args.tmpdir, cpu = args.cpu, K=args.nb_of_partitions, checkpointDir = checkpointDir + "/NEM")
+        writePangenome(pangenome, filename, args.force)
+        rmtree(checkpointDir + "/NEM", ignore_errors = True)
 
-    if args.rarefaction:
+    if args.rarefaction and "rarefaction" not in doneStages:
         makeRarefactionCurve(pangenome,args.output, args.tmpdir, cpu=args.cpu)
-    if len(pangenome.organisms) < 5000:
+        setStageDone(checkpointDir, "rarefaction")
+    if len(pangenome.organisms) < 5000 and "tile_plot" not in doneStages:
         drawTilePlot(pangenome, args.output, nocloud = False if len(pangenome.organisms) < 500 else True)
-    drawUCurve(pangenome, args.output)
+        setStageDone(checkpointDir, "tile_plot")
+    if "Ushaped_plot" not in doneStages:
+        drawUCurve(pangenome, args.output)
+        setStageDone(checkpointDir, "Ushaped_plot")
 
-    writeFlatFiles(pangenome, args.output, args.cpu, csv = True, genePA=True, gexf=True, light_gexf = True, projection=True, json = True, stats = True, partitions = True)
+    if "flat" not in doneStages:
+        writeFlatFiles(pangenome, args.output, args.cpu, csv = True, genePA=True, gexf=True, light_gexf = True, projection=True, json = True, stats = True, partitions = True)
+        setStageDone(checkpointDir, "flat")
 
+    if os.path.exists(checkpointDir):
+        rmtree(checkpointDir)#the workflow is done.
     printInfo(filename, content = True)
 
 
@@ -74,5 +128,6 @@ def workflowSubparser(subparser):
     optional.add_argument('-o','--output', required=False, type=str, default="ppanggolin_output"+time.strftime("_DATE%Y-%m-%d_HOUR%H.%M.%S", time.localtime())+"_PID"+str(os.getpid()), help="Output directory")
     optional.add_argument("--basename",required = False, default = "pangenome", help = "basename for the output file")
     optional.add_argument("--rarefaction", required=False, action = "store_true", help = "Use to compute the rarefaction curves (WARNING: can be time consumming)")
+    optional.add_argument("--resume", required=False, action = "store_true", help = "Resume a workflow that was stopped, in the same output directory, from the stages and the partial results that it saved")
     optional.add_argument("-K","--nb_of_partitions",required=False, default=-1, type=int, help = "Number of partitions to use. Must be at least 3. If under 3, it will be detected automatically.")
     return parser
\ No newline at end of file
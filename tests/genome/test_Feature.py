@@ -3,6 +3,7 @@
 import pytest
 
 from ppanggolin.genome import Feature
+from ppanggolin.pangenome import Pangenome
 
 """
 """
@@ -65,3 +66,18 @@ def test_add_dna(o_feature):
     dna = 123
     with pytest.raises(TypeError):
         o_feature.add_dna(dna)
+
+def test_lazy_attribute(o_feature):
+    pan = Pangenome()
+    o_feature.fill_parents(pan.addOrganism("org"), None)
+    with pytest.raises(AttributeError):
+        o_feature.product
+    def load():
+        o_feature.product = "va savoir"
+    pan._lazyLoaders["product"] = [load]
+    other = Feature(5)
+    other.fill_parents(Pangenome().addOrganism("org"), None)
+    with pytest.raises(AttributeError):#the loaders of a pangenome are not used by the features of another.
+        other.product
+    assert o_feature.product == "va savoir"
+    assert "product" not in pan._lazyLoaders
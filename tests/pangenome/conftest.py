@@ -0,0 +1,70 @@
+#! /usr/bin/env python3
+
+import pytest
+
+from ppanggolin.genome import Gene, RNA
+from ppanggolin.pangenome import Pangenome
+from ppanggolin.formats import readPangenome
+
+@pytest.fixture
+def fill_organism():
+	def fill(o_pang, orgName, l_famNames, prefix = None):
+		"""adds an organism with one contig, a tRNA, and genes in the given families in that order, with the edges between neighboring genes."""
+		o_org = o_pang.addOrganism(orgName)
+		o_ctg = o_org.getOrAddContig(orgName + "_contig", is_circular = True)
+		o_rna = RNA(orgName + "_tRNA")
+		o_rna.fill_annotations(start = 1, stop = 75, strand = "+", geneType = "tRNA", product = "tRNA-Ala")
+		o_rna.fill_parents(o_org, o_ctg)
+		o_ctg.addRNA(o_rna)
+		o_prev = None
+		for i, famName in enumerate(l_famNames):
+			o_gene = Gene(f"{prefix or orgName}_gene{i}")
+			o_gene.fill_annotations(start = 100 * (i + 1), stop = 100 * (i + 1) + 89, strand = "+-"[i % 2], geneType = "CDS", position = i, name = famName.upper(), product = "product of " + famName)
+			o_gene.fill_parents(o_org, o_ctg)
+			o_gene.add_dna("ATG" + "ACGT"[i % 4] * 84 + "TAA")
+			o_ctg.addGene(o_gene)
+			o_fam = o_pang.addGeneFamily(famName)
+			if o_fam.sequence == "":
+				o_fam.addSequence("M" + "ACDEFGHIKL"[len(o_pang.geneFamilies) % 10] * 29)
+			o_fam.addGene(o_gene)
+			if o_prev is not None:
+				o_pang.addEdge(o_prev, o_gene)
+			o_prev = o_gene
+		return o_org
+	return fill
+
+@pytest.fixture
+def synthetic_pangenome(fill_organism):
+	"""a small pangenome as if it had just been annotated, clustered, and partitionned, with the edges of its graph."""
+	o_pang = Pangenome()
+	fill_organism(o_pang, "org1", ["fam1", "fam2", "fam3", "fam4", "fam2"])
+	fill_organism(o_pang, "org2", ["fam1", "fam3", "fam2", "fam5"])
+	fill_organism(o_pang, "org3", ["fam1", "fam2", "fam3", "fam6"])
+	for o_fam in o_pang.geneFamilies:
+		o_fam.addPartition("P" if len(o_fam.organisms) == 3 else "C")
+	for status in "genomesAnnotated", "geneSequences", "genesClustered", "geneFamilySequences", "neighborsGraph", "partitionned":
+		o_pang.status[status] = "Computed"
+	o_pang.parameters["partition"] = {"K" : 3}
+	return o_pang
+
+@pytest.fixture
+def read_pangenome():
+	def read(filename):
+		"""reads everything of a pangenome file in a new pangenome."""
+		o_pang = Pangenome()
+		o_pang.addFile(filename)
+		readPangenome(o_pang, annotation = True, geneFamilies = True, graph = True)
+		return o_pang
+	return read
+
+@pytest.fixture
+def get_content():
+	def content(o_pang):
+		"""the family and the annotations of each gene, the sequence and the partition of each family, and the gene pairs of each edge in each organism."""
+		d_genes = { o_gene.ID : (o_gene.family.name, o_gene.organism.name, o_gene.contig.name, o_gene.start, o_gene.stop, o_gene.strand, o_gene.position, o_gene.name, o_gene.product)
+					for o_gene in o_pang.genes }
+		d_fams = { o_fam.name : (o_fam.sequence, o_fam.partition) for o_fam in o_pang.geneFamilies }
+		d_edges = { frozenset([o_edge.source.name, o_edge.target.name]) : { o_org.name : sorted(tuple(sorted([o_gene1.ID, o_gene2.ID])) for o_gene1, o_gene2 in l_pairs) for o_org, l_pairs in o_edge.getOrgDict().items() }
+					for o_edge in o_pang.edges }
+		return d_genes, d_fams, d_edges
+	return content
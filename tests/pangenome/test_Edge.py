@@ -116,6 +116,11 @@ def test_getOrgDict(o_edge, filled_edge):
     assert filled_edge.getOrgDict() == filled_edge.organisms
 
 
+def test_getOrgCounts(o_edge, filled_edge):
+    assert o_edge.getOrgCounts() == {"org":1}
+    assert filled_edge.getOrgCounts() == {"org1":2, "org2":2}
+
+
 def test_genePairs(make_gene_pair):
     # cannot use filled_edge because i need access to pairs.
     p1 = make_gene_pair("org1", "s1", "t1")
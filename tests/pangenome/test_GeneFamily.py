@@ -5,7 +5,7 @@ from random import randint, sample
 
 from collections import defaultdict
 
-from ppanggolin.pangenome import Edge, GeneFamily
+from ppanggolin.pangenome import Edge, GeneFamily, Pangenome
 from ppanggolin.genome import Gene
 
 
@@ -38,6 +38,24 @@ def test_addSequence(o_family):
     o_family.addSequence(seq)
     assert o_family.sequence == seq
 
+def test_lazy_sequence():
+    pan = Pangenome()
+    o_family = pan.addGeneFamily("trente-trois")
+    seq = "un de troa"
+    def load():
+        o_family.addSequence(seq)
+    pan._lazyLoaders["sequence"] = [load]
+    assert Pangenome().addGeneFamily("trente-trois").sequence == ""#the loaders of a pangenome are not used by the families of another.
+    assert o_family.sequence == seq
+    assert "sequence" not in pan._lazyLoaders
+
+
+def test_addOrganism(o_family):
+    o_family.addOrganism("org")
+    o_family.addOrganism("org")
+    assert set(o_family.organisms) == {"org"}
+    assert o_family.genes == set()
+
 
 def test_addPartition(o_family):
     partition = "un de troa"
@@ -4,7 +4,8 @@ import pytest
 from random import choices, randint, sample
 
 from ppanggolin.genome import Gene, Organism
-from ppanggolin.pangenome import Edge, GeneFamily, Pangenome
+from ppanggolin.pangenome import Edge, FamilyEdge, GeneFamily, Pangenome
+from ppanggolin.sharedPangenome import SharedPangenome
 
 """
 """
@@ -36,6 +37,16 @@ def o_pang():
 def test_addFile(o_pang):
 	assert False # need to generate a valid file several time
 
+def test_loadLazyAttributes(o_pang):
+	l_loaded = []
+	o_pang._lazyLoaders["product"] = [lambda : l_loaded.append("product")]
+	o_pang._lazyLoaders["sequence"] = [lambda : l_loaded.append("sequence")]
+	o_pang.loadLazyAttributes("product", "name")
+	assert l_loaded == ["product"]
+	assert list(o_pang._lazyLoaders) == ["sequence"]
+	o_pang.loadLazyAttributes("product")
+	assert l_loaded == ["product"]
+
 
 @pytest.fixture
 def l_orgs():
@@ -213,6 +224,18 @@ def test_genes_organism_debug(o_pang, make_org_with_genes):
 	assert l_observed == l_expected
 
 
+def test_genes_organism_added_later(o_pang, make_org_with_genes):
+	"""Genes of an organism added after the genes were listed are found too."""
+	o_org1, l_genes1 = make_org_with_genes("org1")
+	o_pang.addOrganism(o_org1)
+	assert o_pang.getGene(l_genes1[0].ID) == l_genes1[0]
+
+	o_org2, l_genes2 = make_org_with_genes("org2")
+	o_pang.addOrganism(o_org2)
+	assert o_pang.getGene(l_genes2[0].ID) == l_genes2[0]
+	assert len(o_pang.genes) == len(l_genes1) + len(l_genes2)
+
+
 def test_genes_genefamilies(o_pang, fill_fam_with_genes):
 	"""Genes are added in pangenome through their family."""
 	# geneFamily with genes.
@@ -223,6 +246,32 @@ def test_genes_genefamilies(o_pang, fill_fam_with_genes):
 	assert l_observed == l_expected
 
 
+def test_addGenesToFamilies(o_pang, make_org_with_genes):
+	"""Adding the genes in bulk gives the same families as adding them one by one."""
+	o_org, l_genes = make_org_with_genes("org1")
+	for o_gene in l_genes:
+		o_gene.fill_parents(o_org, None)
+	o_pang.addGeneFamily("fam_existing")
+	l_names = ["fam_{}".format(i) for i in range(5)] + ["fam_existing"]
+	l_fams = [randint(0, len(l_names) - 1) for _ in l_genes]
+	l_frags = [randint(0, 1) == 1 for _ in l_genes]
+
+	o_expected = Pangenome()
+	o_expected.addGeneFamily("fam_existing")
+	for o_gene, i_fam in zip(l_genes, l_fams):
+		o_expected.addGeneFamily(l_names[i_fam]).addGene(o_gene)
+
+	o_pang.addGenesToFamilies(l_genes, l_names, range(len(l_genes)), l_fams, l_frags)
+	assert [o_fam.name for o_fam in o_pang.geneFamilies] == [o_fam.name for o_fam in o_expected.geneFamilies]
+	for o_gene, i_fam, is_frag in zip(l_genes, l_fams, l_frags):
+		assert o_gene.family == o_pang.getGeneFamily(l_names[i_fam])
+		assert o_gene.is_fragment == is_frag
+	for o_fam in o_pang.geneFamilies:
+		o_exp = o_expected.getGeneFamily(o_fam.name)
+		assert o_fam.genes == o_exp.genes
+		assert o_fam.getGenesPerOrg(o_org) == o_exp.getGenesPerOrg(o_org)
+
+
 def test_edges_empty(o_pang):
 	assert list(o_pang.edges) == []
 
@@ -291,6 +340,21 @@ def test_edges_several(o_pang, make_gene_pair):
 	assert len(o_pang.edges) == 3
 
 
+def test_addFamilyEdge(o_pang):
+	o_fam1 = o_pang.addGeneFamily("fam1")
+	o_fam2 = o_pang.addGeneFamily("fam2")
+
+	o_edge1 = o_pang.addFamilyEdge(o_fam1, o_fam2, "org1", 2)
+	assert isinstance(o_edge1, FamilyEdge)
+
+	# the edge is the same whatever the direction.
+	o_edge2 = o_pang.addFamilyEdge(o_fam2, o_fam1, "org2", 1)
+	assert o_edge2 == o_edge1
+	assert len(o_pang.edges) == 1
+	assert o_edge1.getOrgCounts() == {"org1":2, "org2":1}
+	assert o_fam1.neighbors == {o_fam2}
+
+
 def test_getIndex(o_pang, l_orgs):
 	for o_org in l_orgs:
 		o_pang.addOrganism(o_org)
@@ -325,6 +389,163 @@ def test_computeFamilyBitarrays(o_pang, l_orgs):
 		assert hasattr(o_fam,'bitarray')
 
 
+def test_getFamilyPresences(o_pang, l_orgs):
+	"""the presence matrix has a row per family and a column per given organism."""
+	for o_org in l_orgs:
+		o_pang.addOrganism(o_org)
+	o_fam1 = o_pang.addGeneFamily("fam1")
+	o_fam2 = o_pang.addGeneFamily("fam2")
+	s_orgs1 = set(sample(l_orgs, 3))
+	for o_org in s_orgs1:
+		o_fam1.addOrganism(o_org)
+	o_fam2.addOrganism(l_orgs[0])
+
+	assert o_pang.computeFamilyMatrix().shape == (2, (len(l_orgs) + 7) // 8)
+	presences = o_pang.getFamilyPresences(l_orgs)
+	assert presences.shape == (2, len(l_orgs))
+	assert presences[0].tolist() == [ int(o_org in s_orgs1) for o_org in l_orgs ]
+	assert presences[1].tolist() == [1] + [0] * (len(l_orgs) - 1)
+	# columns follow the given organisms
+	assert o_pang.getFamilyPresences(l_orgs[::-1])[1].tolist() == [0] * (len(l_orgs) - 1) + [1]
+
+
+def test_computeEdgeArrays(o_pang):
+	o_orgs = [ o_pang.addOrganism(name) for name in ("org1", "org2") ]
+	o_fam1 = o_pang.addGeneFamily("fam1")
+	o_fam2 = o_pang.addGeneFamily("fam2")
+	o_fam3 = o_pang.addGeneFamily("fam3")
+	o_pang.addFamilyEdge(o_fam1, o_fam2, o_orgs[0], 2)
+	o_pang.addFamilyEdge(o_fam1, o_fam2, o_orgs[1], 1)
+	o_pang.addFamilyEdge(o_fam2, o_fam3, o_orgs[1], 3)
+
+	fam_indptr, fam_edges, fam_neighbors, edge_indptr, edge_orgs, edge_counts = o_pang.computeEdgeArrays()
+	assert fam_indptr.tolist() == [0, 1, 3, 4]
+	assert fam_edges.tolist() == [0, 0, 1, 1]
+	assert fam_neighbors.tolist() == [1, 0, 2, 1]
+	assert edge_indptr.tolist() == [0, 2, 3]
+	idx = o_pang.getIndex()
+	assert edge_orgs.tolist() == [idx[o_orgs[0]], idx[o_orgs[1]], idx[o_orgs[1]]]
+	assert edge_counts.tolist() == [2, 1, 3]
+
+
+def test_arrays_after_changes(o_pang):
+	"""the arrays computed before the pangenome changed are computed again."""
+	o_org1 = o_pang.addOrganism("org1")
+	o_fam1 = o_pang.addGeneFamily("fam1")
+	o_fam1.addOrganism(o_org1)
+	assert o_pang.computeFamilyMatrix().shape == (1, 1)
+	assert o_pang.computeEdgeArrays()[0].tolist() == [0, 0]
+
+	o_org2 = o_pang.addOrganism("org2")
+	o_fam2 = o_pang.addGeneFamily("fam2")
+	o_fam2.addOrganism(o_org2)
+	assert o_pang.getFamilyPresences([o_org1, o_org2]).tolist() == [[1, 0], [0, 1]]
+	o_pang.addFamilyEdge(o_fam1, o_fam2, o_org2, 1)
+	assert o_pang.computeEdgeArrays()[0].tolist() == [0, 1, 2]
+
+	o_ctg = o_org1.getOrAddContig("k_1")
+	o_gene = Gene("gene1")
+	o_gene.fill_parents(o_org1, o_ctg)
+	o_fam2.addGene(o_gene)
+	assert o_pang.getFamilyPresences([o_org1, o_org2]).tolist() == [[1, 0], [1, 1]]
+	o_fam3 = o_pang.addGeneFamily("fam3")
+	o_pang.addGenesToFamilies([Gene("gene2")], [o_fam3], [0], [0])
+	assert o_pang.computeFamilyMatrix().shape == (3, 1)
+	assert o_pang.computeEdgeArrays()[0].tolist() == [0, 1, 2, 2]
+
+
+def test_addEdges():
+	"""the edges stored as arrays are the ones addEdge makes."""
+	def make_pang():
+		o_pang = Pangenome()
+		o_org = o_pang.addOrganism("org1")
+		o_ctg = o_org.getOrAddContig("k_1")
+		l_fams = [ o_pang.addGeneFamily("fam" + str(i)) for i in range(3) ]
+		l_genes = []
+		for i in range(10):
+			o_gene = Gene("gene" + str(i))
+			o_gene.fill_annotations(start = i, stop = i, strand = "+", position = i)
+			o_gene.fill_parents(o_org, o_ctg)
+			o_ctg.addGene(o_gene)
+			l_fams[i % 3 if i != 9 else 0].addGene(o_gene)
+			l_genes.append(o_gene)
+		return o_pang, l_genes
+
+	def get_edges(o_pang):
+		return [ (o_edge.source.name, o_edge.target.name, { o.name : [ (g1.ID, g2.ID) for g1, g2 in l_pairs ] for o, l_pairs in o_edge.getOrgDict().items() }) for o_edge in o_pang.edges ]
+
+	l_sources = [1, 2, 3, 4, 5, 6, 7, 8, 9, 0]
+	l_targets = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
+	o_expected, l_genes = make_pang()
+	for i, j in zip(l_sources, l_targets):
+		o_expected.addEdge(l_genes[i], l_genes[j])
+
+	o_pang, l_genes = make_pang()
+	o_pang.addEdges(l_genes, l_sources, l_targets)
+	assert hasattr(o_pang, "_graph")
+	assert len(o_pang.edges) == len(o_expected.edges)
+	assert get_edges(o_pang) == get_edges(o_expected)
+	for a_observed, a_expected in zip(o_pang.computeEdgeArrays(), o_expected.computeEdgeArrays()):
+		assert a_observed.tolist() == a_expected.tolist()
+
+	# the Edge objects are made when the families need them, only for their own pangenome
+	o_other, l_genes = make_pang()
+	o_other.addEdges(l_genes, l_sources, l_targets)
+	assert { o_fam.name for o_fam in o_pang.getGeneFamily("fam0").neighbors } == {"fam0", "fam1", "fam2"}
+	assert not hasattr(o_pang, "_graph")
+	assert hasattr(o_other, "_graph")
+	assert get_edges(o_pang) == get_edges(o_expected)
+
+
+def test_SharedPangenome(o_pang):
+	o_orgs = [ o_pang.addOrganism(name) for name in ("org1", "org2") ]
+	o_fam1 = o_pang.addGeneFamily("fam1")
+	o_fam2 = o_pang.addGeneFamily("fam2")
+	o_fam1.addOrganism(o_orgs[1])
+	o_fam2.addOrganism(o_orgs[0])
+	o_fam2.partition = "P"
+	o_pang.addFamilyEdge(o_fam1, o_fam2, o_orgs[1], 2)
+
+	o_shared = SharedPangenome.fromPangenome(o_pang)
+	try:
+		# what a worker sees once attached
+		o_attached = SharedPangenome.attach(o_shared.descriptor)
+		assert o_attached.number_of_organisms() == 2
+		assert o_attached.famNames.tolist() == ["fam1", "fam2"]
+		assert o_attached.partitions.tolist() == ["", "P"]
+		assert o_attached.getFamilyIndex()["fam2"] == 1
+		idx = o_pang.getIndex()
+		cols = [ idx[o_org] for o_org in o_orgs ]
+		assert o_attached.getFamilyPresences(cols).tolist() == o_pang.getFamilyPresences(o_orgs).tolist()
+		for a_shared, a_pang in zip(o_attached.computeEdgeArrays(), o_pang.computeEdgeArrays()):
+			assert a_shared.tolist() == a_pang.tolist()
+		o_attached.close()
+	finally:
+		o_shared.unlink()
+
+
+def test_SharedPangenome_failure(o_pang, monkeypatch):
+	"""the blocks that were created before a failure are freed."""
+	import ppanggolin.sharedPangenome
+	o_pang.addGeneFamily("fam1").addOrganism(o_pang.addOrganism("org1"))
+	SharedMemory = ppanggolin.sharedPangenome.shared_memory.SharedMemory
+	l_names = []
+	def create(*args, **kwargs):
+		if len(l_names) == 3:
+			raise OSError(28, "No space left on device")
+		o_block = SharedMemory(*args, **kwargs)
+		l_names.append(o_block.name)
+		return o_block
+	monkeypatch.setattr(ppanggolin.sharedPangenome.shared_memory, "SharedMemory", create)
+	with pytest.raises(OSError):
+		SharedPangenome.fromPangenome(o_pang)
+	monkeypatch.undo()
+	assert len(l_names) == 3
+	for name in l_names:
+		with pytest.raises(FileNotFoundError):
+			SharedMemory(name = name)
+
+
 def test_getGene_empty(o_pang):
 	o_gene = o_pang.getGene(33)
 	assert o_gene is None
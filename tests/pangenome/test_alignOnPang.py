@@ -0,0 +1,43 @@
+#! /usr/bin/env python3
+
+import pytest
+import tempfile
+import importlib
+
+from ppanggolin.formats import writePangenome, getFamilySequencesDigest
+from ppanggolin.mmseqsCache import fastaBlocks, blocksDigest
+from ppanggolin.align import familiesDatabase
+
+mmseqsCache = importlib.import_module("ppanggolin.mmseqsCache")
+
+"""
+"""
+@pytest.fixture
+def fake_mmseqs(monkeypatch):
+	"""makes the databases without mmseqs, and counts them."""
+	l_made = []
+	def makeStreamedDatabase(sequences, dbPath, *args, **kwargs):
+		with open(dbPath, "wb") as db:
+			for block in sequences():
+				db.write(block)
+		l_made.append(dbPath)
+	monkeypatch.setattr(mmseqsCache, "mmseqsVersion", lambda : "test")
+	monkeypatch.setattr(mmseqsCache, "makeStreamedDatabase", makeStreamedDatabase)
+	return l_made
+
+def test_familiesDatabase_cached(tmp_path, synthetic_pangenome, read_pangenome, fake_mmseqs):
+	"""on a cache hit, the representatives are not read from the pangenome file."""
+	filename = str(tmp_path / "pangenome.h5")
+	writePangenome(synthetic_pangenome, filename, force = True)
+	cacheDir = str(tmp_path / "cache")
+	o_pang = read_pangenome(filename)
+	assert getFamilySequencesDigest(o_pang) == blocksDigest(fastaBlocks( (o_fam.name, o_fam.sequence) for o_fam in synthetic_pangenome.geneFamilies ))
+
+	tmpdir = tempfile.TemporaryDirectory(dir = str(tmp_path))
+	dbPath = familiesDatabase(o_pang, tmpdir, cacheDir)
+	assert len(fake_mmseqs) == 1
+	o_pang = read_pangenome(filename)
+	assert familiesDatabase(o_pang, tmpdir, cacheDir) == dbPath
+	assert len(fake_mmseqs) == 1
+	assert "sequence" in o_pang._lazyLoaders
+	tmpdir.cleanup()
@@ -0,0 +1,69 @@
+#! /usr/bin/env python3
+
+import pytest
+
+from ppanggolin.cluster import refineClustering, read_aln_arrays
+
+"""
+"""
+#the families, with the length of their representative and their number of genes.
+d_fams = {"A" : (300, 3), "B" : (200, 2), "C" : (300, 3), "D" : (100, 1), "E" : (150, 1), "F" : (120, 5), "G" : (100, 1), "H" : (100, 1)}
+
+#the alignments between the representatives, as mmseqs gives them : query, target, qlen, tlen, bits.
+l_alignments = [("A", "A", 1000),#self hits, which are ignored
+				("E", "E", 500),
+				("B", "C", 50),#B ties between A and C, the first alignment wins.
+				("B", "A", 50),
+				("B", "B", 800),
+				("D", "B", 30),#D goes to B, which goes to C.
+				("D", "E", 20),
+				("F", "A", 90),#A is longer than F but has fewer genes.
+				("G", "A", 40),#the best score wins.
+				("G", "C", 60),
+				("H", "A", 0),#a null score does not count.
+				("A", "C", 70)]#A and C have the same length.
+
+@pytest.fixture
+def clustering_files(tmp_path):
+	with open(tmp_path / "families.tsv", "w") as tsv:
+		for famName, (_, nb_genes) in d_fams.items():
+			tsv.write(f"{famName}\t{famName}\n")
+			for i in range(1, nb_genes):
+				tsv.write(f"{famName}\t{famName.lower()}{i}\n")
+	with open(tmp_path / "alignments.tsv", "w") as aln:
+		for query, target, bits in l_alignments:
+			aln.write(f"{query}\t{target}\t{d_fams[query][0]}\t{d_fams[target][0]}\t{bits}\n")
+	return tmp_path / "families.tsv", tmp_path / "alignments.tsv"
+
+def test_read_aln_arrays(clustering_files):
+	_, alnPath = clustering_files
+	with open(alnPath) as aln:
+		a_query, a_target, a_qlen, a_tlen, a_bits = read_aln_arrays(aln, { famName : i for i, famName in enumerate(d_fams) })
+	assert len(a_query) == len(l_alignments) - 3
+	assert (a_query != a_target).all()
+	assert a_bits.tolist() == [ bits for query, target, bits in l_alignments if query != target ]
+
+def test_refineClustering(clustering_files):
+	tsvPath, alnPath = clustering_files
+	d_fam2seq = { famName : "M" * length for famName, (length, _) in d_fams.items() }
+	with open(tsvPath) as tsv, open(alnPath) as aln:
+		(l_families, l_genes, a_geneFam, a_fragments), d_newFam2seq = refineClustering(tsv, aln, d_fam2seq)
+	d_gene2fam = { gene : l_families[fam] for gene, fam in zip(l_genes, a_geneFam.tolist()) }
+	d_fragments = dict(zip(l_genes, a_fragments.tolist()))
+
+	assert len(l_genes) == sum(nb_genes for _, nb_genes in d_fams.values())
+	assert set(d_newFam2seq) == {"A", "C", "E", "F", "H"}
+	assert all(d_newFam2seq[famName] == d_fam2seq[famName] for famName in d_newFam2seq)
+	assert { gene : famName for gene, famName in d_gene2fam.items() if famName != gene[0].upper() } == {"B" : "C", "b1" : "C", "D" : "C", "G" : "C"}
+	assert { gene for gene, fragment in d_fragments.items() if fragment } == {"B", "b1", "D", "G"}
+
+def test_refineClustering_no_alignment(tmp_path, clustering_files):
+	tsvPath, _ = clustering_files
+	alnPath = tmp_path / "empty.tsv"
+	alnPath.write_text("")
+	d_fam2seq = { famName : "M" * length for famName, (length, _) in d_fams.items() }
+	with open(tsvPath) as tsv, open(alnPath) as aln:
+		(l_families, l_genes, a_geneFam, a_fragments), d_newFam2seq = refineClustering(tsv, aln, d_fam2seq)
+	assert d_newFam2seq == d_fam2seq
+	assert [ l_families[fam] for fam in a_geneFam.tolist() ] == [ gene[0].upper() for gene in l_genes ]
+	assert not a_fragments.any()
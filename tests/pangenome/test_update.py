@@ -0,0 +1,78 @@
+#! /usr/bin/env python3
+
+import pytest
+import tables
+
+from ppanggolin.pangenome import Pangenome
+from ppanggolin.formats import writePangenome
+from ppanggolin.graph import addOrganismEdges
+from ppanggolin.update import addNewOrganisms, getNbPartitions
+
+"""
+"""
+def test_getNbPartitions(synthetic_pangenome):
+	assert getNbPartitions(synthetic_pangenome) == 3
+	del synthetic_pangenome.parameters["partition"]
+	assert getNbPartitions(synthetic_pangenome) == 2
+	for o_fam, partition in zip(synthetic_pangenome.geneFamilies, ["P", "S1", "S2", "S_", "C", "U"]):
+		o_fam.addPartition(partition)
+	assert getNbPartitions(synthetic_pangenome) == 4
+
+def test_addNewOrganisms(synthetic_pangenome, fill_organism):
+	o_new = Pangenome()
+	o_org = fill_organism(o_new, "org4", ["fam1", "fam7"])
+	assert addNewOrganisms(synthetic_pangenome, o_new) == [o_org]
+	assert synthetic_pangenome.number_of_organisms() == 4
+	assert synthetic_pangenome.getGene("org4_gene1").organism == o_org
+
+def test_addNewOrganisms_empty(synthetic_pangenome):
+	with pytest.raises(Exception):
+		addNewOrganisms(synthetic_pangenome, Pangenome())
+
+def test_addNewOrganisms_same_name(synthetic_pangenome, fill_organism):
+	o_new = Pangenome()
+	fill_organism(o_new, "org1", ["fam1"], prefix = "new")
+	with pytest.raises(KeyError):
+		addNewOrganisms(synthetic_pangenome, o_new)
+	assert synthetic_pangenome.number_of_organisms() == 3
+
+def test_addNewOrganisms_same_gene(synthetic_pangenome, fill_organism):
+	o_new = Pangenome()
+	fill_organism(o_new, "org4", ["fam1"], prefix = "org1")
+	with pytest.raises(Exception):
+		addNewOrganisms(synthetic_pangenome, o_new)
+	assert synthetic_pangenome.number_of_organisms() == 3
+
+def test_update_file(tmp_path, synthetic_pangenome, fill_organism, read_pangenome, get_content):
+	"""the new genomes are appended to the file, with longer names than the ones that were written, and everything reads back."""
+	filename = str(tmp_path / "pangenome.h5")
+	writePangenome(synthetic_pangenome, filename, force = True)
+	o_pang = read_pangenome(filename)
+
+	o_new = Pangenome()
+	fill_organism(o_new, "a_much_longer_organism_name", ["fam1", "fam2", "a_new_family", "fam3"])
+	l_orgs = addNewOrganisms(o_pang, o_new)
+	for o_org in l_orgs:
+		for o_gene in o_org.genes:
+			o_fam = o_pang.addGeneFamily(o_gene.family.name)
+			if o_fam.sequence == "":
+				o_fam.addSequence(o_gene.family.sequence)
+				o_fam.addPartition("C")
+			o_fam.addGene(o_gene)
+		addOrganismEdges(o_pang, o_org)
+	o_pang.status["genesClustered"] = "Computed"
+	o_pang.status["neighborsGraph"] = "Computed"
+	o_pang.status["partitionned"] = "Loaded"
+	writePangenome(o_pang, filename, force = True, newOrganisms = l_orgs)
+
+	d_genes, d_fams, d_edges = get_content(read_pangenome(filename))
+	assert (d_genes, d_fams, d_edges) == get_content(o_pang)
+	assert len(d_genes) == 17
+	assert d_genes["a_much_longer_organism_name_gene2"][0] == "a_new_family"
+	assert d_edges[frozenset(["fam2", "a_new_family"])] == {"a_much_longer_organism_name" : [("a_much_longer_organism_name_gene1", "a_much_longer_organism_name_gene2")]}
+
+	h5f = tables.open_file(filename, "r")
+	assert [ ID.decode() for ID in h5f.root.annotations.genes.read(field = "gene/ID") ][-4:] == [ f"a_much_longer_organism_name_gene{i}" for i in range(4) ]
+	assert h5f.root.annotations.RNA.read(field = "gene/ID")[-1].decode() == "a_much_longer_organism_name_tRNA"
+	assert [ ID.decode() for ID in h5f.root.geneSequences.read(field = "gene") ][-4:] == [ f"a_much_longer_organism_name_gene{i}" for i in range(4) ]
+	h5f.close()
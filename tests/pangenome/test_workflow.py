@@ -0,0 +1,43 @@
+#! /usr/bin/env python3
+
+import pytest
+import os
+import importlib
+
+from ppanggolin.pangenome import Pangenome
+from ppanggolin.workflow.workflow import resumeFormerRun
+
+annotate = importlib.import_module("ppanggolin.annotate.annotate")
+
+"""
+"""
+l_names = ["GCF_000026905.1_ASM2690v1_genomic.gbff", "GCF_000092665.1_ASM9266v1_genomic.gbff"]
+
+@pytest.fixture
+def organisms_file(tmp_path):
+	dataset = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "testingDataset", "GBFF")
+	o_path = tmp_path / "organisms.gbff.list"
+	o_path.write_text("".join(f"{name}\t{dataset}/{name}.gz\n" for name in l_names))
+	return str(o_path)
+
+def test_resume_annotations(tmp_path, monkeypatch, organisms_file):
+	"""a run killed during the annotation, before the pangenome file was written, is resumed from the checkpoints of the organisms."""
+	checkpointDir = str(tmp_path / "checkpoints")
+	o_former = Pangenome()
+	annotate.readAnnotations(o_former, organisms_file, checkpointDir = checkpointDir + "/annotations")
+
+	o_pang = Pangenome()
+	resumeFormerRun(o_pang, tmp_path / "pangenome.h5", checkpointDir, resume = True)
+	assert not hasattr(o_pang, "file")
+	def read_anno_file(*args):
+		raise AssertionError("an organism of the checkpoints was read again")
+	monkeypatch.setattr(annotate, "read_anno_file", read_anno_file)
+	annotate.readAnnotations(o_pang, organisms_file, checkpointDir = checkpointDir + "/annotations")
+	assert [ o_org.name for o_org in o_pang.organisms ] == l_names
+	assert sorted(o_gene.ID for o_gene in o_pang.genes) == sorted(o_gene.ID for o_gene in o_former.genes)
+
+def test_new_run_removes_checkpoints(tmp_path):
+	checkpointDir = tmp_path / "checkpoints"
+	os.makedirs(checkpointDir / "annotations")
+	resumeFormerRun(Pangenome(), tmp_path / "pangenome.h5", str(checkpointDir), resume = False)
+	assert not checkpointDir.exists()
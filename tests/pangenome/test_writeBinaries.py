@@ -0,0 +1,133 @@
+#! /usr/bin/env python3
+
+import pytest
+import tables
+
+from ppanggolin.pangenome import Pangenome
+from ppanggolin.formats import writePangenome, readPangenome, getSchemaVersion
+from ppanggolin.formats.writeBinaries import appendColumns, appendAnnotations, geneSequenceDesc, resizeTable, schemaVersion
+
+"""
+"""
+def get_field(a_rows, l_names):
+	for name in l_names:
+		a_rows = a_rows[name]
+	return a_rows
+
+def test_resizeTable(tmp_path):
+	h5f = tables.open_file(str(tmp_path / "test.h5"), "w")
+	o_table = h5f.create_table("/", "geneSequences", geneSequenceDesc(5, 3, 3))
+	appendColumns(o_table, {"gene" : ["gene1", "gene2", "gene3"], "dna" : ["ATG", "TAA", "TGA"], "type" : ["CDS", "CDS", "CDS"]})
+	assert resizeTable(h5f, o_table, geneSequenceDesc(5, 3, 3)) is o_table
+
+	o_resized = resizeTable(h5f, o_table, geneSequenceDesc(10, 6, 3), chunk = 2)
+	assert h5f.root.geneSequences is o_resized
+	assert o_resized.coldtypes["gene"].itemsize == 10
+	assert o_resized.coldtypes["dna"].itemsize == 6
+	assert [ ID.decode() for ID in o_resized.read(field = "gene") ] == ["gene1", "gene2", "gene3"]
+	assert [ dna.decode() for dna in o_resized.read(field = "dna") ] == ["ATG", "TAA", "TGA"]
+	appendColumns(o_resized, {"gene" : ["gene_four"], "dna" : ["ATGTAA"], "type" : ["CDS"]})
+	assert o_resized.read(field = "gene")[-1].decode() == "gene_four"
+	h5f.close()
+
+def test_appendAnnotations(tmp_path, synthetic_pangenome, fill_organism):
+	filename = str(tmp_path / "pangenome.h5")
+	writePangenome(synthetic_pangenome, filename, force = True)
+	h5f = tables.open_file(filename, "r")
+	a_genes, a_rnas = h5f.root.annotations.genes.read(), h5f.root.annotations.RNA.read()
+	h5f.close()
+
+	o_new = Pangenome()
+	o_org = fill_organism(o_new, "a_much_longer_organism_name", ["fam1", "a_much_longer_family_name"])
+	h5f = tables.open_file(filename, "a")
+	appendAnnotations([o_org], h5f, batchSize = 1)
+	o_genes, o_rnas = h5f.root.annotations.genes, h5f.root.annotations.RNA
+	assert o_genes.nrows == len(a_genes) + 2
+	assert o_rnas.nrows == len(a_rnas) + 1
+	#the rows that were written before are the same, at the same place.
+	for o_table, a_rows in (o_genes, a_genes), (o_rnas, a_rnas):
+		a_old = o_table.read(stop = len(a_rows))
+		for path in "organism", "contig/name", "gene/ID", "gene/name", "gene/product", "gene/start", "gene/position":
+			l_names = path.split("/")
+			assert get_field(a_old, l_names).tolist() == get_field(a_rows, l_names).tolist()
+	a_new = o_genes.read(start = len(a_genes))
+	assert [ ID.decode() for ID in a_new["gene"]["ID"] ] == ["a_much_longer_organism_name_gene0", "a_much_longer_organism_name_gene1"]
+	assert [ name.decode() for name in a_new["gene"]["name"] ] == ["FAM1", "A_MUCH_LONGER_FAMILY_NAME"]
+	assert a_new["gene"]["position"].tolist() == [0, 1]
+	assert a_new["organism"][0].decode() == "a_much_longer_organism_name"
+	assert o_rnas.read(start = len(a_rnas))["gene"]["ID"][0].decode() == "a_much_longer_organism_name_tRNA"
+	h5f.close()
+
+def write_v1(o_pang, filename):
+	"""writes the pangenome as it was before the schema was versioned, with the genes and the families referred to by their names in /geneFamilies and /edges."""
+	writePangenome(o_pang, filename, force = True)
+	h5f = tables.open_file(filename, "a")
+	a_geneIDs = h5f.root.annotations.genes.read(field = "gene/ID")
+	a_famNames = h5f.root.geneFamiliesInfo.read(field = "name")
+	a_gene2fam = h5f.root.geneFamilies.read()
+	a_edges = h5f.root.edges.read()
+	for name in "geneFamilies", "edges", "organisms", "familyOrganisms", "familyEdges":
+		h5f.remove_node("/", name)
+	o_table = h5f.create_table("/", "geneFamilies", {"geneFam" : tables.StringCol(itemsize = a_famNames.dtype.itemsize), "gene" : tables.StringCol(itemsize = a_geneIDs.dtype.itemsize)})
+	appendColumns(o_table, {"geneFam" : a_famNames[a_gene2fam["geneFam"]], "gene" : a_geneIDs[a_gene2fam["gene"]]})
+	o_table = h5f.create_table("/", "edges", {"geneTarget" : tables.StringCol(itemsize = a_geneIDs.dtype.itemsize), "geneSource" : tables.StringCol(itemsize = a_geneIDs.dtype.itemsize)})
+	appendColumns(o_table, {"geneTarget" : a_geneIDs[a_edges["geneTarget"]], "geneSource" : a_geneIDs[a_edges["geneSource"]]})
+	del h5f.root.status._v_attrs.schemaVersion
+	h5f.close()
+
+def test_write_read(tmp_path, synthetic_pangenome, read_pangenome, get_content):
+	filename = str(tmp_path / "pangenome.h5")
+	writePangenome(synthetic_pangenome, filename, force = True)
+	h5f = tables.open_file(filename, "r")
+	assert getSchemaVersion(h5f) == schemaVersion
+	h5f.close()
+	o_pang = read_pangenome(filename)
+	assert get_content(o_pang) == get_content(synthetic_pangenome)
+	assert o_pang.getGene("org1_gene4").family == o_pang.getGeneFamily("fam2")
+	assert { o_fam.name for o_fam in o_pang.getGeneFamily("fam2").neighbors } == {"fam1", "fam3", "fam4", "fam5"}
+
+def test_read_families_without_genes(tmp_path, synthetic_pangenome):
+	filename = str(tmp_path / "pangenome.h5")
+	writePangenome(synthetic_pangenome, filename, force = True)
+	o_pang = Pangenome()
+	o_pang.addFile(filename)
+	readPangenome(o_pang, geneFamilies = True, graph = True)
+	assert { o_fam.name : { o_org.name for o_org in o_fam.organisms } for o_fam in o_pang.geneFamilies } == { o_fam.name : { o_org.name for o_org in o_fam.organisms } for o_fam in synthetic_pangenome.geneFamilies }
+	assert { frozenset([o_edge.source.name, o_edge.target.name]) : { o_org.name : nb for o_org, nb in o_edge.getOrgCounts().items() } for o_edge in o_pang.edges } == \
+		   { frozenset([o_edge.source.name, o_edge.target.name]) : { o_org.name : nb for o_org, nb in o_edge.getOrgCounts().items() } for o_edge in synthetic_pangenome.edges }
+
+def test_read_v1(tmp_path, synthetic_pangenome, read_pangenome, get_content):
+	filename = str(tmp_path / "pangenome.h5")
+	write_v1(synthetic_pangenome, filename)
+	h5f = tables.open_file(filename, "r")
+	assert getSchemaVersion(h5f) == 1
+	h5f.close()
+	assert get_content(read_pangenome(filename)) == get_content(synthetic_pangenome)
+
+def test_migrate_v1(tmp_path, synthetic_pangenome, read_pangenome, get_content):
+	"""a file written with the former schema is converted when it is written again."""
+	filename = str(tmp_path / "pangenome.h5")
+	write_v1(synthetic_pangenome, filename)
+	o_pang = read_pangenome(filename)
+	o_pang.getGeneFamily("fam6").addPartition("P")
+	o_pang.status["partitionned"] = "Computed"
+	writePangenome(o_pang, filename, force = False)
+	h5f = tables.open_file(filename, "r")
+	assert getSchemaVersion(h5f) == schemaVersion
+	for name in "organisms", "familyOrganisms", "familyEdges":
+		assert "/" + name in h5f
+	h5f.close()
+	d_genes, d_fams, d_edges = get_content(read_pangenome(filename))
+	assert (d_genes, d_edges) == get_content(synthetic_pangenome)[::2]
+	assert [ d_fams[famName][1] for famName in ["fam1", "fam4", "fam5", "fam6"] ] == ["P", "C", "C", "P"]
+
+def test_write_lazy_attributes(tmp_path, synthetic_pangenome, read_pangenome, get_content):
+	"""the attributes that are read from the file on their first access are loaded before it is opened for writing."""
+	filename = str(tmp_path / "pangenome.h5")
+	writePangenome(synthetic_pangenome, filename, force = True)
+	o_pang = read_pangenome(filename)
+	assert "sequence" in o_pang._lazyLoaders
+	o_pang.status["genesClustered"] = "Computed"
+	writePangenome(o_pang, filename, force = True)
+	assert len(o_pang._lazyLoaders) == 0
+	assert get_content(read_pangenome(filename)) == get_content(synthetic_pangenome)